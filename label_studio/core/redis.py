@@ -64,6 +64,13 @@ def redis_set(key, value, ttl=None):
     return _redis.set(key, value, ex=ttl)
 
 
+def redis_set_if_absent(key, value, ttl=None):
+    """Atomically set the key only if it doesn't exist (SET NX), returns True if the key is set by this call"""
+    if not redis_healthcheck():
+        return False
+    return bool(_redis.set(key, value, ex=ttl, nx=True))
+
+
 def redis_hset(key1, key2, value):
     if not redis_healthcheck():
         return
@@ -76,6 +83,31 @@ def redis_delete(key):
     return _redis.delete(key)
 
 
+def redis_list_push(key, values, ttl=None, front=False):
+    """Push values to the end (or to the front keeping their order) of the redis list"""
+    if not values or not redis_healthcheck():
+        return
+    with _redis.pipeline() as pipe:
+        if front:
+            pipe.lpush(key, *reversed(values))
+        else:
+            pipe.rpush(key, *values)
+        if ttl:
+            pipe.expire(key, ttl)
+        pipe.execute()
+
+
+def redis_list_pop(key, count):
+    """Atomically pop up to count values from the front of the redis list"""
+    if not redis_healthcheck():
+        return
+    with _redis.pipeline() as pipe:
+        pipe.lrange(key, 0, count - 1)
+        pipe.ltrim(key, count, -1)
+        values, _ = pipe.execute()
+    return values
+
+
 def start_job_async_or_sync(job, *args, in_seconds=0, **kwargs):
     """
     Start job async with redis or sync if redis is not connected
@@ -445,6 +445,7 @@ SUPPORTED_EXTENSIONS = set(
         '.jpg',
         '.jpeg',
         '.json',
+        '.jsonl',
         '.m4a',
         '.mp3',
         '.ogg',
@@ -479,14 +480,40 @@ DATA_UPLOAD_MAX_MEMORY_SIZE = int(get_env('DATA_UPLOAD_MAX_MEMORY_SIZE', 250 * 1
 DATA_UPLOAD_MAX_NUMBER_FILES = int(get_env('DATA_UPLOAD_MAX_NUMBER_FILES', 100))
 TASKS_MAX_NUMBER = 1000000
 TASKS_MAX_FILE_SIZE = DATA_UPLOAD_MAX_MEMORY_SIZE
+# async import parses uploaded files lazily and commits tasks in batches of IMPORT_BATCH_SIZE,
+# so worker memory is bounded by the batch size instead of the file size
+IMPORT_STREAMING = get_bool_env('IMPORT_STREAMING', False)
+IMPORT_BATCH_SIZE = int(get_env('IMPORT_BATCH_SIZE', 1000))
+
+# record project summary counters of annotations and drafts as deltas folded into the summary by a background job
+# at most once per this number of seconds instead of rewriting summary JSON on every save, 0 or no redis disables it
+PROJECT_SUMMARY_COMPACT_INTERVAL = int(get_env('PROJECT_SUMMARY_COMPACT_INTERVAL', default=0))
+# tasks overlap and is_labeled are recalculated after project settings changes by batches of this size,
+# every batch is committed in its own transaction together with the job checkpoint
+PROJECT_RECALCULATION_BATCH_SIZE = int(get_env('PROJECT_RECALCULATION_BATCH_SIZE', default=1000))
+# unfinished recalculation jobs without progress for this number of seconds are resumed from their checkpoint
+PROJECT_RECALCULATION_STALE_TIMEOUT = int(get_env('PROJECT_RECALCULATION_STALE_TIMEOUT', default=300))
 
 TASK_LOCK_TTL = int(get_env('TASK_LOCK_TTL', default=86400))
+# delete expired task locks by a background job running at most once per this number of seconds instead of
+# deleting them on every lock change, 0 or no redis keeps per-task cleanup
+TASK_LOCK_SWEEP_INTERVAL = int(get_env('TASK_LOCK_SWEEP_INTERVAL', default=0))
 
 LABEL_STREAM_HISTORY_LIMIT = int(get_env('LABEL_STREAM_HISTORY_LIMIT', default=100))
 
 RANDOM_NEXT_TASK_SAMPLE_SIZE = int(get_env('RANDOM_NEXT_TASK_SAMPLE_SIZE', 50))
+# random task sampling for uniform next task sampling: 'random_order' (ORDER BY random(), O(N))
+# or 'inner_id' (seeks from random inner_id probes by index, O(size * log N)), see Task.sample_random_ids
+TASKS_RANDOM_SAMPLER = get_env('TASKS_RANDOM_SAMPLER', 'random_order')
+# keep per-user queues of next task candidates in redis for sequence and uniform sampling, 0 disables queues;
+# candidates are checked against the current task state when popped, queues are rebuilt when drained or expired
+NEXT_TASK_QUEUE_SIZE = int(get_env('NEXT_TASK_QUEUE_SIZE', 0))
+NEXT_TASK_QUEUE_TTL = int(get_env('NEXT_TASK_QUEUE_TTL', 600))
 
 TASK_API_PAGE_SIZE_MAX = int(get_env('TASK_API_PAGE_SIZE_MAX', 0)) or None
+# cache data manager totals (tasks, annotations, predictions) in redis for this number of seconds, 0 disables caching;
+# cached totals are invalidated by task, annotation and prediction changes in the project
+DATA_MANAGER_TOTALS_CACHE_TTL = int(get_env('DATA_MANAGER_TOTALS_CACHE_TTL', 0))
 
 # Email backend
 FROM_EMAIL = get_env('FROM_EMAIL', 'Label Studio <hello@labelstud.io>')
@@ -637,8 +664,24 @@ FUTURE_SAVE_TASK_TO_STORAGE = get_bool_env('FUTURE_SAVE_TASK_TO_STORAGE', defaul
 FUTURE_SAVE_TASK_TO_STORAGE_JSON_EXT = get_bool_env('FUTURE_SAVE_TASK_TO_STORAGE_JSON_EXT', default=True)
 STORAGE_IN_PROGRESS_TIMER = float(get_env('STORAGE_IN_PROGRESS_TIMER', 5.0))
 STORAGE_EXPORT_CHUNK_SIZE = int(get_env('STORAGE_EXPORT_CHUNK_SIZE', 100))
+# import storage sync creates tasks, links, predictions and annotations by batches of this size
+STORAGE_SYNC_BATCH_SIZE = int(get_env('STORAGE_SYNC_BATCH_SIZE', 100))
+# number of threads downloading objects of one batch concurrently, 1 means serial downloading
+STORAGE_SYNC_WORKERS = int(get_env('STORAGE_SYNC_WORKERS', 1))
+# incremental sync lists only objects with keys after the last synced one instead of the whole bucket,
+# it's used by default for syncs which don't specify `incremental` explicitly
+STORAGE_SYNC_INCREMENTAL = get_bool_env('STORAGE_SYNC_INCREMENTAL', False)
+# presigned urls are cached for a half of storage presign TTL, 0 size disables the in-process cache,
+# redis (if connected) can be enabled as a cache shared between processes
+PRESIGNED_URL_CACHE_SIZE = int(get_env('PRESIGNED_URL_CACHE_SIZE', 10000))
+PRESIGNED_URL_CACHE_REDIS = get_bool_env('PRESIGNED_URL_CACHE_REDIS', False)
 
 USE_NGINX_FOR_EXPORT_DOWNLOADS = get_bool_env('USE_NGINX_FOR_EXPORT_DOWNLOADS', False)
+# export snapshots are split into this number of shards by task id ranges, shards are serialized by parallel RQ jobs
+# and their JSON fragments are stitched in order, 0 or 1 disables sharding
+EXPORT_SHARDS = int(get_env('EXPORT_SHARDS', 0))
+# without redis shards are serialized by a pool of this number of processes, 0 or 1 serializes them one by one
+EXPORT_SHARD_PROCESSES = int(get_env('EXPORT_SHARD_PROCESSES', 0))
 
 if get_env('MINIO_STORAGE_ENDPOINT') and not get_bool_env('MINIO_SKIP', False):
     CLOUD_FILE_STORAGE_ENABLED = True
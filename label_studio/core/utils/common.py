@@ -5,6 +5,7 @@ from __future__ import unicode_literals
 import calendar
 import contextlib
 import copy
+import itertools
 import logging
 import os
 import random
@@ -626,6 +627,16 @@ def batch(iterable, n=1):
         yield iterable[ndx : min(ndx + n, l)]
 
 
+def iter_batches(iterable, n=1):
+    """Same as batch(), but for iterables without len(), e.g. generators; yields lists of size n at most"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, n))
+        if not chunk:
+            return
+        yield chunk
+
+
 def round_floats(o):
     if isinstance(o, float):
         return round(o, 2)
@@ -1,7 +1,8 @@
 import logging
+import sqlite3
 from typing import Optional, TypeVar
 
-from django.db import models
+from django.db import connection, models, transaction
 from django.db.models import Model, QuerySet, Subquery
 
 logger = logging.getLogger(__name__)
@@ -15,6 +16,13 @@ class SQCount(Subquery):
 ModelType = TypeVar('ModelType', bound=Model)
 
 
+def update_from_is_supported():
+    """UPDATE ... FROM statements (and window functions) are available on Postgres and SQLite >= 3.33"""
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and sqlite3.sqlite_version_info >= (3, 33, 0)
+
+
 def fast_first(queryset: QuerySet[ModelType]) -> Optional[ModelType]:
     """Replacement for queryset.first() when you don't need ordering,
     queryset.first() works slowly in some cases
@@ -23,3 +31,19 @@ def fast_first(queryset: QuerySet[ModelType]) -> Optional[ModelType]:
     if result := queryset[:1]:
         return result[0]
     return None
+
+
+def bulk_create_with_ids(model, objs, batch_size=None):
+    """bulk_create() which guarantees that primary keys are set on the created objects:
+    PostgreSQL returns them from INSERT, on SQLite rows are inserted one by one in a transaction
+    and their ids are taken from the connection, so concurrent inserts can't get the same ids
+    """
+    if connection.features.can_return_rows_from_bulk_insert:
+        return model.objects.bulk_create(objs, batch_size=batch_size)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        for obj in objs:
+            model.objects.bulk_create([obj])
+            cursor.execute('SELECT last_insert_rowid()')
+            obj.pk = cursor.fetchone()[0]
+    return objs
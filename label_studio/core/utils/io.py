@@ -1,6 +1,7 @@
 """This file and its contents are licensed under the Apache License 2.0. Please see the included NOTICE for copyright information and LICENSE for a copy of the license.
 """
 import glob
+import hashlib
 import io
 import ipaddress
 import itertools
@@ -175,6 +176,23 @@ class SerializableGenerator(list):
         return itertools.chain(self._head, *self[:1])
 
 
+class HashingWriter:
+    """File-like object writing bytes to the wrapped file and updating the hash with them on the fly,
+    so the hash of the written file doesn't require reading it again
+    """
+
+    def __init__(self, file, hash_object=None):
+        self.file = file
+        self.hash = hash_object or hashlib.md5()   # nosec
+
+    def write(self, data):
+        self.hash.update(data)
+        return self.file.write(data)
+
+    def hexdigest(self):
+        return self.hash.hexdigest()
+
+
 def validate_upload_url(url, block_local_urls=True):
     """Utility function for defending against SSRF attacks. Raises
         - InvalidUploadUrlError if the url is not HTTP[S], or if block_local_urls is enabled
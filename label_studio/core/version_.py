@@ -0,0 +1,4 @@
+info = {"message": "[user-020] fix: resume recalculations by an explicit POST, not by listing them", "commit": "b137ffccf6852aa114338ace71bebce585437ad0", "date": "2026/10/19 03:28:18", "branch": "", "version": "b137ffc+dirty"}
+
+# This file is automatically generated by version.py
+# Do not include it to git!
@@ -14,10 +14,11 @@ from django.conf import settings
 from django.core.files import File
 from django.core.files.storage import FileSystemStorage
 from django.db import transaction
-from django.http import FileResponse, HttpResponse
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from django.utils.decorators import method_decorator
 from drf_yasg import openapi as openapi
 from drf_yasg.utils import swagger_auto_schema
+from label_studio_converter.converter import Format
 from projects.models import Project
 from ranged_fileresponse import RangedFileResponse
 from rest_framework import generics, status
@@ -26,7 +27,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from tasks.models import Task
 
-from .models import ConvertedFormat, DataExport, Export
+from .models import ConvertedFormat, DataExport, Export, ExportFileStream
 from .serializers import (
     ExportConvertSerializer,
     ExportCreateSerializer,
@@ -162,6 +163,17 @@ class ExportAPI(generics.RetrieveAPIView):
     def get_task_queryset(self, queryset):
         return queryset.select_related('project').prefetch_related('annotations', 'predictions')
 
+    def iter_export_tasks(self, query, interpolate_key_frames):
+        logger.debug('Serialize tasks for export')
+        task_ids = query.values_list('id', flat=True)
+        for _task_ids in batch(task_ids, 1000):
+            yield from ExportDataSerializer(
+                self.get_task_queryset(query.filter(id__in=_task_ids)),
+                many=True,
+                expand=['drafts'],
+                context={'interpolate_key_frames': interpolate_key_frames},
+            ).data
+
     def get(self, request, *args, **kwargs):
         project = self.get_object()
         query_serializer = ExportParamSerializer(data=request.GET)
@@ -184,19 +196,23 @@ class ExportAPI(generics.RetrieveAPIView):
         if only_finished:
             query = query.filter(annotations__isnull=False).distinct()
 
-        task_ids = query.values_list('id', flat=True)
+        tasks = self.iter_export_tasks(query, interpolate_key_frames)
 
-        logger.debug('Serialize tasks for export')
-        tasks = []
-        for _task_ids in batch(task_ids, 1000):
-            tasks += ExportDataSerializer(
-                self.get_task_queryset(query.filter(id__in=_task_ids)),
-                many=True,
-                expand=['drafts'],
-                context={'interpolate_key_frames': interpolate_key_frames},
-            ).data
-        logger.debug('Prepare export files')
+        # JSON formats are streamed to the client while tasks are serialized batch by batch
+        if export_type in (Format.JSON.name, Format.JSON_MIN.name):
+            if export_type == Format.JSON_MIN.name:
+                stream = ExportFileStream(
+                    project, ExportFileStream.iter_json_min(project, tasks), request.GET, indent=2
+                )
+            else:
+                stream = ExportFileStream(project, tasks, request.GET)
+            filename = DataExport.get_export_name(project, stream.now) + '.json'
+            r = StreamingHttpResponse(stream, content_type='application/json')
+            r['Content-Disposition'] = f'attachment; filename="{filename}"'
+            r['filename'] = filename
+            return r
 
+        logger.debug('Prepare export files')
         export_file, content_type, filename = DataExport.generate_export_file(
             project, tasks, export_type, download_resources, request.GET
         )
@@ -326,6 +342,7 @@ class ExportListAPI(generics.ListCreateAPIView):
         task_filter_options = serializer.validated_data.pop('task_filter_options')
         annotation_filter_options = serializer.validated_data.pop('annotation_filter_options')
         serialization_options = serializer.validated_data.pop('serialization_options')
+        incremental = serializer.validated_data.pop('incremental')
 
         project = self._get_project()
         serializer.save(project=project, created_by=self.request.user)
@@ -335,6 +352,7 @@ class ExportListAPI(generics.ListCreateAPIView):
             task_filter_options=task_filter_options,
             annotation_filter_options=annotation_filter_options,
             serialization_options=serialization_options,
+            incremental=incremental,
         )
 
     def get_queryset(self):
@@ -565,7 +583,7 @@ def async_convert(converted_format_id, export_type, project, **kwargs):
     converted_file = snapshot.convert_file(export_type)
     if converted_file is None:
         raise ValidationError('No converted file found, probably there are no annotations in the export snapshot')
-    md5 = Export.eval_md5(converted_file)
+    md5 = getattr(converted_file, 'md5', None) or Export.eval_md5(converted_file)
     ext = converted_file.name.split('.')[-1]
 
     now = datetime.now()
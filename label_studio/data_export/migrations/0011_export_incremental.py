@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-19 10:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_export', '0010_alter_convertedformat_export_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='export',
+            name='base_export',
+            field=models.ForeignKey(
+                default=None,
+                help_text='Previous snapshot of the incremental export, only tasks changed since it are exported',
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name='incremental_exports',
+                to='data_export.export',
+            ),
+        ),
+        migrations.AddField(
+            model_name='export',
+            name='watermark',
+            field=models.JSONField(
+                default=dict, help_text='Time, export options and the last ids of exported objects at the start of the export', verbose_name='watermark'
+            ),
+        ),
+    ]
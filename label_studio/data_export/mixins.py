@@ -1,9 +1,11 @@
 import hashlib
-import io
 import json
 import logging
+import math
+import os
 import pathlib
 import shutil
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from functools import reduce
 
@@ -11,6 +13,7 @@ import django_rq
 from core.redis import redis_connected
 from core.utils.common import batch
 from core.utils.io import (
+    HashingWriter,
     SerializableGenerator,
     get_all_dirs_from_dir,
     get_all_files_from_dir,
@@ -20,15 +23,18 @@ from data_manager.models import View
 from django.conf import settings
 from django.core.files import File
 from django.core.files import temp as tempfile
-from django.db import transaction
-from django.db.models import Prefetch
+from django.db import connections, transaction
+from django.db.models import Count, Exists, Max, OuterRef, Prefetch
 from django.db.models.query_utils import Q
 from django.utils import dateformat, timezone
+from django.utils.dateparse import parse_datetime
 from label_studio_converter import Converter
-from tasks.models import Annotation, Task
+from tasks.models import Annotation, AnnotationDraft, Prediction, Task
 
 ONLY = 'only'
 EXCLUDE = 'exclude'
+CHUNK_SIZE = 1024 * 1024
+EXPORT_BATCH_SIZE = 1000
 
 
 logger = logging.getLogger(__name__)
@@ -149,10 +155,117 @@ class ExportMixin:
                     queryset=annotations_qs,
                 )
             )
-            .prefetch_related('predictions', 'drafts')
+            .prefetch_related('predictions', 'drafts', 'comment_authors')
         )
 
-    def get_export_data(self, task_filter_options=None, annotation_filter_options=None, serialization_options=None):
+    def _get_watermark_objects(self):
+        """Objects of the project which are exported with tasks and whose deletions aren't seen by updated_at,
+        a deleted draft sets updated_at of its task (drafts are deleted on each annotation submit)
+        """
+        return {
+            'task': Task.objects.filter(project=self.project),
+            'annotation': Annotation.objects.filter(task__project=self.project),
+            'prediction': Prediction.objects.filter(task__project=self.project),
+        }
+
+    @staticmethod
+    def get_options_hash(task_filter_options=None, annotation_filter_options=None, serialization_options=None):
+        """Exports built with the same options only can be a base for each other"""
+        options = {
+            'task_filter_options': task_filter_options,
+            'annotation_filter_options': annotation_filter_options,
+            'serialization_options': serialization_options,
+        }
+        return hashlib.md5(json.dumps(options, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get_watermark(self, options_hash):
+        """Changes after this point are exported by the next incremental export,
+        the time is taken first, so annotations created meanwhile are exported twice rather than lost.
+        The last id and the number of objects are kept to detect deletions, they don't touch updated_at
+        """
+        updated_at = timezone.now()
+        objects = {
+            name: queryset.aggregate(max_id=Max('id'), count=Count('id'))
+            for name, queryset in self._get_watermark_objects().items()
+        }
+        return {'updated_at': updated_at.isoformat(), 'options': options_hash, 'objects': objects}
+
+    def get_base_export(self, options_hash):
+        """The latest completed export of the project with a watermark and the same export options"""
+        exports = type(self).objects.filter(project=self.project, status=self.Status.COMPLETED).exclude(id=self.id)
+        return exports.filter(watermark__options=options_hash).order_by('-created_at', '-id').first()
+
+    def get_deleted_objects(self, watermark):
+        """Names of objects deleted after the watermark: fewer of them are left up to its last id"""
+        deleted = []
+        for name, queryset in self._get_watermark_objects().items():
+            last = watermark['objects'][name]
+            if last['count'] and queryset.filter(id__lte=last['max_id']).count() < last['count']:
+                deleted.append(name)
+        return deleted
+
+    def _get_changed_tasks(self, tasks, watermark):
+        """Tasks changed after the watermark: task itself, its annotations, predictions or drafts"""
+        updated_at = parse_datetime(watermark['updated_at'])
+        changed = Q(updated_at__gt=updated_at)
+        changed |= Exists(
+            Annotation.objects.filter(
+                Q(updated_at__gt=updated_at) | Q(id__gt=watermark['objects']['annotation']['max_id'] or 0),
+                task_id=OuterRef('id'),
+            )
+        )
+        changed |= Exists(Prediction.objects.filter(task_id=OuterRef('id'), updated_at__gt=updated_at))
+        changed |= Exists(AnnotationDraft.objects.filter(task_id=OuterRef('id'), updated_at__gt=updated_at))
+        return tasks.filter(changed)
+
+    def get_manifest(self):
+        """Describes how the export file is applied: a full snapshot or changed tasks on top of the base export"""
+        watermark = dict(self.watermark)
+        since = watermark.pop('since', None)
+        refused = watermark.pop('incremental_refused', None)
+        manifest = {
+            'type': 'full' if since is None else 'incremental',
+            'md5': self.md5,
+            'task_number': self.counters.get('task_number'),
+            'watermark': watermark,
+        }
+        if refused is not None:
+            manifest['incremental_refused'] = refused
+        if since is not None:
+            # the base export can be deleted, but the delta is still described by its watermark
+            base = self.base_export
+            manifest['base'] = {
+                'id': self.base_export_id,
+                'md5': base.md5 if base else None,
+                'base_export': base.base_export_id if base else None,
+                'watermark': since,
+            }
+        return manifest
+
+    def get_export_task_ids(self, task_filter_options=None, annotation_filter_options=None, id_range=None):
+        """Ids query of exported tasks, incremental exports have tasks changed since the base export only
+
+        id_range: None or Tuple(id_from, id_to) - tasks of the shard with id_from <= id < id_to, None is unbounded
+        """
+        tasks_query = self._get_filtered_tasks(self.project.tasks, task_filter_options=task_filter_options)
+        if 'since' in self.watermark:
+            tasks_query = self._get_changed_tasks(tasks_query, self.watermark['since'])
+        if isinstance(task_filter_options, dict) and task_filter_options.get('only_with_annotations'):
+            # tasks with exported annotations only (like prefetched task.annotations.exists() did),
+            # it's checked by the ids query instead of every task
+            annotations_qs = self._get_filtered_annotations_queryset(annotation_filter_options)
+            tasks_query = tasks_query.filter(Exists(annotations_qs.filter(task_id=OuterRef('id'))))
+        if id_range is not None:
+            id_from, id_to = id_range
+            if id_from is not None:
+                tasks_query = tasks_query.filter(id__gte=id_from)
+            if id_to is not None:
+                tasks_query = tasks_query.filter(id__lt=id_to)
+        return tasks_query.distinct().values_list('id', flat=True)
+
+    def get_export_data(
+        self, task_filter_options=None, annotation_filter_options=None, serialization_options=None, id_range=None
+    ):
         """
         serialization_options: None or Dict({
             drafts: optional
@@ -183,26 +296,18 @@ class ExportMixin:
             # TODO: make counters from queryset
             # counters = Project.objects.with_counts().filter(id=self.project.id)[0].get_counters()
             self.counters = {'task_number': 0}
-            all_tasks = self.project.tasks
             logger.debug('Tasks filtration')
-            task_ids = (
-                self._get_filtered_tasks(all_tasks, task_filter_options=task_filter_options)
-                .distinct()
-                .values_list('id', flat=True)
-            )
+            task_ids = self.get_export_task_ids(task_filter_options, annotation_filter_options, id_range=id_range)
             base_export_serializer_option = self._get_export_serializer_option(serialization_options)
             i = 0
-            BATCH_SIZE = 1000
-            for ids in batch(task_ids, BATCH_SIZE):
+            for ids in batch(task_ids, EXPORT_BATCH_SIZE):
                 i += 1
                 tasks = list(self.get_task_queryset(ids, annotation_filter_options))
-                logger.debug(f'Batch: {i*BATCH_SIZE}')
-                if isinstance(task_filter_options, dict) and task_filter_options.get('only_with_annotations'):
-                    tasks = [task for task in tasks if task.annotations.exists()]
+                logger.debug(f'Batch: {i*EXPORT_BATCH_SIZE}')
 
                 if serialization_options and serialization_options.get('include_annotation_history') is True:
-                    task_ids = [task.id for task in tasks]
-                    annotation_ids = Annotation.objects.filter(task_id__in=task_ids).values_list('id', flat=True)
+                    # history of all annotations of the batch tasks, not only of the exported ones
+                    annotation_ids = Annotation.objects.filter(task_id__in=ids).values_list('id', flat=True)
                     base_export_serializer_option = self.update_export_serializer_option(
                         base_export_serializer_option, annotation_ids
                     )
@@ -228,9 +333,15 @@ class ExportMixin:
 
     def save_file(self, file, md5):
         now = datetime.now()
-        file_name = f'project-{self.project.id}-at-{now.strftime("%Y-%m-%d-%H-%M")}-{md5[0:8]}.json'
+        delta = '-delta' if 'since' in self.watermark else ''
+        file_name = f'project-{self.project.id}{delta}-at-{now.strftime("%Y-%m-%d-%H-%M")}-{md5[0:8]}.json'
         file_path = f'{self.project.id}/{file_name}'  # finally file will be in settings.DELAYED_EXPORT_DIR/self.project.id/file_name
-        file_ = File(file, name=file_path)
+        if isinstance(file, TemporaryExportFile):
+            # keep temporary_file_path() for the storage
+            file.name = file_path
+            file_ = file
+        else:
+            file_ = File(file, name=file_path)
         self.file.save(file_path, file_)
         self.md5 = md5
         self.save(update_fields=['file', 'md5', 'counters'])
@@ -242,24 +353,33 @@ class ExportMixin:
             f'annotation_filter_options: {annotation_filter_options}\n'
             f'serialization_options: {serialization_options}\n'
         )
-        try:
-            iter_json = json.JSONEncoder(ensure_ascii=False).iterencode(
-                SerializableGenerator(
-                    self.get_export_data(
-                        task_filter_options=task_filter_options,
-                        annotation_filter_options=annotation_filter_options,
-                        serialization_options=serialization_options,
-                    )
+        iter_json = json.JSONEncoder(ensure_ascii=False).iterencode(
+            SerializableGenerator(
+                self.get_export_data(
+                    task_filter_options=task_filter_options,
+                    annotation_filter_options=annotation_filter_options,
+                    serialization_options=serialization_options,
                 )
             )
-            with tempfile.NamedTemporaryFile(suffix='.export.json', dir=settings.FILE_UPLOAD_TEMP_DIR) as file:
-                for chunk in iter_json:
-                    encoded_chunk = chunk.encode('utf-8')
-                    file.write(encoded_chunk)
-                file.seek(0)
+        )
+        self._write_export_file(chunk.encode('utf-8') for chunk in iter_json)
 
-                md5 = self.eval_md5(file)
-                self.save_file(file, md5)
+    def _write_export_file(self, chunks):
+        """Save the export file from byte chunks and complete the export"""
+        temp_path = None
+        try:
+            # the file is hashed while it's written, it can't be streamed to the storage directly,
+            # because md5 is a part of the file name (see save_file()); the file system storage moves
+            # the temporary file instead of copying, cloud storages upload it by multipart chunks
+            with tempfile.NamedTemporaryFile(
+                suffix='.export.json', dir=settings.FILE_UPLOAD_TEMP_DIR, delete=False
+            ) as file:
+                temp_path = file.name
+                writer = HashingWriter(file)
+                for chunk in chunks:
+                    writer.write(chunk)
+                file.seek(0)
+                self.save_file(TemporaryExportFile(file), writer.hexdigest())
 
             self.status = self.Status.COMPLETED
             self.save(update_fields=['status'])
@@ -269,21 +389,210 @@ class ExportMixin:
             self.save(update_fields=['status'])
             logger.exception('Export was failed')
         finally:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
             self.finished_at = datetime.now()
             self.save(update_fields=['finished_at'])
 
-    def run_file_exporting(self, task_filter_options=None, annotation_filter_options=None, serialization_options=None):
+    def get_shard_ranges(self, task_filter_options=None, annotation_filter_options=None, shards=1):
+        """Split exported tasks into shards of about the same size by task id ranges,
+        every shard has one batch of tasks at least
+
+        :return: list of (id_from, id_to) ranges, see get_export_task_ids()
+        """
+        task_ids = self.get_export_task_ids(task_filter_options, annotation_filter_options).order_by('id')
+        total = task_ids.count()
+        shards = max(min(shards, math.ceil(total / EXPORT_BATCH_SIZE)), 1)
+        size = math.ceil(total / shards)
+        bounds = [None]
+        if shards > 1:
+            # one ordered pass over ids instead of OFFSET scans for every bound
+            bounds += [task_id for i, task_id in enumerate(task_ids.iterator()) if i and i % size == 0]
+        bounds.append(None)
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def export_to_file_sharded(
+        self, task_filter_options=None, annotation_filter_options=None, serialization_options=None
+    ):
+        """Serialize shards of tasks in parallel RQ jobs (or in the EXPORT_SHARD_PROCESSES pool without redis),
+        then stitch their JSON array fragments in order into the export file
+        """
+        options = (task_filter_options, annotation_filter_options, serialization_options)
+        try:
+            ranges = self.get_shard_ranges(task_filter_options, annotation_filter_options, settings.EXPORT_SHARDS)
+        except Exception:
+            self.status = self.Status.FAILED
+            self.finished_at = datetime.now()
+            self.save(update_fields=['status', 'finished_at'])
+            logger.exception('Export was failed')
+            return
+        if len(ranges) == 1:
+            self.export_to_file(*options)
+            return
+
+        logger.debug(f'Run export for {self.id} by {len(ranges)} shards: {ranges}')
+        self.counters = {'task_number': 0, 'shards': len(ranges), 'shards_completed': 0, 'shard_files': {}}
+        self.save(update_fields=['counters'])
+
+        if redis_connected():
+            queue = django_rq.get_queue('default')
+            for shard, id_range in enumerate(ranges):
+                queue.enqueue(
+                    export_shard_background,
+                    self.id,
+                    shard,
+                    id_range,
+                    *options,
+                    on_failure=set_export_background_failure,
+                    job_timeout='3h',
+                )
+            return
+
+        try:
+            shard_args = [(self.id, shard, id_range, *options) for shard, id_range in enumerate(ranges)]
+            if settings.EXPORT_SHARD_PROCESSES > 1:
+                # forked processes must open their own db connections
+                connections.close_all()
+                with ProcessPoolExecutor(max_workers=settings.EXPORT_SHARD_PROCESSES) as pool:
+                    list(pool.map(export_shard_background, *zip(*shard_args)))
+            else:
+                for args in shard_args:
+                    export_shard_background(*args)
+        except Exception:
+            logger.exception('Export was failed')
+            self.set_shards_failed()
+            return
+        self.refresh_from_db(fields=['status', 'counters'])
+        self.stitch_shards()
+
+    def set_shards_failed(self):
+        """Fail the sharded export: remaining shards are skipped and fragments of completed shards are deleted"""
+        with transaction.atomic():
+            export = type(self).objects.select_for_update().get(id=self.id)
+            export.status = self.Status.FAILED
+            export.finished_at = datetime.now()
+            shard_files = export.counters.pop('shard_files', {})
+            export.save(update_fields=['status', 'finished_at', 'counters'])
+        for name in shard_files.values():
+            self.file.storage.delete(name)
+        logger.debug(f'Export {self.id} is failed, {len(shard_files)} shard files are deleted')
+        self.status, self.finished_at, self.counters = export.status, export.finished_at, export.counters
+
+    def export_shard(
+        self, shard, id_range, task_filter_options=None, annotation_filter_options=None, serialization_options=None
+    ):
+        """Save tasks of the shard as a fragment of the JSON array: items separated with commas, without brackets
+
+        :return: True if it's the last completed shard of the export
+        """
+        if self.status != self.Status.IN_PROGRESS:
+            logger.warning(f'Export {self.id} is {self.status}, shard {shard} is skipped')
+            return False
+
+        items = self.get_export_data(task_filter_options, annotation_filter_options, serialization_options, id_range)
+        encoder = json.JSONEncoder(ensure_ascii=False)
+        temp_path = None
+        try:
+            with tempfile.NamedTemporaryFile(
+                suffix='.export.part', dir=settings.FILE_UPLOAD_TEMP_DIR, delete=False
+            ) as file:
+                temp_path = file.name
+                for i, item in enumerate(items):
+                    if i:
+                        file.write(b', ')
+                    for chunk in encoder.iterencode(item):
+                        file.write(chunk.encode('utf-8'))
+                file.seek(0)
+                shard_name = f'{settings.DELAYED_EXPORT_DIR}/{self.project.id}/shards/{self.id}-{shard}.part'
+                shard_name = self.file.storage.save(shard_name, TemporaryExportFile(file))
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        with transaction.atomic():
+            export = type(self).objects.select_for_update().get(id=self.id)
+            stopped = export.status != self.Status.IN_PROGRESS
+            if not stopped:
+                export.counters['task_number'] += self.counters['task_number']
+                export.counters['shards_completed'] += 1
+                export.counters['shard_files'][str(shard)] = shard_name
+                export.save(update_fields=['counters'])
+        if stopped:
+            # the export has failed while the shard was serialized
+            logger.warning(f'Export {self.id} is {export.status}, shard {shard} is deleted')
+            self.file.storage.delete(shard_name)
+            return False
+        logger.debug(f'Export {self.id}: shard {shard} is saved with {self.counters["task_number"]} tasks')
+        self.counters = export.counters
+        return export.counters['shards_completed'] == export.counters['shards']
+
+    def stitch_shards(self):
+        """Join JSON array fragments of the shards in order into the export file"""
+        if self.status != self.Status.IN_PROGRESS:
+            logger.warning(f'Export {self.id} is {self.status}, shards are not stitched')
+            return
+        storage = self.file.storage
+        shard_files = self.counters.pop('shard_files')
+        names = [shard_files[str(shard)] for shard in range(self.counters['shards'])]
+
+        def iter_chunks():
+            yield b'['
+            empty = True
+            for name in names:
+                with storage.open(name, 'rb') as fragment:
+                    chunk = fragment.read(CHUNK_SIZE)
+                    if chunk and not empty:
+                        yield b', '
+                    while chunk:
+                        empty = False
+                        yield chunk
+                        chunk = fragment.read(CHUNK_SIZE)
+            yield b']'
+
+        try:
+            self._write_export_file(iter_chunks())
+        finally:
+            for name in names:
+                storage.delete(name)
+            self.save(update_fields=['counters'])
+
+    def run_file_exporting(
+        self, task_filter_options=None, annotation_filter_options=None, serialization_options=None, incremental=False
+    ):
+        """
+        incremental: export only tasks changed since the previous completed export with the same options,
+        it's a full export if there is no such export or tasks, annotations or predictions
+        were deleted after it: deletions can't be represented in the delta
+        """
         if self.status == self.Status.IN_PROGRESS:
             logger.warning('Try to export with in progress stage')
             return
 
+        options_hash = self.get_options_hash(task_filter_options, annotation_filter_options, serialization_options)
+        self.watermark = self.get_watermark(options_hash)
+        if incremental:
+            base_export = self.get_base_export(options_hash)
+            deleted = self.get_deleted_objects(base_export.watermark) if base_export else []
+            if base_export is None:
+                logger.info(f'No base export for incremental export {self.id}, all tasks are exported')
+            elif deleted:
+                logger.info(f'Objects {deleted} were deleted after export {base_export.id}, all tasks are exported')
+                self.watermark['incremental_refused'] = {'base_export': base_export.id, 'deleted': deleted}
+            else:
+                self.base_export = base_export
+                self.watermark['since'] = {
+                    key: value
+                    for key, value in base_export.watermark.items()
+                    if key not in ('since', 'incremental_refused')
+                }
         self.status = self.Status.IN_PROGRESS
-        self.save(update_fields=['status'])
+        self.save(update_fields=['status', 'base_export', 'watermark'])
 
+        sharded = settings.EXPORT_SHARDS > 1
         if redis_connected():
             queue = django_rq.get_queue('default')
             queue.enqueue(
-                export_background,
+                export_sharded_background if sharded else export_background,
                 self.id,
                 task_filter_options,
                 annotation_filter_options,
@@ -291,6 +600,12 @@ class ExportMixin:
                 on_failure=set_export_background_failure,
                 job_timeout='3h',  # 3 hours
             )
+        elif sharded:
+            self.export_to_file_sharded(
+                task_filter_options=task_filter_options,
+                annotation_filter_options=annotation_filter_options,
+                serialization_options=serialization_options,
+            )
         else:
             self.export_to_file(
                 task_filter_options=task_filter_options,
@@ -313,8 +628,8 @@ class ExportMixin:
             input_name = pathlib.Path(self.file.name).name
             input_file_path = pathlib.Path(tmp_dir) / input_name
 
-            with open(input_file_path, 'wb') as file_:
-                file_.write(self.file.open().read())
+            with self.file.open('rb') as source, open(input_file_path, 'wb') as file_:
+                shutil.copyfileobj(source, file_, CHUNK_SIZE)
 
             converter.convert(input_file_path, out_dir, to_format, is_dir=False)
 
@@ -331,12 +646,25 @@ class ExportMixin:
                 output_file = pathlib.Path(tmp_dir) / (str(out_dir.stem) + '.zip')
                 filename = pathlib.Path(input_name).stem + '.zip'
 
-            # TODO(jo): can we avoid the `f.read()` here?
+            # copy the result out of the temp dir by chunks, it's hashed on the way for the converted file name
+            converted = tempfile.NamedTemporaryFile(
+                suffix=pathlib.Path(filename).suffix, dir=settings.FILE_UPLOAD_TEMP_DIR
+            )
+            writer = HashingWriter(converted)
             with open(output_file, mode='rb') as f:
-                return File(
-                    io.BytesIO(f.read()),
-                    name=filename,
-                )
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    writer.write(chunk)
+            converted.seek(0)
+            file_ = File(converted, name=filename)
+            file_.md5 = writer.hexdigest()
+            return file_
+
+
+class TemporaryExportFile(File):
+    """Export written to a named temporary file, FileSystemStorage moves it to the storage instead of copying"""
+
+    def temporary_file_path(self):
+        return self.file.name
 
 
 def export_background(
@@ -351,8 +679,51 @@ def export_background(
     )
 
 
+def export_sharded_background(
+    export_id, task_filter_options, annotation_filter_options, serialization_options, *args, **kwargs
+):
+    from data_export.models import Export
+
+    Export.objects.get(id=export_id).export_to_file_sharded(
+        task_filter_options,
+        annotation_filter_options,
+        serialization_options,
+    )
+
+
+def export_shard_background(
+    export_id, shard, id_range, task_filter_options, annotation_filter_options, serialization_options, *args, **kwargs
+):
+    from data_export.models import Export
+
+    last = Export.objects.get(id=export_id).export_shard(
+        shard,
+        id_range,
+        task_filter_options,
+        annotation_filter_options,
+        serialization_options,
+    )
+    # without redis shards are stitched by export_to_file_sharded()
+    if last and redis_connected():
+        queue = django_rq.get_queue('default')
+        queue.enqueue(
+            stitch_export_shards_background, export_id, on_failure=set_export_background_failure, job_timeout='3h'
+        )
+
+
+def stitch_export_shards_background(export_id, *args, **kwargs):
+    from data_export.models import Export
+
+    Export.objects.get(id=export_id).stitch_shards()
+
+
 def set_export_background_failure(job, connection, type, value, traceback):
     from data_export.models import Export
 
     export_id = job.args[0]
-    Export.objects.filter(id=export_id).update(status=Export.Status.FAILED)
+    export = Export.objects.filter(id=export_id).first()
+    if export is not None and 'shard_files' in export.counters:
+        # a job of the sharded export has failed
+        export.set_shards_failed()
+    else:
+        Export.objects.filter(id=export_id).update(status=Export.Status.FAILED)
@@ -1,23 +1,31 @@
 """This file and its contents are licensed under the Apache License 2.0. Please see the included NOTICE for copyright information and LICENSE for a copy of the license.
 """
-import hashlib
 import logging
 import os
 import shutil
 from copy import deepcopy
 from datetime import datetime
+from json import JSONEncoder
+from uuid import uuid4
 
 import ujson as json
 from core import version
 from core.feature_flags import flag_set
 from core.utils.common import load_func
-from core.utils.io import get_all_files_from_dir, get_temp_dir, path_to_open_binary_file
+from core.utils.io import (
+    HashingWriter,
+    SerializableGenerator,
+    get_all_files_from_dir,
+    get_temp_dir,
+    path_to_open_binary_file,
+)
 from django.conf import settings
 from django.db import models
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
 from label_studio_converter import Converter
+from label_studio_converter.utils import get_annotator, prettify_result
 from tasks.models import Annotation
 
 logger = logging.getLogger(__name__)
@@ -82,6 +90,19 @@ class Export(ExportMixin, models.Model):
         null=True,
         verbose_name=_('created by'),
     )
+    base_export = models.ForeignKey(
+        'self',
+        related_name='incremental_exports',
+        on_delete=models.SET_NULL,
+        null=True,
+        default=None,
+        help_text='Previous snapshot of the incremental export, only tasks changed since it are exported',
+    )
+    watermark = models.JSONField(
+        _('watermark'),
+        default=dict,
+        help_text='Time, export options and the last ids of exported objects at the start of the export',
+    )
 
 
 @receiver(post_save, sender=Export)
@@ -96,6 +117,14 @@ class DataExport(object):
     @staticmethod
     def save_export_files(project, now, get_args, data, md5, name):
         """Generate two files: meta info and result file and store them locally for logging"""
+        filename_results = os.path.join(settings.EXPORT_DIR, name + '.json')
+        with open(filename_results, 'w', encoding='utf-8') as f:
+            f.write(data)
+        DataExport.save_export_info(project, now, get_args, md5, name)
+        return filename_results
+
+    @staticmethod
+    def save_export_info(project, now, get_args, md5, name):
         filename_results = os.path.join(settings.EXPORT_DIR, name + '.json')
         filename_info = os.path.join(settings.EXPORT_DIR, name + '-info.json')
         annotation_number = Annotation.objects.filter(project=project).count()
@@ -121,12 +150,13 @@ class DataExport(object):
                 'md5': md5,
             },
         }
-
-        with open(filename_results, 'w', encoding='utf-8') as f:
-            f.write(data)
         with open(filename_info, 'w', encoding='utf-8') as f:
             json.dump(info, f, ensure_ascii=False)
-        return filename_results
+
+    @staticmethod
+    def get_export_name(project, now, md5=None):
+        name = 'project-' + str(project.id) + '-at-' + now.strftime('%Y-%m-%d-%H-%M')
+        return name + f'-{md5[0:8]}' if md5 else name
 
     @staticmethod
     def get_export_formats(project):
@@ -148,13 +178,11 @@ class DataExport(object):
         Be sure to close the file after using it, to avoid wasting disk space.
         """
 
-        # prepare for saving
-        now = datetime.now()
-        data = json.dumps(tasks, ensure_ascii=False)
-        md5 = hashlib.md5(json.dumps(data).encode('utf-8')).hexdigest()   # nosec
-        name = 'project-' + str(project.id) + '-at-' + now.strftime('%Y-%m-%d-%H-%M') + f'-{md5[0:8]}'
-
-        input_json = DataExport.save_export_files(project, now, get_args, data, md5, name)
+        # tasks are written to the input file one by one, they can be a generator
+        stream = ExportFileStream(project, tasks, get_args)
+        for _chunk in stream:
+            pass
+        input_json, name = stream.path, stream.name
 
         converter = Converter(
             config=project.get_parsed_config(),
@@ -182,6 +210,77 @@ class DataExport(object):
             return out, content_type, filename
 
 
+class ExportFileStream:
+    """JSON array of export items written to EXPORT_DIR while the stream is iterated by chunks of bytes.
+    The MD5 is calculated on the fly, so the items are never kept in memory all together.
+    name, path and md5 are set when the iteration is finished.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, project, items, get_args, indent=None):
+        self.project = project
+        self.items = items
+        self.get_args = get_args
+        self.indent = indent
+        self.now = datetime.now()
+        self.name = self.path = self.md5 = None
+
+    def __iter__(self):
+        part_path = os.path.join(settings.EXPORT_DIR, f'project-{self.project.id}-{uuid4().hex}.part')
+        encoder = JSONEncoder(ensure_ascii=False, indent=self.indent)
+        try:
+            with open(part_path, 'wb') as f:
+                writer = HashingWriter(f)
+                chunks, size = [], 0
+                for chunk in encoder.iterencode(SerializableGenerator(self.items)):
+                    chunks.append(chunk)
+                    size += len(chunk)
+                    if size >= self.CHUNK_SIZE:
+                        yield self._write(writer, chunks)
+                        chunks, size = [], 0
+                if chunks:
+                    yield self._write(writer, chunks)
+
+            self.md5 = writer.hexdigest()
+            self.name = DataExport.get_export_name(self.project, self.now, self.md5)
+            self.path = os.path.join(settings.EXPORT_DIR, self.name + '.json')
+            os.replace(part_path, self.path)
+            DataExport.save_export_info(self.project, self.now, self.get_args, self.md5, self.name)
+        finally:
+            # the stream is interrupted, e.g. the client is disconnected
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+    @staticmethod
+    def _write(writer, chunks):
+        data = ''.join(chunks).encode('utf-8')
+        writer.write(data)
+        return data
+
+    @staticmethod
+    def iter_json_min(project, tasks):
+        """Convert tasks to JSON_MIN records one by one, the same way as Converter.convert_to_json_min()"""
+        converter = Converter(config=project.get_parsed_config(), project_dir=None)
+        for task in tasks:
+            for item in converter.annotation_result_from_task(task):
+                if item is None:
+                    continue
+                record = deepcopy(item['input'])
+                if item.get('id') is not None:
+                    record['id'] = item['id']
+                for name, value in item['output'].items():
+                    record[name] = prettify_result(value)
+                record['annotator'] = get_annotator(item, int_id=True)
+                record['annotation_id'] = item['annotation_id']
+                record['created_at'] = item['created_at']
+                record['updated_at'] = item['updated_at']
+                record['lead_time'] = item['lead_time']
+                if 'agreement' in item:
+                    record['agreement'] = item['agreement']
+                yield record
+
+
 class ConvertedFormat(models.Model):
     class Status(models.TextChoices):
         CREATED = 'created', _('Created')
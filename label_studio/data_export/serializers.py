@@ -95,11 +95,18 @@ class ExportSerializer(serializers.ModelSerializer):
             'md5',
             'counters',
             'converted_formats',
+            'base_export',
+            'manifest',
         ]
         fields = ['title'] + read_only
 
     created_by = UserSimpleSerializer(required=False)
     converted_formats = ConvertedFormatSerializer(many=True, required=False)
+    base_export = serializers.PrimaryKeyRelatedField(read_only=True)
+    manifest = serializers.SerializerMethodField()
+
+    def get_manifest(self, instance):
+        return instance.get_manifest()
 
 
 ONLY_OR_EXCLUDE_CHOICE = [
@@ -181,11 +188,18 @@ class ExportCreateSerializer(ExportSerializer):
             'task_filter_options',
             'annotation_filter_options',
             'serialization_options',
+            'incremental',
         ]
 
     task_filter_options = TaskFilterOptionsSerializer(required=False, default=None)
     annotation_filter_options = AnnotationFilterOptionsSerializer(required=False, default=None)
     serialization_options = SerializationOptionsSerializer(required=False, default=None)
+    incremental = serializers.BooleanField(
+        default=False,
+        write_only=True,
+        help_text='Export only tasks changed since the previous completed export with the same options, '
+        'the manifest references this base export. It is a full export if objects were deleted after the base',
+    )
 
 
 class ExportParamSerializer(serializers.Serializer):
@@ -31,8 +31,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.settings import api_settings
 from rest_framework.views import APIView
-from tasks.functions import update_tasks_counters
-from tasks.models import Prediction, Task
+from tasks.models import Prediction, Task, defer_tasks_counters_update, deferred_tasks_counters
 from users.models import User
 from webhooks.models import WebhookAction
 from webhooks.utils import emit_webhooks_for_instance
@@ -243,7 +242,7 @@ class ImportAPI(generics.CreateAPIView):
             )
             logger.info('Tasks bulk_update finished (sync import)')
 
-            project.summary.update_data_columns(parsed_data)
+            project.summary.update_data_columns(tasks)
             # TODO: project.summary.update_created_annotations_and_labels
         else:
             # Do nothing - just output file upload ids for further use
@@ -368,8 +367,10 @@ class ImportPredictionsAPI(generics.CreateAPIView):
                     model_version=item.get('model_version', 'undefined'),
                 )
             )
-        predictions_obj = Prediction.objects.bulk_create(predictions, batch_size=settings.BATCH_SIZE)
-        start_job_async_or_sync(update_tasks_counters, Task.objects.filter(id__in=tasks_ids))
+        with deferred_tasks_counters():
+            predictions_obj = Prediction.objects.bulk_create(predictions, batch_size=settings.BATCH_SIZE)
+            # bulk_create sends no signals, so counters of the predicted tasks only are updated by the block
+            defer_tasks_counters_update({prediction.task_id for prediction in predictions})
         return Response({'created': len(predictions_obj)}, status=status.HTTP_201_CREATED)
 
 
@@ -3,17 +3,18 @@ import time
 import traceback
 from typing import Callable, Optional
 
-from core.utils.common import load_func
+from core.utils.common import iter_batches, load_func
 from django.conf import settings
 from django.db import transaction
 from projects.models import ProjectImport, ProjectReimport
+from rest_framework.exceptions import ValidationError
 from users.models import User
 from webhooks.models import WebhookAction
 from webhooks.utils import emit_webhooks_for_instance
 
 from .models import FileUpload
 from .serializers import ImportApiSerializer
-from .uploader import load_tasks_for_async_import
+from .uploader import iter_tasks_for_async_import, load_tasks_for_async_import
 
 logger = logging.getLogger(__name__)
 
@@ -38,6 +39,13 @@ def async_import_background(
     start = time.time()
     project = project_import.project
     tasks = None
+
+    if settings.IMPORT_STREAMING and project_import.commit_to_project:
+        # parse files lazily and commit tasks batch by batch, so memory usage doesn't depend on the file size
+        result = async_import_streaming(project_import, user)
+        _finish_async_import(project_import, time.time() - start, *result)
+        return
+
     # upload files from request, and parse all tasks
     # TODO: Stop passing request to load_tasks function, make all validation before
     tasks, file_upload_ids, found_formats, data_columns = load_tasks_for_async_import(project_import, user)
@@ -82,8 +90,30 @@ def async_import_background(
         annotation_count = None
         prediction_count = None
 
-    duration = time.time() - start
+    _finish_async_import(
+        project_import,
+        time.time() - start,
+        task_count,
+        annotation_count,
+        prediction_count,
+        file_upload_ids,
+        found_formats,
+        data_columns,
+        [task.id for task in tasks] if project_import.return_task_ids else None,
+    )
+
 
+def _finish_async_import(
+    project_import,
+    duration,
+    task_count,
+    annotation_count,
+    prediction_count,
+    file_upload_ids,
+    found_formats,
+    data_columns,
+    task_ids,
+):
     project_import.task_count = task_count or 0
     project_import.annotation_count = annotation_count or 0
     project_import.prediction_count = prediction_count or 0
@@ -92,12 +122,81 @@ def async_import_background(
     project_import.found_formats = found_formats
     project_import.data_columns = data_columns
     if project_import.return_task_ids:
-        project_import.task_ids = [task.id for task in tasks]
+        project_import.task_ids = task_ids
 
     project_import.status = ProjectImport.Status.COMPLETED
     project_import.save()
 
 
+def async_import_streaming(project_import, user):
+    """Parse import sources lazily and create tasks in batches of settings.IMPORT_BATCH_SIZE.
+
+    Every batch is validated and committed separately, so peak memory is bounded by the batch size.
+    If a batch fails, the batches committed before it stay in the project.
+    """
+    project = project_import.project
+    stats = {}
+    task_count, annotation_count, prediction_count = 0, 0, 0
+    task_ids = []
+
+    tasks = iter_tasks_for_async_import(project_import, user, stats)
+    for batch in iter_batches(tasks, settings.IMPORT_BATCH_SIZE):
+        if task_count + len(batch) > settings.TASKS_MAX_NUMBER:
+            raise ValidationError(
+                f'Maximum task number is {settings.TASKS_MAX_NUMBER}, '
+                f'current task number is at least {task_count + len(batch)}'
+            )
+
+        if project_import.preannotated_from_fields:
+            batch = reformat_predictions(batch, project_import.preannotated_from_fields)
+
+        serializer = ImportApiSerializer(data=batch, many=True, context={'project': project})
+        serializer.is_valid(raise_exception=True)
+        db_tasks = serializer.save(project_id=project.id)
+        emit_webhooks_for_instance(user.active_organization, project, WebhookAction.TASKS_CREATED, db_tasks)
+
+        batch_counts = {
+            'task_count': len(db_tasks),
+            'annotation_count': len(serializer.db_annotations),
+            'prediction_count': len(serializer.db_predictions),
+        }
+        task_count += batch_counts['task_count']
+        annotation_count += batch_counts['annotation_count']
+        prediction_count += batch_counts['prediction_count']
+        if project_import.return_task_ids:
+            task_ids += [task.id for task in db_tasks]
+
+        # task states (overlap, is_labeled) are rearranged once for the whole import below
+        project.update_tasks_counters_and_task_states(
+            tasks_queryset=db_tasks,
+            maximum_annotations_changed=False,
+            overlap_cohort_percentage_changed=False,
+            tasks_number_changed=False,
+            recalculate_stats_counts=batch_counts,
+        )
+        project.summary.update_data_columns(db_tasks)
+        logger.info(f'Import {project_import.id}: {task_count} tasks committed')
+
+    # empty tasks error
+    if not task_count:
+        raise ValidationError('load_tasks: No tasks added')
+
+    project.update_tasks_states(
+        maximum_annotations_changed=False, overlap_cohort_percentage_changed=False, tasks_number_changed=True
+    )
+    logger.info('Tasks bulk_update finished (async streaming import)')
+
+    return (
+        task_count,
+        annotation_count,
+        prediction_count,
+        stats['file_upload_ids'],
+        dict(stats['found_formats']),
+        list(stats['data_columns']),
+        task_ids,
+    )
+
+
 def set_import_background_failure(job, connection, type, value, _):
     import_id = job.args[0]
     ProjectImport.objects.filter(id=import_id).update(
@@ -5,6 +5,7 @@ import os
 import uuid
 from collections import Counter
 
+import ijson
 import pandas as pd
 
 try:
@@ -101,14 +102,53 @@ class FileUpload(models.Model):
             tasks = json.loads(raw_data.decode('utf8'))
         if isinstance(tasks, dict):
             tasks = [tasks]
-        tasks_formatted = []
-        for i, task in enumerate(tasks):
-            if not task.get('data'):
-                task = {'data': task}
-            if not isinstance(task['data'], dict):
-                raise ValidationError('Task item should be dict')
-            tasks_formatted.append(task)
-        return tasks_formatted
+        return [self._format_json_task(task) for task in tasks]
+
+    def read_tasks_list_from_jsonl(self):
+        logger.debug('Read tasks list from JSON Lines file {}'.format(self.file.name))
+        return list(self.iter_tasks_list_from_jsonl())
+
+    @staticmethod
+    def _format_json_task(task):
+        if not task.get('data'):
+            task = {'data': task}
+        if not isinstance(task['data'], dict):
+            raise ValidationError('Task item should be dict')
+        return task
+
+    def iter_tasks_list_from_csv(self, sep=','):
+        logger.debug('Stream tasks list from CSV file {}'.format(self.file.name))
+        with self.file.open() as f:
+            for chunk in pd.read_csv(f, sep=sep, chunksize=settings.IMPORT_BATCH_SIZE):
+                for task in chunk.fillna('').to_dict('records'):
+                    yield {'data': task}
+
+    def iter_tasks_list_from_txt(self):
+        logger.debug('Stream tasks list from text file {}'.format(self.file.name))
+        with self.file.open('rb') as f:
+            for line in f:
+                yield {'data': {settings.DATA_UNDEFINED_NAME: line.decode('utf-8').rstrip('\r\n')}}
+
+    def iter_tasks_list_from_json(self):
+        """Parse JSON incrementally: a root list is read item by item, a root dict is a single task"""
+        logger.debug('Stream tasks list from JSON file {}'.format(self.file.name))
+        with self.file.open('rb') as f:
+            head = f.read(1024).lstrip(b'\xef\xbb\xbf \t\r\n')
+            f.seek(0)
+            if head.startswith(b'['):
+                tasks = ijson.items(f, 'item', use_float=True)
+            else:
+                tasks = [json.loads(f.read().decode('utf-8-sig'))]
+            for task in tasks:
+                yield self._format_json_task(task)
+
+    def iter_tasks_list_from_jsonl(self):
+        logger.debug('Stream tasks list from JSON Lines file {}'.format(self.file.name))
+        with self.file.open('rb') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield self._format_json_task(json.loads(line))
 
     def read_task_from_hypertext_body(self):
         logger.debug('Read 1 task from hypertext file {}'.format(self.file.name))
@@ -140,6 +180,8 @@ class FileUpload(models.Model):
                 tasks = self.read_tasks_list_from_txt()
             elif file_format == '.json':
                 tasks = self.read_tasks_list_from_json()
+            elif file_format == '.jsonl':
+                tasks = self.read_tasks_list_from_jsonl()
 
             # otherwise - only one object tag should be presented in label config
             elif not self.project.one_object_in_label_config:
@@ -158,6 +200,27 @@ class FileUpload(models.Model):
             raise ValidationError('Failed to parse input file ' + self.file.name + ': ' + str(exc))
         return tasks
 
+    def iter_tasks(self, file_as_tasks_list=True):
+        """Same as read_tasks, but tasks lists (CSV, TSV, TXT, JSON, JSON Lines) are parsed lazily,
+        so only the current parser chunk is kept in memory
+        """
+        file_format = self.format
+        try:
+            if file_format in ('.csv', '.tsv') and file_as_tasks_list:
+                yield from self.iter_tasks_list_from_csv(sep='\t' if file_format == '.tsv' else ',')
+            elif file_format == '.txt' and file_as_tasks_list:
+                yield from self.iter_tasks_list_from_txt()
+            elif file_format == '.json':
+                yield from self.iter_tasks_list_from_json()
+            elif file_format == '.jsonl':
+                yield from self.iter_tasks_list_from_jsonl()
+            else:
+                yield from self.read_tasks(file_as_tasks_list)
+        except ValidationError:
+            raise
+        except Exception as exc:
+            raise ValidationError('Failed to parse input file ' + self.file.name + ': ' + str(exc))
+
     @classmethod
     def load_tasks_from_uploaded_files(
         cls, project, file_upload_ids=None, formats=None, files_as_tasks_list=True, trim_size=None
@@ -179,16 +242,7 @@ class FileUpload(models.Model):
                 task['file_upload_id'] = file_upload.id
 
             new_data_fields = set(iter(new_tasks[0]['data'].keys())) if len(new_tasks) > 0 else set()
-            if not common_data_fields:
-                common_data_fields = new_data_fields
-            elif not common_data_fields.intersection(new_data_fields):
-                raise ValidationError(
-                    _old_vs_new_data_keys_inconsistency_message(
-                        new_data_fields, common_data_fields, file_upload.file.name
-                    )
-                )
-            else:
-                common_data_fields &= new_data_fields
+            common_data_fields = _intersect_data_fields(common_data_fields, new_data_fields, file_upload.file.name)
 
             tasks += new_tasks
             fileformats.append(file_format)
@@ -199,6 +253,41 @@ class FileUpload(models.Model):
 
         return tasks, dict(Counter(fileformats)), common_data_fields
 
+    @classmethod
+    def iter_tasks_from_uploaded_files(cls, project, file_upload_ids=None, files_as_tasks_list=True, stats=None):
+        """Lazy version of load_tasks_from_uploaded_files: tasks are yielded one by one while files are parsed.
+
+        :param stats: optional dict, it's filled with 'found_formats' and 'data_columns' as files are scanned
+        """
+        stats = {} if stats is None else stats
+        stats.setdefault('found_formats', {})
+        stats.setdefault('data_columns', set())
+
+        file_uploads = FileUpload.objects.filter(project=project)
+        if file_upload_ids:
+            file_uploads = file_uploads.filter(id__in=file_upload_ids)
+        for file_upload in file_uploads:
+            file_format = file_upload.format
+            for i, task in enumerate(file_upload.iter_tasks(files_as_tasks_list)):
+                if i == 0:
+                    stats['data_columns'] = _intersect_data_fields(
+                        stats['data_columns'], set(task['data'].keys()), file_upload.file.name
+                    )
+                task['file_upload_id'] = file_upload.id
+                yield task
+
+            stats['found_formats'][file_format] = stats['found_formats'].get(file_format, 0) + 1
+
+
+def _intersect_data_fields(common_data_fields, new_data_fields, current_file):
+    if not common_data_fields:
+        return new_data_fields
+    if not common_data_fields.intersection(new_data_fields):
+        raise ValidationError(
+            _old_vs_new_data_keys_inconsistency_message(new_data_fields, common_data_fields, current_file)
+        )
+    return common_data_fields & new_data_fields
+
 
 def _old_vs_new_data_keys_inconsistency_message(new_data_keys, old_data_keys, current_file):
     new_data_keys_list = ','.join(new_data_keys)
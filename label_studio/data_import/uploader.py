@@ -122,18 +122,23 @@ def str_to_json(data):
         return None
 
 
+def file_upload_from_url(user, project, url):
+    """Download file using URL and save it as FileUpload"""
+    filename = url.rsplit('/', 1)[-1]
+
+    response = ssrf_safe_get(
+        url, verify=project.organization.should_verify_ssl_certs(), stream=True, headers={'Accept-Encoding': None}
+    )
+    file_content = response.content
+    check_tasks_max_file_size(int(response.headers['content-length']))
+    return create_file_upload(user, project, SimpleUploadedFile(filename, file_content))
+
+
 def tasks_from_url(file_upload_ids, project, user, url, could_be_tasks_list):
     """Download file using URL and read tasks from it"""
     # process URL with tasks
     try:
-        filename = url.rsplit('/', 1)[-1]
-
-        response = ssrf_safe_get(
-            url, verify=project.organization.should_verify_ssl_certs(), stream=True, headers={'Accept-Encoding': None}
-        )
-        file_content = response.content
-        check_tasks_max_file_size(int(response.headers['content-length']))
-        file_upload = create_file_upload(user, project, SimpleUploadedFile(filename, file_content))
+        file_upload = file_upload_from_url(user, project, url)
         if file_upload.format_could_be_tasks_list:
             could_be_tasks_list = True
         file_upload_ids.append(file_upload.id)
@@ -217,6 +222,46 @@ def load_tasks_for_async_import(project_import, user):
     return tasks, file_upload_ids, found_formats, list(data_keys)
 
 
+def iter_tasks_for_async_import(project_import, user, stats):
+    """Streaming version of load_tasks_for_async_import: tasks are yielded one by one and files are parsed lazily.
+
+    :param stats: dict, it's filled with 'file_upload_ids', 'found_formats' and 'data_columns'
+    """
+    project = project_import.project
+    stats.update({'file_upload_ids': [], 'found_formats': {}, 'data_columns': set()})
+
+    if project_import.file_upload_ids:
+        stats['file_upload_ids'] = project_import.file_upload_ids
+
+    # take tasks from url address
+    elif project_import.url:
+        url = project_import.url
+        # try to load json with task or tasks from url as string
+        if str_to_json(url):
+            file_upload = create_file_upload(user, project, SimpleUploadedFile('inplace.json', url.encode()))
+
+        # download file using url and read tasks from it
+        else:
+            try:
+                file_upload = file_upload_from_url(user, project, url)
+            except ValidationError as e:
+                raise e
+            except Exception as e:
+                raise ValidationError(str(e))
+            if file_upload.format_could_be_tasks_list:
+                project_import.could_be_tasks_list = True
+                project_import.save(update_fields=['could_be_tasks_list'])
+        stats['file_upload_ids'] = [file_upload.id]
+
+    elif project_import.tasks:
+        if not isinstance(project_import.tasks, list):
+            raise ValidationError('load_tasks: Data root must be list')
+        yield from project_import.tasks
+        return
+
+    yield from FileUpload.iter_tasks_from_uploaded_files(project, stats['file_upload_ids'], stats=stats)
+
+
 def load_tasks(request, project):
     """Load tasks from different types of request.data / request.files"""
     file_upload_ids, found_formats, data_keys = [], [], set()
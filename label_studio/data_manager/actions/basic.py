@@ -9,8 +9,7 @@ from core.utils.common import load_func
 from data_manager.functions import evaluate_predictions
 from django.conf import settings
 from projects.models import Project
-from tasks.functions import update_tasks_counters
-from tasks.models import Annotation, AnnotationDraft, Prediction, Task
+from tasks.models import Annotation, AnnotationDraft, Prediction, Task, deferred_tasks_counters
 from webhooks.models import WebhookAction
 from webhooks.utils import emit_webhooks_for_instance
 
@@ -116,10 +115,10 @@ def delete_tasks_predictions(project, queryset, **kwargs):
     """
     task_ids = queryset.values_list('id', flat=True)
     predictions = Prediction.objects.filter(task__id__in=task_ids)
-    real_task_ids = set(list(predictions.values_list('task__id', flat=True)))
     count = predictions.count()
-    predictions.delete()
-    start_job_async_or_sync(update_tasks_counters, Task.objects.filter(id__in=real_task_ids))
+    # prediction delete signals are coalesced into one counters update per task
+    with deferred_tasks_counters():
+        predictions.delete()
     return {'processed_items': count, 'detail': 'Deleted ' + str(count) + ' predictions'}
 
 
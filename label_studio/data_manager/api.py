@@ -1,5 +1,7 @@
 """This file and its contents are licensed under the Apache License 2.0. Please see the included NOTICE for copyright information and LICENSE for a copy of the license.
 """
+import base64
+import json
 import logging
 
 from asgiref.sync import async_to_sync, sync_to_async
@@ -12,7 +14,11 @@ from data_manager.functions import evaluate_predictions, get_prepare_params, get
 from data_manager.managers import get_fields_for_evaluation
 from data_manager.models import View
 from data_manager.serializers import DataManagerTaskSerializer, ViewResetSerializer, ViewSerializer
+from data_manager.totals import get_tasks_totals
 from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import F, Q
+from django.db.models.expressions import OrderBy
 from django.utils.decorators import method_decorator
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg import openapi
@@ -21,10 +27,11 @@ from projects.models import Project
 from projects.serializers import ProjectSerializer
 from rest_framework import generics, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from tasks.models import Annotation, Prediction, Task
+from tasks.models import Annotation, Task
 
 logger = logging.getLogger(__name__)
 
@@ -133,22 +140,33 @@ class ViewAPI(viewsets.ModelViewSet):
 class TaskPagination(PageNumberPagination):
     page_size = 100
     page_size_query_param = 'page_size'
+    total = None
     total_annotations = 0
     total_predictions = 0
     max_page_size = settings.TASK_API_PAGE_SIZE_MAX
 
+    def django_paginator_class(self, queryset, page_size):
+        paginator = Paginator(queryset, page_size)
+        # total is already known from get_tasks_totals(), so the paginator doesn't count tasks again
+        if self.total is not None:
+            paginator.count = self.total
+        return paginator
+
+    def set_totals(self, totals):
+        self.total = totals['total']
+        self.total_annotations = totals['total_annotations']
+        self.total_predictions = totals['total_predictions']
+
     @async_to_sync
     async def async_paginate_queryset(self, queryset, request, view=None):
-        predictions_count_qs = Prediction.objects.filter(task_id__in=queryset)
-        self.total_predictions = await sync_to_async(predictions_count_qs.count, thread_sensitive=True)()
-
-        annotations_count_qs = Annotation.objects.filter(task_id__in=queryset, was_cancelled=False)
-        self.total_annotations = await sync_to_async(annotations_count_qs.count, thread_sensitive=True)()
+        project = getattr(view, 'project', None)
+        totals = await sync_to_async(get_tasks_totals, thread_sensitive=True)(queryset, project and project.id)
+        self.set_totals(totals)
         return await sync_to_async(super().paginate_queryset, thread_sensitive=True)(queryset, request, view)
 
     def sync_paginate_queryset(self, queryset, request, view=None):
-        self.total_predictions = Prediction.objects.filter(task_id__in=queryset).count()
-        self.total_annotations = Annotation.objects.filter(task_id__in=queryset, was_cancelled=False).count()
+        project = getattr(view, 'project', None)
+        self.set_totals(get_tasks_totals(queryset, project and project.id))
         return super().paginate_queryset(queryset, request, view)
 
     def paginate_queryset(self, queryset, request, view=None):
@@ -168,6 +186,120 @@ class TaskPagination(PageNumberPagination):
         )
 
 
+class TaskCursorPagination:
+    """Keyset pagination: the next page is selected by the last (ordering value, id) pair of the previous one
+    instead of OFFSET, so deep pages are as fast as the first one. Totals aren't calculated
+    unless `include_total` is passed, because counting is often the most expensive part of the request.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = settings.TASK_API_PAGE_SIZE_MAX
+
+    def __init__(self):
+        self.next_cursor = None
+        self.include_total = False
+        self.total = self.total_annotations = self.total_predictions = None
+
+    def get_page_size(self, request):
+        page_size = max(1, int_from_request(request.GET, self.page_size_query_param, self.page_size))
+        return min(page_size, self.max_page_size) if self.max_page_size else page_size
+
+    @staticmethod
+    def get_ordering(queryset):
+        """Get (field name, descending) of the queryset ordering applied by apply_ordering()"""
+        order_by = queryset.query.order_by
+        if not order_by:
+            return 'id', False
+        if len(order_by) > 1:
+            raise ValidationError('Cursor pagination supports ordering by one field only')
+
+        item = order_by[0]
+        if isinstance(item, str):
+            return item.lstrip('-'), item.startswith('-')
+        if isinstance(item, OrderBy) and isinstance(item.expression, F):
+            return item.expression.name, item.descending
+        raise ValidationError('This ordering is not supported by cursor pagination')
+
+    @staticmethod
+    def encode_cursor(field, value, task_id):
+        # str() keeps microseconds of datetimes, they are needed for exact keyset comparison
+        data = json.dumps({'f': field, 'v': value, 'id': task_id}, default=str)
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor, field):
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            value, task_id = data['v'], int(data['id'])
+        except (ValueError, KeyError, TypeError):
+            raise ValidationError('Invalid cursor')
+        if data.get('f') != field:
+            raise ValidationError('Cursor was created for another ordering')
+        return value, task_id
+
+    @staticmethod
+    def keyset_filter(field, descending, value, task_id):
+        """Tasks after (value, task_id) for `field` ordering with nulls last and id as a tie-breaker"""
+        if field in ('id', 'pk'):
+            return Q(id__lt=task_id) if descending else Q(id__gt=task_id)
+        if value is None:
+            return Q(**{f'{field}__isnull': True, 'id__gt': task_id})
+        lookup = 'lt' if descending else 'gt'
+        return (
+            Q(**{f'{field}__{lookup}': value})
+            | Q(**{field: value, 'id__gt': task_id})
+            | Q(**{f'{field}__isnull': True})
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.include_total = bool_from_request(request.GET, 'include_total', False)
+        if self.include_total:
+            project = getattr(view, 'project', None)
+            totals = get_tasks_totals(queryset, project and project.id)
+            self.total = totals['total']
+            self.total_annotations = totals['total_annotations']
+            self.total_predictions = totals['total_predictions']
+
+        field, descending = self.get_ordering(queryset)
+        if field not in ('id', 'pk'):
+            # id makes the ordering unique, so pages never overlap or skip tasks with equal values
+            queryset = queryset.order_by(*queryset.query.order_by, 'id')
+
+        cursor = request.GET.get(self.cursor_query_param)
+        if cursor:
+            value, task_id = self.decode_cursor(cursor, field)
+            queryset = queryset.filter(self.keyset_filter(field, descending, value, task_id))
+
+        page_size = self.get_page_size(request)
+        page = list(queryset[: page_size + 1])
+        if len(page) > page_size:
+            page = page[:page_size]
+            last = page[-1]
+            if field in ('id', 'pk'):
+                value = None
+            elif hasattr(last, field):
+                value = getattr(last, field)
+            else:
+                # ordering by related field lookup
+                value = queryset.filter(id=last.id).values_list(field, flat=True).first()
+            self.next_cursor = self.encode_cursor(field, value, last.id)
+        return page
+
+    def get_paginated_response(self, data):
+        response = {'next_cursor': self.next_cursor, 'tasks': data}
+        if self.include_total:
+            response.update(
+                {
+                    'total_annotations': self.total_annotations,
+                    'total_predictions': self.total_predictions,
+                    'total': self.total,
+                }
+            )
+        return Response(response)
+
+
 class TaskListAPI(generics.ListCreateAPIView):
     task_serializer_class = DataManagerTaskSerializer
     permission_required = ViewClassPermission(
@@ -179,6 +311,16 @@ class TaskListAPI(generics.ListCreateAPIView):
     )
     pagination_class = TaskPagination
 
+    @property
+    def paginator(self):
+        """Keyset pagination is used when `cursor` param is passed (it's empty for the first page)"""
+        if not hasattr(self, '_paginator'):
+            if TaskCursorPagination.cursor_query_param in self.request.GET:
+                self._paginator = TaskCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     @staticmethod
     def get_task_serializer_context(request, project):
         all_fields = request.GET.get('fields', None) == 'all'  # false by default
@@ -223,6 +365,8 @@ class TaskListAPI(generics.ListCreateAPIView):
             self.check_object_permissions(request, project)
         else:
             return Response({'detail': 'Neither project nor view id specified'}, status=404)
+        # paginators use it to cache totals
+        self.project = project
         # get prepare params (from view or from payload directly)
         prepare_params = get_prepare_params(request, project)
         queryset = self.get_task_queryset(request, prepare_params)
@@ -0,0 +1,120 @@
+"""This file and its contents are licensed under the Apache License 2.0. Please see the included NOTICE for copyright information and LICENSE for a copy of the license.
+"""
+import logging
+
+import ujson as json
+from data_manager.models import IndexedDataColumn, TaskDataValue
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, FilteredRelation, Q
+
+logger = logging.getLogger(__name__)
+
+
+def get_indexed_data_columns(project):
+    """Indexed data columns of the project by task data key, cached on the project instance"""
+    if not hasattr(project, '_indexed_data_columns'):
+        project._indexed_data_columns = {column.key: column for column in project.indexed_data_columns.all()}
+    return project._indexed_data_columns
+
+
+def to_number(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def to_text(value):
+    # the same text representation as KeyTextTransform (->> operator) returns
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def index_tasks_data(project, tasks, columns=None):
+    """Materialize values of indexed data columns for the tasks, existing values are replaced
+
+    :param project: project of the tasks
+    :param tasks: saved Task instances, other items (like raw task dicts) are skipped
+    :param columns: IndexedDataColumn list, all project indexed columns by default
+    """
+    from tasks.models import Task
+
+    if columns is None:
+        columns = list(get_indexed_data_columns(project).values())
+    tasks = [task for task in tasks if isinstance(task, Task) and task.id is not None]
+    if not columns or not tasks:
+        return
+
+    values = []
+    for task in tasks:
+        data = task.data if isinstance(task.data, dict) else {}
+        for column in columns:
+            value = data.get(column.key)
+            if value is None:
+                continue
+            values.append(TaskDataValue(column=column, task_id=task.id, number=to_number(value), text=to_text(value)))
+
+    with transaction.atomic():
+        TaskDataValue.objects.filter(column__in=columns, task_id__in=[task.id for task in tasks]).delete()
+        TaskDataValue.objects.bulk_create(values, batch_size=settings.BATCH_SIZE)
+
+
+def add_indexed_data_columns(project, keys):
+    """Start indexing task data keys and backfill values for existing project tasks
+
+    :return: list of new IndexedDataColumn
+    """
+    existing = get_indexed_data_columns(project)
+    columns = [
+        IndexedDataColumn.objects.create(project=project, key=key)
+        for key in dict.fromkeys(keys)
+        if key not in existing
+    ]
+    project.__dict__.pop('_indexed_data_columns', None)
+    if not columns:
+        return columns
+
+    tasks = project.tasks.only('id', 'data').order_by('id')
+    batch, total = [], 0
+    for task in tasks.iterator(chunk_size=settings.BATCH_SIZE):
+        batch.append(task)
+        if len(batch) >= settings.BATCH_SIZE:
+            index_tasks_data(project, batch, columns)
+            total += len(batch)
+            batch = []
+    index_tasks_data(project, batch, columns)
+    total += len(batch)
+    logger.info(f'Project {project.id}: indexed data columns {[c.key for c in columns]} for {total} tasks')
+    return columns
+
+
+def remove_indexed_data_columns(project, keys):
+    IndexedDataColumn.objects.filter(project=project, key__in=keys).delete()
+    project.__dict__.pop('_indexed_data_columns', None)
+
+
+def annotate_indexed_data_field(queryset, project, field_name, numeric):
+    """Join materialized values for `data__<key>` field name if the key is indexed
+
+    :return: (queryset, field name to filter or order by), field name is None if the key is not indexed
+    """
+    if project is None or not field_name.startswith('data__'):
+        return queryset, None
+    column = get_indexed_data_columns(project).get(field_name[len('data__') :])
+    if column is None:
+        return queryset, None
+
+    alias = f'indexed_data_{column.id}'
+    value_field = 'number' if numeric else 'text'
+    if alias not in queryset.query._filtered_relations:
+        queryset = queryset.annotate(
+            **{alias: FilteredRelation('indexed_data_values', condition=Q(indexed_data_values__column=column))}
+        )
+    # filter by annotation, not by the joined field: negated lookups on a nullable join would
+    # include tasks without the key, while KeyTextTransform filters exclude them
+    annotation = f'{alias}_{value_field}'
+    if annotation not in queryset.query.annotations:
+        queryset = queryset.annotate(**{annotation: F(f'{alias}__{value_field}')})
+    return queryset, annotation
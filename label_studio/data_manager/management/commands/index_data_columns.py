@@ -0,0 +1,25 @@
+import logging
+
+from data_manager.indexed_columns import add_indexed_data_columns, remove_indexed_data_columns
+from django.core.management.base import BaseCommand
+from projects.models import Project
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Index task data keys for fast Data Manager filtering and ordering (or remove them with --remove)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('project', type=int, help='project id')
+        parser.add_argument('keys', nargs='+', help='task data keys')
+        parser.add_argument('--remove', action='store_true', help='remove indexed columns instead of adding')
+
+    def handle(self, *args, **options):
+        project = Project.objects.get(id=options['project'])
+        if options['remove']:
+            remove_indexed_data_columns(project, options['keys'])
+            logger.debug(f"Project {project.id}: removed indexed data columns {options['keys']}.")
+        else:
+            columns = add_indexed_data_columns(project, options['keys'])
+            logger.debug(f'Project {project.id}: added indexed data columns {[c.key for c in columns]}.')
@@ -7,10 +7,13 @@ from datetime import datetime
 import ujson as json
 from core.feature_flags import flag_set
 from core.utils.db import fast_first
+from data_manager.indexed_columns import annotate_indexed_data_field
 from data_manager.prepare_params import ConjunctionEnum
 from django.conf import settings
 from django.contrib.postgres.aggregates import ArrayAgg
+from django.contrib.postgres.fields import ArrayField
 from django.contrib.postgres.fields.jsonb import KeyTextTransform
+from django.core.exceptions import FieldDoesNotExist
 from django.db import models
 from django.db.models import (
     Aggregate,
@@ -156,7 +159,12 @@ def apply_ordering(queryset, ordering, project, request, view_data=None):
             # annotate task with data field for float/int/bool ordering support
             json_field = field_name.replace('data__', '')
             numeric_ordering_applied = False
-            if numeric_ordering is True:
+            queryset, indexed_field = annotate_indexed_data_field(queryset, project, field_name, numeric_ordering)
+            if indexed_field:
+                # materialized typed values are used, so no fallback probing is needed
+                queryset = queryset.annotate(ordering_field=F(indexed_field))
+                numeric_ordering_applied = True
+            elif numeric_ordering is True:
                 queryset = queryset.annotate(
                     ordering_field=Cast(KeyTextTransform(json_field, 'data'), output_field=FloatField())
                 )
@@ -258,6 +266,31 @@ def add_user_filter(enabled, key, _filter, filter_expressions):
         return 'continue'
 
 
+def get_field_value_type(queryset, project, field_name):
+    """Python type name of field values, resolved from the queryset annotations, Task model fields
+    and sampled data column types, so no tasks are queried for it
+    """
+    if field_name.startswith('data__'):
+        return project.summary.get_data_column_type(field_name[len('data__') :])
+
+    if field_name in queryset.query.annotations:
+        output_field = queryset.query.annotations[field_name].output_field
+    else:
+        try:
+            model, output_field = queryset.model, None
+            for part in field_name.split('__'):
+                output_field = model._meta.get_field(part)
+                model = output_field.related_model
+        except FieldDoesNotExist:
+            return 'str'
+
+    if isinstance(output_field, ArrayField):
+        return 'list'
+    if isinstance(output_field, (models.CharField, models.TextField)):
+        return 'str'
+    return type(output_field).__name__
+
+
 def apply_filters(queryset, filters, project, request):
     if not filters:
         return queryset
@@ -337,8 +370,17 @@ def apply_filters(queryset, filters, project, request):
         if field_name == 'file_upload':
             field_name = 'file_upload_field'
 
+        # use materialized values of indexed data columns if available
+        indexed_field = None
+        if _filter.type in ('Number', 'String', 'Unknown'):
+            queryset, indexed_field = annotate_indexed_data_field(
+                queryset, project, field_name, _filter.type == 'Number'
+            )
+        if indexed_field:
+            field_name = clean_field_name = indexed_field
+
         # annotate with cast to number if need
-        if _filter.type == 'Number' and field_name.startswith('data__'):
+        elif _filter.type == 'Number' and field_name.startswith('data__'):
             json_field = field_name.replace('data__', '')
             queryset = queryset.annotate(
                 **{
@@ -360,9 +402,7 @@ def apply_filters(queryset, filters, project, request):
             _filter.value = 0
 
         # get type of annotated field
-        value_type = 'str'
-        if queryset.exists():
-            value_type = type(queryset.values_list(field_name, flat=True)[0]).__name__
+        value_type = get_field_value_type(queryset, project, field_name)
 
         if (value_type == 'list' or value_type == 'tuple') and 'equal' in _filter.operator:
             raise Exception('Not supported filter type')
@@ -0,0 +1,46 @@
+# Generated by Django 3.2.25 on 2026-10-18 22:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0047_merge_20240318_2210'),
+        ('projects', '0026_auto_20231103_0020'),
+        ('data_manager', '0010_auto_20230718_1423'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexedDataColumn',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='Task data key', max_length=1024, verbose_name='key')),
+                ('project', models.ForeignKey(help_text='Project ID', on_delete=django.db.models.deletion.CASCADE, related_name='indexed_data_columns', to='projects.project')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TaskDataValue',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.FloatField(help_text='Value casted to number, null if not numeric', null=True, verbose_name='number')),
+                ('text', models.TextField(help_text='Value as text', null=True, verbose_name='text')),
+                ('column', models.ForeignKey(help_text='Indexed column', on_delete=django.db.models.deletion.CASCADE, related_name='values', to='data_manager.indexeddatacolumn')),
+                ('task', models.ForeignKey(help_text='Task ID', on_delete=django.db.models.deletion.CASCADE, related_name='indexed_data_values', to='tasks.task')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='taskdatavalue',
+            index=models.Index(fields=['column', 'number'], name='data_manage_column__10125d_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='taskdatavalue',
+            unique_together={('column', 'task')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='indexeddatacolumn',
+            unique_together={('project', 'key')},
+        ),
+    ]
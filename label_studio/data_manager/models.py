@@ -83,3 +83,34 @@ class Filter(models.Model):
     type = models.CharField(_('type'), max_length=1024, help_text='Field type')
     operator = models.CharField(_('operator'), max_length=1024, help_text='Filter operator')
     value = models.JSONField(_('value'), default=dict, null=True, help_text='Filter value')
+
+
+class IndexedDataColumn(models.Model):
+    """Task data key materialized into TaskDataValue rows, so filtering and ordering can use db indexes"""
+
+    project = models.ForeignKey(
+        'projects.Project', related_name='indexed_data_columns', on_delete=models.CASCADE, help_text='Project ID'
+    )
+    key = models.CharField(_('key'), max_length=1024, help_text='Task data key')
+
+    class Meta:
+        unique_together = ('project', 'key')
+
+
+class TaskDataValue(models.Model):
+    """Typed value of an indexed task data key"""
+
+    column = models.ForeignKey(
+        'data_manager.IndexedDataColumn', related_name='values', on_delete=models.CASCADE, help_text='Indexed column'
+    )
+    task = models.ForeignKey(
+        'tasks.Task', related_name='indexed_data_values', on_delete=models.CASCADE, help_text='Task ID'
+    )
+    number = models.FloatField(_('number'), null=True, help_text='Value casted to number, null if not numeric')
+    text = models.TextField(_('text'), null=True, help_text='Value as text')
+
+    class Meta:
+        unique_together = ('column', 'task')
+        indexes = [
+            models.Index(fields=['column', 'number']),
+        ]
@@ -0,0 +1,68 @@
+"""This file and its contents are licensed under the Apache License 2.0. Please see the included NOTICE for copyright information and LICENSE for a copy of the license.
+"""
+import hashlib
+import logging
+from uuid import uuid4
+
+import ujson as json
+from core.redis import redis_connected, redis_get, redis_set
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+
+logger = logging.getLogger(__name__)
+
+
+def _project_data_version_key(project_id):
+    return f'project-data-version:{project_id}'
+
+
+def bump_project_data_version(project_id):
+    """Invalidate all cached data manager totals of the project"""
+    if settings.DATA_MANAGER_TOTALS_CACHE_TTL and project_id:
+        redis_set(_project_data_version_key(project_id), uuid4().hex)
+
+
+def calculate_tasks_totals(queryset):
+    from tasks.models import Annotation, Prediction
+
+    return {
+        'total': queryset.count(),
+        'total_annotations': Annotation.objects.filter(task_id__in=queryset, was_cancelled=False).count(),
+        'total_predictions': Prediction.objects.filter(task_id__in=queryset).count(),
+    }
+
+
+def _get_totals_cache_key(queryset, project_id):
+    try:
+        # SQL covers view filters, selected items and user specific restrictions of the queryset
+        sql, params = queryset.order_by().query.sql_with_params()
+    except EmptyResultSet:
+        return None
+    version = redis_get(_project_data_version_key(project_id))
+    digest = hashlib.sha1(f'{version}:{sql}:{params}'.encode()).hexdigest()
+    return f'dm-totals:{project_id}:{digest}'
+
+
+def get_tasks_totals(queryset, project_id=None):
+    """Get tasks, annotations and predictions totals for the filtered tasks queryset,
+    totals are cached in redis by the queryset SQL and the project data version
+
+    :param queryset: filtered tasks queryset
+    :param project_id: project of the tasks, totals are calculated from scratch without it
+    :return: dict with total, total_annotations and total_predictions
+    """
+    ttl = settings.DATA_MANAGER_TOTALS_CACHE_TTL
+    if not ttl or not project_id or not redis_connected():
+        return calculate_tasks_totals(queryset)
+
+    key = _get_totals_cache_key(queryset, project_id)
+    if key is None:
+        return calculate_tasks_totals(queryset)
+
+    cached = redis_get(key)
+    if cached:
+        return json.loads(cached)
+
+    totals = calculate_tasks_totals(queryset)
+    redis_set(key, json.dumps(totals), ttl=ttl)
+    return totals
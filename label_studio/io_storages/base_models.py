@@ -4,6 +4,7 @@ import base64
 import json
 import logging
 import traceback as tb
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from urllib.parse import urljoin
 
@@ -12,7 +13,8 @@ import rq
 import rq.exceptions
 from core.feature_flags import flag_set
 from core.redis import is_job_in_queue, is_job_on_worker, redis_connected
-from core.utils.common import load_func
+from core.utils.common import batch, load_func
+from core.utils.db import bulk_create_with_ids
 from data_export.serializers import ExportDataSerializer
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
@@ -22,9 +24,9 @@ from django.shortcuts import reverse
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django_rq import job
-from io_storages.utils import get_uri_via_regex
+from io_storages.utils import get_uri_via_regex, presigned_url_cache
 from rq.job import Job
-from tasks.models import Annotation, Task
+from tasks.models import Annotation, Prediction, Task
 from tasks.serializers import AnnotationSerializer, PredictionSerializer
 from webhooks.models import WebhookAction
 from webhooks.utils import emit_webhooks_for_instance
@@ -68,14 +70,19 @@ class StorageInfo(models.Model):
         self.last_sync_job = job_id
         self.save(update_fields=['last_sync_job'])
 
-    def info_set_queued(self):
+    def info_set_queued(self, incremental=False):
         self.last_sync = None
         self.last_sync_count = None
         self.last_sync_job = None
         self.status = self.Status.QUEUED
 
-        # reset and init meta
-        self.meta = {'attempts': self.meta.get('attempts', 0) + 1, 'time_queued': str(timezone.now())}
+        # reset and init meta, but keep the listing cursor for the next incremental syncs
+        meta = {'attempts': self.meta.get('attempts', 0) + 1, 'time_queued': str(timezone.now())}
+        if self.meta.get('sync_cursor'):
+            meta['sync_cursor'] = self.meta['sync_cursor']
+        if incremental:
+            meta['incremental'] = True
+        self.meta = meta
 
         self.save(update_fields=['last_sync_job', 'last_sync', 'last_sync_count', 'status', 'meta'])
 
@@ -225,12 +232,33 @@ class ImportStorage(Storage):
     def iterkeys(self):
         return iter(())
 
+    def iterkeys_after(self, start_after):
+        """Iterate over keys which are lexicographically greater than start_after,
+        storages able to start listing from the given key on their side should override it
+        """
+        return (key for key in self.iterkeys() if key > start_after)
+
     def get_data(self, key):
         raise NotImplementedError
 
     def generate_http_url(self, url):
         raise NotImplementedError
 
+    def generate_http_url_cached(self, url):
+        """generate_http_url() with caching of presigned urls by storage and url,
+        urls are cached for a half of presign TTL, so they are still valid for a while when served from the cache
+        """
+        presign_ttl = getattr(self, 'presign_ttl', None)
+        if not presign_ttl:
+            return self.generate_http_url(url)
+
+        key = f'{self.__class__.__name__}:{self.id}:{url}'
+        http_url = presigned_url_cache.get(key)
+        if http_url is None:
+            http_url = self.generate_http_url(url)
+            presigned_url_cache.set(key, http_url, ttl=presign_ttl * 60 / 2)
+        return http_url
+
     def can_resolve_url(self, url):
         # TODO: later check to the full prefix like "url.startswith(self.path_full)"
         # Search of occurrences inside string, e.g. for cases like "gs://bucket/file.pdf" or "<embed src='gs://bucket/file.pdf'/>"
@@ -275,7 +303,7 @@ class ImportStorage(Storage):
                     return uri.replace(extracted_uri, proxy_url)
                 else:
                     # resolve uri to url using storages
-                    http_url = self.generate_http_url(extracted_uri)
+                    http_url = self.generate_http_url_cached(extracted_uri)
 
                 return uri.replace(extracted_uri, http_url)
             except Exception:
@@ -293,8 +321,9 @@ class ImportStorage(Storage):
 
         raise NotImplementedError
 
-    @classmethod
-    def add_task(cls, data, project, maximum_annotations, max_inner_id, storage, key, link_class):
+    @staticmethod
+    def _split_task_data(data):
+        """Split raw task JSON from storage object into task data, predictions and annotations"""
         # predictions
         predictions = data.get('predictions', [])
         if predictions:
@@ -305,16 +334,20 @@ class ImportStorage(Storage):
 
         # annotations
         annotations = data.get('annotations', [])
-        cancelled_annotations = 0
         if annotations:
             if 'data' not in data:
                 raise ValueError(
                     'If you use "annotations" field in the task, ' 'you must put "data" field in the task too'
                 )
-            cancelled_annotations = len([a for a in annotations if a.get('was_cancelled', False)])
 
         if 'data' in data and isinstance(data['data'], dict):
             data = data['data']
+        return data, predictions, annotations
+
+    @classmethod
+    def add_task(cls, data, project, maximum_annotations, max_inner_id, storage, key, link_class):
+        data, predictions, annotations = cls._split_task_data(data)
+        cancelled_annotations = len([a for a in annotations if a.get('was_cancelled', False)])
 
         with transaction.atomic():
             task = Task.objects.create(
@@ -355,6 +388,97 @@ class ImportStorage(Storage):
         return task
         # FIXME: add_annotation_history / post_process_annotations should be here
 
+    @classmethod
+    def add_tasks(cls, tasks_data, keys, project, maximum_annotations, max_inner_id, storage, link_class):
+        """Bulk version of add_task: tasks, storage links, predictions and annotations
+        for a batch of storage keys are created with a few bulk INSERTs instead of per-row queries
+        """
+        raise_exception = not flag_set(
+            'ff_fix_back_dev_3342_storage_scan_with_invalid_annotations', user=AnonymousUser()
+        )
+
+        db_tasks, task_predictions, task_annotations = [], [], []
+        for i, data in enumerate(tasks_data):
+            data, predictions, annotations = cls._split_task_data(data)
+            cancelled_annotations = len([a for a in annotations if a.get('was_cancelled', False)])
+            db_tasks.append(
+                Task(
+                    data=data,
+                    project=project,
+                    overlap=maximum_annotations,
+                    is_labeled=len(annotations) >= maximum_annotations,
+                    total_predictions=len(predictions),
+                    total_annotations=len(annotations) - cancelled_annotations,
+                    cancelled_annotations=cancelled_annotations,
+                    inner_id=max_inner_id + i,
+                )
+            )
+            task_predictions.append(predictions)
+            task_annotations.append(annotations)
+
+        with transaction.atomic():
+            db_tasks = bulk_create_with_ids(Task, db_tasks, batch_size=settings.BATCH_SIZE)
+            link_class.create_many(db_tasks, keys, storage)
+            logger.debug(f'Create {len(db_tasks)} {storage.__class__.__name__} links')
+
+            # validate predictions and annotations per task like add_task does, but insert them in bulk
+            db_predictions, db_annotations = [], []
+            for task, predictions, annotations in zip(db_tasks, task_predictions, task_annotations):
+                for prediction in predictions:
+                    prediction['task'] = task.id
+                    prediction['project'] = project.id
+                prediction_ser = PredictionSerializer(data=predictions, many=True)
+                if prediction_ser.is_valid(raise_exception=raise_exception):
+                    for item in prediction_ser.validated_data:
+                        item['result'] = Prediction.prepare_prediction_result(item['result'], project)
+                        db_predictions.append(Prediction(**item))
+
+                for annotation in annotations:
+                    annotation['task'] = task.id
+                    annotation['project'] = project.id
+                annotation_ser = AnnotationSerializer(data=annotations, many=True)
+                if annotation_ser.is_valid(raise_exception=raise_exception):
+                    db_annotations += [Annotation(**item) for item in annotation_ser.validated_data]
+
+            Prediction.objects.bulk_create(db_predictions, batch_size=settings.BATCH_SIZE)
+            db_annotations = bulk_create_with_ids(Annotation, db_annotations, batch_size=settings.BATCH_SIZE)
+
+        # bulk_create doesn't send post_save signals, so update project summary explicitly
+        project.summary.update_data_columns(db_tasks)
+        if db_annotations:
+            project.summary.update_created_annotations_and_labels(db_annotations)
+        return db_tasks
+
+    def _get_task_data(self, key):
+        try:
+            return self.get_data(key)
+        except (UnicodeDecodeError, json.decoder.JSONDecodeError) as exc:
+            logger.debug(exc, exc_info=True)
+            raise ValueError(
+                f'Error loading JSON from file "{key}".\nIf you\'re trying to import non-JSON data '
+                f'(images, audio, text, etc.), edit storage settings and enable '
+                f'"Treat every bucket object as a source file"'
+            )
+
+    def _add_tasks_batch(self, keys, link_class, maximum_annotations, max_inner_id):
+        """Read storage objects for the keys and create tasks from them, returns created tasks count"""
+        workers = min(settings.STORAGE_SYNC_WORKERS, len(keys))
+        if workers > 1:
+            # downloading is network bound, executor.map returns results in the keys order to keep inner_id order
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                tasks_data = list(executor.map(self._get_task_data, keys))
+        else:
+            tasks_data = [self._get_task_data(key) for key in keys]
+        tasks = self.add_tasks(tasks_data, keys, self.project, maximum_annotations, max_inner_id, self, link_class)
+
+        # `WEBHOOK_BATCH_SIZE` sets the maximum number of tasks sent in a single webhook call,
+        # ensuring manageable payload sizes.
+        for tasks_for_webhook in batch(tasks, settings.WEBHOOK_BATCH_SIZE):
+            emit_webhooks_for_instance(
+                self.project.organization, self.project, WebhookAction.TASKS_CREATED, tasks_for_webhook
+            )
+        return len(tasks)
+
     def _scan_and_create_links(self, link_class):
         """
         TODO: deprecate this function and transform it to "pipeline" version  _scan_and_create_links_v2,
@@ -368,75 +492,69 @@ class ImportStorage(Storage):
         task = self.project.tasks.order_by('-inner_id').first()
         max_inner_id = (task.inner_id + 1) if task else 1
 
-        tasks_for_webhook = []
-        for key in self.iterkeys():
+        # one query instead of link existence checks for every key
+        existing_keys = link_class.get_existing_keys(self)
+
+        # incremental sync lists only keys after the cursor (the greatest key seen by the previous sync)
+        cursor = self.meta.get('sync_cursor') if self.meta.get('incremental') else None
+        last_key = cursor
+        keys = []
+        for key in self.iterkeys_after(cursor) if cursor else self.iterkeys():
             # w/o Dataflow
             # pubsub.push(topic, key)
             # -> GF.pull(topic, key) + env -> add_task()
             logger.debug(f'Scanning key {key}')
             self.info_update_progress(last_sync_count=tasks_created, tasks_existed=tasks_existed)
+            if last_key is None or key > last_key:
+                last_key = key
 
             # skip if task already exists
-            if link_class.exists(key, self):
+            if key in existing_keys:
                 logger.debug(f'{self.__class__.__name__} link {key} already exists')
                 tasks_existed += 1  # update progress counter
                 continue
 
             logger.debug(f'{self}: found new key {key}')
-            try:
-                data = self.get_data(key)
-            except (UnicodeDecodeError, json.decoder.JSONDecodeError) as exc:
-                logger.debug(exc, exc_info=True)
-                raise ValueError(
-                    f'Error loading JSON from file "{key}".\nIf you\'re trying to import non-JSON data '
-                    f'(images, audio, text, etc.), edit storage settings and enable '
-                    f'"Treat every bucket object as a source file"'
-                )
-
-            task = self.add_task(data, self.project, maximum_annotations, max_inner_id, self, key, link_class)
-            max_inner_id += 1
+            existing_keys.add(key)
+            keys.append(key)
 
-            # update progress counters for storage info
-            tasks_created += 1
+            # create tasks by batches of STORAGE_SYNC_BATCH_SIZE keys
+            if len(keys) >= settings.STORAGE_SYNC_BATCH_SIZE:
+                tasks_created += self._add_tasks_batch(keys, link_class, maximum_annotations, max_inner_id)
+                max_inner_id += len(keys)
+                keys = []
 
-            # add task to webhook list
-            tasks_for_webhook.append(task)
-
-            # settings.WEBHOOK_BATCH_SIZE
-            # `WEBHOOK_BATCH_SIZE` sets the maximum number of tasks sent in a single webhook call, ensuring manageable payload sizes.
-            # When `tasks_for_webhook` accumulates tasks equal to/exceeding `WEBHOOK_BATCH_SIZE`, they're sent in a webhook via
-            # `emit_webhooks_for_instance`, and `tasks_for_webhook` is cleared for new tasks.
-            # If tasks remain in `tasks_for_webhook` at process end (less than `WEBHOOK_BATCH_SIZE`), they're sent in a final webhook
-            # call to ensure all tasks are processed and no task is left unreported in the webhook.
-            if len(tasks_for_webhook) >= settings.WEBHOOK_BATCH_SIZE:
-                emit_webhooks_for_instance(
-                    self.project.organization, self.project, WebhookAction.TASKS_CREATED, tasks_for_webhook
-                )
-                tasks_for_webhook = []
-        if tasks_for_webhook:
-            emit_webhooks_for_instance(
-                self.project.organization, self.project, WebhookAction.TASKS_CREATED, tasks_for_webhook
-            )
+        if keys:
+            tasks_created += self._add_tasks_batch(keys, link_class, maximum_annotations, max_inner_id)
 
         self.project.update_tasks_states(
             maximum_annotations_changed=False, overlap_cohort_percentage_changed=False, tasks_number_changed=True
         )
 
-        # sync is finished, set completed status for storage info
-        self.info_set_completed(last_sync_count=tasks_created, tasks_existed=tasks_existed)
+        # sync is finished, set completed status for storage info,
+        # the cursor is saved only here so a failed sync will be listed again from the previous cursor
+        self.info_set_completed(last_sync_count=tasks_created, tasks_existed=tasks_existed, sync_cursor=last_key)
 
     def scan_and_create_links(self):
         """This is proto method - you can override it, or just replace ImportStorageLink by your own model"""
         self._scan_and_create_links(ImportStorageLink)
 
-    def sync(self):
+    def sync(self, incremental=None):
+        """Run storage sync in background or synchronously if redis isn't available
+
+        :param incremental: list only keys after the cursor of the previous sync,
+        STORAGE_SYNC_INCREMENTAL is used if it's not set
+        """
+        if incremental is None:
+            incremental = settings.STORAGE_SYNC_INCREMENTAL
+
         if redis_connected():
             queue = django_rq.get_queue('low')
             meta = {'project': self.project.id, 'storage': self.id}
             if not is_job_in_queue(queue, 'import_sync_background', meta=meta) and not is_job_on_worker(
                 job_id=self.last_sync_job, queue_name='low'
             ):
-                self.info_set_queued()
+                self.info_set_queued(incremental=incremental)
                 sync_job = queue.enqueue(
                     import_sync_background,
                     self.__class__,
@@ -452,7 +570,7 @@ class ImportStorage(Storage):
         else:
             try:
                 logger.info(f'Start syncing storage {self}')
-                self.info_set_queued()
+                self.info_set_queued(incremental=incremental)
                 import_sync_background(self.__class__, self.id)
             except Exception:
                 storage_background_failure(self)
@@ -598,11 +716,21 @@ class ImportStorageLink(models.Model):
     def exists(cls, key, storage):
         return cls.objects.filter(key=key, storage=storage.id).exists()
 
+    @classmethod
+    def get_existing_keys(cls, storage):
+        """All linked keys of the storage, used to skip existing objects while syncing without per-key queries"""
+        return set(cls.objects.filter(storage=storage.id).values_list('key', flat=True).iterator())
+
     @classmethod
     def create(cls, task, key, storage):
         link, created = cls.objects.get_or_create(task_id=task.id, key=key, storage=storage, object_exists=True)
         return link
 
+    @classmethod
+    def create_many(cls, tasks, keys, storage):
+        links = [cls(task_id=task.id, key=key, storage=storage, object_exists=True) for task, key in zip(tasks, keys)]
+        return cls.objects.bulk_create(links, batch_size=settings.BATCH_SIZE)
+
     class Meta:
         abstract = True
 
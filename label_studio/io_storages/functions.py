@@ -1,8 +1,10 @@
 import logging
-from typing import Dict, Iterable, List, Union
+from typing import Dict, Iterable, List, Optional, Union
+from urllib.parse import urlparse
 
 from core.feature_flags import flag_set
 from io_storages.base_models import ImportStorage
+from io_storages.utils import get_uri_via_regex
 
 from .azure_blob.api import AzureBlobExportStorageListAPI, AzureBlobImportStorageListAPI
 from .gcs.api import GCSExportStorageListAPI, GCSImportStorageListAPI
@@ -59,3 +61,48 @@ def get_storage_by_url(url: Union[str, List, Dict], storage_objects: Iterable[Im
                     # probably we need to use more advanced can_resolve_url mechanics
                     # that takes into account not only prefixes, but bucket path too
                     return storage_object
+
+
+class StorageResolver:
+    """Index of project import storages by url scheme and bucket to find a storage for url
+    with one regex check instead of checking every storage one by one like get_storage_by_url does.
+    It's built once per project (see Project.get_storage_resolver) and shared between all serialized tasks.
+    """
+
+    def __init__(self, storage_objects: Iterable[ImportStorage]):
+        self.storage_objects = list(storage_objects)
+        self._by_scheme = {}
+        self._by_bucket = {}
+        # storages with their own can_resolve_url logic are checked one by one
+        self._custom = []
+
+        for storage in self.storage_objects:
+            if type(storage).can_resolve_url is not ImportStorage.can_resolve_url or not storage.url_scheme:
+                self._custom.append(storage)
+                continue
+            # the first storage wins like in get_storage_by_url
+            self._by_scheme.setdefault(storage.url_scheme, storage)
+            bucket = getattr(storage, 'bucket', None) or getattr(storage, 'container', None)
+            if bucket:
+                self._by_bucket.setdefault((storage.url_scheme, str(bucket)), storage)
+        self._prefixes = tuple(self._by_scheme)
+
+    def get(self, url: Union[str, List, Dict]) -> Optional[ImportStorage]:
+        """Find a storage for url, storage connected to the url bucket is preferred"""
+        # task data can have int, float, etc; lists and dicts are resolved under the feature flag only
+        if not isinstance(url, str) and not (
+            isinstance(url, (dict, list))
+            and flag_set('fflag_feat_front_lsdv_4661_full_uri_resolve_15032023_short', user='auto')
+        ):
+            return None
+
+        if self._prefixes:
+            uri, scheme = get_uri_via_regex(url, prefixes=self._prefixes)
+            if scheme:
+                bucket = urlparse(uri, allow_fragments=False).netloc
+                return self._by_bucket.get((scheme, bucket)) or self._by_scheme[scheme]
+
+        for storage in self._custom:
+            if storage.can_resolve_url(url):
+                return storage
+        return None
@@ -77,6 +77,16 @@ class GCSImportStorageBase(GCSStorageMixin, ImportStorage):
             return_key=True,
         )
 
+    def iterkeys_after(self, start_after):
+        return GCS.iter_blobs(
+            client=self.get_client(),
+            bucket_name=self.bucket,
+            prefix=self.prefix,
+            regex_filter=self.regex_filter,
+            return_key=True,
+            start_after=start_after,
+        )
+
     def get_data(self, key):
         if self.use_blob_urls:
             return {settings.DATA_UNDEFINED_NAME: GCS.get_uri(self.bucket, key)}
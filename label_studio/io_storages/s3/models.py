@@ -125,11 +125,19 @@ class S3ImportStorageBase(S3StorageMixin, ImportStorage):
     )
 
     def iterkeys(self):
+        return self._iterkeys()
+
+    def iterkeys_after(self, start_after):
+        # S3 starts listing right after the marker, so already synced objects aren't listed at all
+        return self._iterkeys(Marker=start_after)
+
+    def _iterkeys(self, **list_kwargs):
         client, bucket = self.get_client_and_bucket()
         if self.prefix:
-            list_kwargs = {'Prefix': self.prefix.rstrip('/') + '/'}
+            list_kwargs['Prefix'] = self.prefix.rstrip('/') + '/'
             if not self.recursive_scan:
                 list_kwargs['Delimiter'] = '/'
+        if list_kwargs:
             bucket_iter = bucket.objects.filter(**list_kwargs).all()
         else:
             bucket_iter = bucket.objects.all()
@@ -277,6 +285,19 @@ class S3ImportStorageLink(ImportStorageLink):
             or cls.objects.filter(key=prefix + '/' + key, storage=storage.id).exists()
         )
 
+    @classmethod
+    def get_existing_keys(cls, storage):
+        keys = super(S3ImportStorageLink, cls).get_existing_keys(storage)
+        # TODO: this is a workaround to be compatible with old keys version - remove it later
+        # old keys were stored with prefix, so add their versions without prefix
+        prefix = str(storage.prefix) or ''
+        for key in list(keys):
+            if key.startswith(prefix + '/'):
+                keys.add(key[len(prefix) + 1 :])
+            if key.startswith(prefix):
+                keys.add(key[len(prefix) :])
+        return keys
+
 
 class S3ExportStorageLink(ExportStorageLink):
     storage = models.ForeignKey(S3ExportStorage, on_delete=models.CASCADE, related_name='links')
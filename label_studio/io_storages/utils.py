@@ -1,7 +1,14 @@
 """This file and its contents are licensed under the Apache License 2.0. Please see the included NOTICE for copyright information and LICENSE for a copy of the license.
 """
+import json
 import logging
 import re
+import threading
+import time
+from collections import OrderedDict
+
+from core.redis import redis_get, redis_set
+from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
@@ -38,3 +45,57 @@ def get_uri_via_regex(data, prefixes=('s3', 'gs')):
             logger.warning("Can't parse task.data to match URI. Reason: Match is not found.")
             return None, None
     return r_match.group('uri'), r_match.group('storage')
+
+
+class PresignedURLCache:
+    """In-process LRU cache of presigned urls with expiration time,
+    Redis is used as a second level cache shared between processes when PRESIGNED_URL_CACHE_REDIS is enabled
+    """
+
+    redis_prefix = 'presigned-url:'
+
+    def __init__(self):
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                url, expires_at = item
+                if expires_at > now:
+                    self._items.move_to_end(key)
+                    return url
+                del self._items[key]
+
+        if settings.PRESIGNED_URL_CACHE_REDIS:
+            value = redis_get(self.redis_prefix + key)
+            if value:
+                url, expires_at = json.loads(value)
+                if expires_at > now:
+                    self._set_local(key, url, expires_at)
+                    return url
+
+    def set(self, key, url, ttl):
+        expires_at = time.time() + ttl
+        self._set_local(key, url, expires_at)
+        if settings.PRESIGNED_URL_CACHE_REDIS:
+            redis_set(self.redis_prefix + key, json.dumps([url, expires_at]), ttl=int(ttl))
+
+    def _set_local(self, key, url, expires_at):
+        maxsize = settings.PRESIGNED_URL_CACHE_SIZE
+        if maxsize <= 0:
+            return
+        with self._lock:
+            self._items[key] = (url, expires_at)
+            self._items.move_to_end(key)
+            while len(self._items) > maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+presigned_url_cache = PresignedURLCache()
@@ -11,7 +11,7 @@ from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
 from ml.api_connector import PREDICT_URL, TIMEOUT_PREDICT, MLApi
 from projects.models import Project
-from tasks.models import Prediction
+from tasks.models import Prediction, deferred_tasks_counters
 from tasks.serializers import PredictionSerializer, TaskSimpleSerializer
 from webhooks.serializers import Webhook, WebhookSerializer
 
@@ -298,7 +298,8 @@ class MLBackend(models.Model):
                 f"'ML backend '{self.title}' doesn't support batch processing of tasks, "
                 f'switched to one-by-one task retrieval'
             )
-            instances = [self.predict_one_task(task, model_version=model_version) for task in tasks]
+            with deferred_tasks_counters():
+                instances = [self.predict_one_task(task, model_version=model_version) for task in tasks]
             return instances
 
         # wrong result number
@@ -321,7 +322,7 @@ class MLBackend(models.Model):
                     'model_version': response.get('model_version', self.model_version),
                 }
             )
-        with conditional_atomic(predicate=db_is_not_sqlite):
+        with conditional_atomic(predicate=db_is_not_sqlite), deferred_tasks_counters():
             prediction_ser = PredictionSerializer(data=predictions, many=True)
             prediction_ser.is_valid(raise_exception=True)
             instances = prediction_ser.save()
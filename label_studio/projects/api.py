@@ -26,12 +26,21 @@ from ml.serializers import MLBackendSerializer
 from projects.functions.next_task import get_next_task
 from projects.functions.stream_history import get_label_stream_history
 from projects.functions.utils import recalculate_created_annotations_and_labels_from_scratch
-from projects.models import Project, ProjectImport, ProjectManager, ProjectReimport, ProjectSummary
+from projects.models import (
+    Project,
+    ProjectImport,
+    ProjectManager,
+    ProjectRecalculation,
+    ProjectReimport,
+    ProjectSummary,
+    resume_project_recalculations,
+)
 from projects.serializers import (
     GetFieldsSerializer,
     ProjectImportSerializer,
     ProjectLabelConfigSerializer,
     ProjectModelVersionExtendedSerializer,
+    ProjectRecalculationSerializer,
     ProjectReimportSerializer,
     ProjectSerializer,
     ProjectSummarySerializer,
@@ -473,6 +482,11 @@ class ProjectSummaryAPI(generics.RetrieveAPIView):
     permission_required = all_permissions.projects_view
     queryset = ProjectSummary.objects.all()
 
+    def get_object(self):
+        summary = super(ProjectSummaryAPI, self).get_object()
+        summary.compact_deltas()
+        return summary
+
     @swagger_auto_schema(auto_schema=None)
     def get(self, *args, **kwargs):
         return super(ProjectSummaryAPI, self).get(*args, **kwargs)
@@ -554,6 +568,51 @@ class ProjectReimportAPI(generics.RetrieveAPIView):
     lookup_url_kwarg = 'reimport_pk'
 
 
+@method_decorator(
+    name='get',
+    decorator=swagger_auto_schema(
+        tags=['Projects'],
+        operation_summary='List project recalculations',
+        operation_description='Return progress of tasks recalculations started by project settings changes',
+        manual_parameters=[
+            openapi.Parameter(
+                name='id',
+                type=openapi.TYPE_INTEGER,
+                in_=openapi.IN_PATH,
+                description='A unique integer value identifying this project.',
+            ),
+        ],
+    ),
+)
+class ProjectRecalculationListAPI(GetParentObjectMixin, generics.ListAPIView):
+    parser_classes = (JSONParser,)
+    parent_queryset = Project.objects.all()
+    permission_required = all_permissions.projects_view
+    serializer_class = ProjectRecalculationSerializer
+
+    def get_queryset(self):
+        project = self.get_parent_object()
+        return ProjectRecalculation.objects.filter(project=project).order_by('-id')
+
+
+class ProjectRecalculationResumeAPI(GetParentObjectMixin, generics.CreateAPIView):
+    """Continue recalculations lost with restarted workers from their checkpoints,
+    recalculations of all projects are resumed by resume_project_recalculations management command
+    """
+
+    parser_classes = (JSONParser,)
+    parent_queryset = Project.objects.all()
+    permission_required = ViewClassPermission(
+        POST=all_permissions.projects_change,
+    )
+
+    @swagger_auto_schema(auto_schema=None)
+    def post(self, *args, **kwargs):
+        project = self.get_parent_object()
+        resumed = resume_project_recalculations(project)
+        return Response({'resumed': resumed}, status=status.HTTP_200_OK)
+
+
 @method_decorator(
     name='delete',
     decorator=swagger_auto_schema(
@@ -3,13 +3,20 @@ from collections import Counter
 from typing import List, Tuple, Union
 
 from core.feature_flags import flag_set
-from core.utils.common import conditional_atomic, db_is_not_sqlite, load_func
+from core.utils.common import conditional_atomic, db_is_not_sqlite, iter_batches, load_func
 from django.conf import settings
+from django.db import transaction
 from django.db.models import BooleanField, Case, Count, Exists, F, Max, OuterRef, Q, QuerySet, Value, When
 from django.db.models.fields import DecimalField
+from projects.functions.next_task_queue import (
+    build_next_task_queue,
+    get_next_task_queue_key,
+    pop_next_task_candidates,
+    return_next_task_candidates,
+)
 from projects.functions.stream_history import add_stream_history
 from projects.models import Project
-from tasks.models import Annotation, Task
+from tasks.models import Annotation, Task, TaskLock
 from users.models import User
 
 logger = logging.getLogger(__name__)
@@ -24,29 +31,90 @@ def get_next_task_logging_level(user: User) -> int:
     return level
 
 
-def _get_random_unlocked(task_query: QuerySet[Task], user: User, upper_limit=None) -> Union[Task, None]:
-    for task in task_query.order_by('?').only('id')[: settings.RANDOM_NEXT_TASK_SAMPLE_SIZE]:
-        try:
-            task = Task.objects.select_for_update(skip_locked=True).get(pk=task.id)
-            if not task.has_lock(user):
-                return task
-        except Task.DoesNotExist:
-            logger.debug('Task with id {} locked'.format(task.id))
+def _get_random_unlocked(
+    task_query: QuerySet[Task], user: User, upper_limit=None, project: Project = None, lock: bool = True
+) -> Union[Task, None]:
+    task_ids = Task.sample_random_ids(task_query, settings.RANDOM_NEXT_TASK_SAMPLE_SIZE, project=project)
+    return _get_first_unlocked_by_ids(task_ids, user, project, lock=lock)
 
 
-def _get_first_unlocked(tasks_query: QuerySet[Task], user) -> Union[Task, None]:
-    # Skip tasks that are locked due to being taken by collaborators
-    for task_id in tasks_query.values_list('id', flat=True):
-        try:
-            task = Task.objects.select_for_update(skip_locked=True).get(pk=task_id)
-            if not task.has_lock(user):
+def _get_first_unlocked(
+    tasks_query: QuerySet[Task], user, project: Project = None, lock: bool = True
+) -> Union[Task, None]:
+    return _get_first_unlocked_by_ids(tasks_query.values_list('id', flat=True), user, project, lock=lock)
+
+
+def _get_first_unlocked_by_ids(task_ids, user, project: Project = None, lock: bool = True) -> Union[Task, None]:
+    """Claim the first candidate which is not taken by collaborators: the task is returned with the user's lock.
+    Each batch of candidates is claimed in one transaction: candidate rows are selected FOR UPDATE SKIP LOCKED
+    with their locks and annotations counted, then the lock of the first free candidate is inserted.
+    Concurrent claims skip rows selected by each other, so a task can't be taken twice before its lock exists.
+
+    lock: False - the first free candidate is returned without a lock, e.g. for manually assigned annotators
+    """
+    for batch in iter_batches(task_ids, settings.RANDOM_NEXT_TASK_SAMPLE_SIZE):
+        if project is None:
+            project = Project.objects.get(tasks=batch[0])
+        task = _claim_first_unlocked(batch, user, project, lock=lock)
+        if task is not None:
+            if lock:
+                task.clear_expired_locks()
+            return task
+
+
+def _claim_first_unlocked(batch, user, project: Project, lock: bool = True) -> Union[Task, None]:
+    with transaction.atomic():
+        locked = Task.objects.select_for_update(skip_locked=True).filter(pk__in=batch)
+        candidates = {task.id: task for task in Task.annotate_takes(locked, project, user)}
+
+        for task_id in batch:
+            task = candidates.get(task_id)
+            if task is None:
+                logger.debug('Task with id {} locked'.format(task_id))
+                continue
+            task.project = project
+            if not task.has_lock(user, num_locks=task.takes_num_locks, num_annotations=task.takes_num_annotations):
+                if not lock:
+                    return task
+                TaskLock.acquire([task], user)
+                task.lock_claimed = True
+                logger.log(
+                    get_next_task_logging_level(user),
+                    f'User={user} acquires a lock for the task={task} ttl: {settings.TASK_LOCK_TTL}',
+                )
                 return task
 
-        except Task.DoesNotExist:
-            logger.debug('Task with id {} locked'.format(task_id))
-
 
-def _try_ground_truth(tasks: QuerySet[Task], project: Project, user: User) -> Union[Task, None]:
+def _get_queued_unlocked(
+    tasks_query: QuerySet[Task], user: User, project: Project, lock: bool = True
+) -> Union[Task, None]:
+    """Take the first unlocked task from the user's next task queue (see NEXT_TASK_QUEUE_SIZE),
+    the heavy tasks query is evaluated only when the queue is drained. Popped candidates are checked
+    against the tasks query by id, so tasks solved or filtered out after the queue was built are skipped.
+    """
+    key = get_next_task_queue_key(tasks_query, user, project)
+    if key is None:
+        return None
+
+    rebuilt = False
+    while True:
+        candidate_ids = pop_next_task_candidates(key)
+        if not candidate_ids:
+            if rebuilt:
+                return None
+            candidate_ids, rebuilt = build_next_task_queue(key, tasks_query, project), True
+            if not candidate_ids:
+                return None
+
+        valid_ids = set(tasks_query.filter(pk__in=candidate_ids).values_list('id', flat=True))
+        candidate_ids = [task_id for task_id in candidate_ids if task_id in valid_ids]
+        task = _get_first_unlocked_by_ids(candidate_ids, user, project, lock=lock)
+        if task:
+            return_next_task_candidates(key, candidate_ids[candidate_ids.index(task.id) + 1 :])
+            return task
+
+
+def _try_ground_truth(tasks: QuerySet[Task], project: Project, user: User, lock: bool = True) -> Union[Task, None]:
     """Returns task from ground truth set"""
     ground_truth = Annotation.objects.filter(task=OuterRef('pk'), ground_truth=True)
     not_solved_tasks_with_ground_truths = tasks.annotate(has_ground_truths=Exists(ground_truth)).filter(
@@ -54,8 +122,8 @@ def _try_ground_truth(tasks: QuerySet[Task], project: Project, user: User) -> Un
     )
     if not_solved_tasks_with_ground_truths.exists():
         if project.sampling == project.SEQUENCE:
-            return _get_first_unlocked(not_solved_tasks_with_ground_truths, user)
-        return _get_random_unlocked(not_solved_tasks_with_ground_truths, user)
+            return _get_first_unlocked(not_solved_tasks_with_ground_truths, user, project, lock=lock)
+        return _get_random_unlocked(not_solved_tasks_with_ground_truths, user, project=project, lock=lock)
 
 
 def _try_tasks_with_overlap(tasks: QuerySet[Task]) -> Tuple[Union[Task, None], QuerySet[Task]]:
@@ -67,7 +135,9 @@ def _try_tasks_with_overlap(tasks: QuerySet[Task]) -> Tuple[Union[Task, None], Q
         return None, tasks.filter(overlap=1)
 
 
-def _try_breadth_first(tasks: QuerySet[Task], user: User) -> Union[Task, None]:
+def _try_breadth_first(
+    tasks: QuerySet[Task], user: User, project: Project = None, lock: bool = True
+) -> Union[Task, None]:
     """Try to find tasks with maximum amount of annotations, since we are trying to label tasks as fast as possible"""
 
     tasks = tasks.annotate(annotations_count=Count('annotations', filter=~Q(annotations__completed_by=user)))
@@ -89,7 +159,7 @@ def _try_breadth_first(tasks: QuerySet[Task], user: User) -> Union[Task, None]:
     )
     if not_solved_tasks_labeling_with_max_annotations.exists():
         # try to complete tasks that are already in progress
-        return _get_random_unlocked(not_solved_tasks_labeling_with_max_annotations, user)
+        return _get_random_unlocked(not_solved_tasks_labeling_with_max_annotations, user, project=project, lock=lock)
 
 
 def _try_uncertainty_sampling(
@@ -98,6 +168,7 @@ def _try_uncertainty_sampling(
     user_solved_tasks_array: List[int],
     user: User,
     prepared_tasks: QuerySet[Task],
+    lock: bool = True,
 ) -> Union[Task, None]:
     task_with_current_predictions = tasks.filter(predictions__model_version=project.model_version)
     if task_with_current_predictions.exists():
@@ -127,17 +198,21 @@ def _try_uncertainty_sampling(
         if num_annotators > 1 and num_tasks_with_current_predictions > 0:
             # try to randomize tasks to avoid concurrent labeling between several annotators
             next_task = _get_random_unlocked(
-                possible_next_tasks, user, upper_limit=min(num_annotators + 1, num_tasks_with_current_predictions)
+                possible_next_tasks,
+                user,
+                upper_limit=min(num_annotators + 1, num_tasks_with_current_predictions),
+                project=project,
+                lock=lock,
             )
         else:
-            next_task = _get_first_unlocked(possible_next_tasks, user)
+            next_task = _get_first_unlocked(possible_next_tasks, user, project, lock=lock)
     else:
         # uncertainty sampling fallback: choose by random sampling
         logger.debug(
             f'Uncertainty sampling fallbacks to random sampling '
             f'(current project.model_version={str(project.model_version)})'
         )
-        next_task = _get_random_unlocked(tasks, user)
+        next_task = _get_random_unlocked(tasks, user, project=project, lock=lock)
     return next_task
 
 
@@ -231,38 +306,38 @@ def get_next_task_without_dm_queue(
 
     if not next_task and prioritized_low_agreement:
         logger.debug(f'User={user} tries low agreement from prepared tasks')
-        next_task = _get_first_unlocked(not_solved_tasks, user)
+        next_task = _get_first_unlocked(not_solved_tasks, user, project, lock=use_task_lock)
         queue_info += (' & ' if queue_info else '') + 'Low agreement queue'
 
     if not next_task and project.show_ground_truth_first:
         logger.debug(f'User={user} tries ground truth from prepared tasks')
-        next_task = _try_ground_truth(not_solved_tasks, project, user)
+        next_task = _try_ground_truth(not_solved_tasks, project, user, lock=use_task_lock)
         queue_info += (' & ' if queue_info else '') + 'Ground truth queue'
 
     if not next_task and project.maximum_annotations > 1:
         # if there are any tasks in progress (with maximum number of annotations), randomly sampling from them
         logger.debug(f'User={user} tries depth first from prepared tasks')
-        next_task = _try_breadth_first(not_solved_tasks, user)
+        next_task = _try_breadth_first(not_solved_tasks, user, project, lock=use_task_lock)
         if next_task:
             queue_info += (' & ' if queue_info else '') + 'Breadth first queue'
 
     return next_task, use_task_lock, queue_info
 
 
-def skipped_queue(next_task, prepared_tasks, project, user, queue_info):
+def skipped_queue(next_task, prepared_tasks, project, user, queue_info, lock=True):
     if not next_task and project.skip_queue == project.SkipQueue.REQUEUE_FOR_ME:
         q = Q(project=project, task__isnull=False, was_cancelled=True, task__is_labeled=False)
         skipped_tasks = user.annotations.filter(q).order_by('updated_at').values_list('task__pk', flat=True)
         if skipped_tasks.exists():
             preserved_order = Case(*[When(pk=pk, then=pos) for pos, pk in enumerate(skipped_tasks)])
             skipped_tasks = prepared_tasks.filter(pk__in=skipped_tasks).order_by(preserved_order)
-            next_task = _get_first_unlocked(skipped_tasks, user)
+            next_task = _get_first_unlocked(skipped_tasks, user, project, lock=lock)
             queue_info = 'Skipped queue'
 
     return next_task, queue_info
 
 
-def postponed_queue(next_task, prepared_tasks, project, user, queue_info):
+def postponed_queue(next_task, prepared_tasks, project, user, queue_info, lock=True):
     if not next_task:
         q = Q(task__project=project, task__isnull=False, was_postponed=True, task__is_labeled=False)
         if flag_set('fflag_fix_back_lsdv_1044_check_annotations_24012023_short', user):
@@ -272,7 +347,7 @@ def postponed_queue(next_task, prepared_tasks, project, user, queue_info):
         if postponed_tasks.exists():
             preserved_order = Case(*[When(pk=pk, then=pos) for pos, pk in enumerate(postponed_tasks)])
             postponed_tasks = prepared_tasks.filter(pk__in=postponed_tasks).order_by(preserved_order)
-            next_task = _get_first_unlocked(postponed_tasks, user)
+            next_task = _get_first_unlocked(postponed_tasks, user, project, lock=lock)
             if next_task is not None:
                 next_task.allow_postpone = False
             queue_info = 'Postponed draft queue'
@@ -287,23 +362,30 @@ def get_task_from_qs_with_sampling(
     user: User,
     project: Project,
     queue_info: str,
+    lock: bool = True,
 ) -> Tuple[Union[Task, None], str]:
     next_task = None
     if project.sampling == project.SEQUENCE:
         logger.debug(f'User={user} tries sequence sampling from prepared tasks')
-        next_task = _get_first_unlocked(not_solved_tasks, user)
+        next_task = _get_queued_unlocked(not_solved_tasks, user, project, lock=lock) or _get_first_unlocked(
+            not_solved_tasks, user, project, lock=lock
+        )
         if next_task:
             queue_info += (' & ' if queue_info else '') + 'Sequence queue'
 
     elif project.sampling == project.UNCERTAINTY:
         logger.debug(f'User={user} tries uncertainty sampling from prepared tasks')
-        next_task = _try_uncertainty_sampling(not_solved_tasks, project, user_solved_tasks_array, user, prepared_tasks)
+        next_task = _try_uncertainty_sampling(
+            not_solved_tasks, project, user_solved_tasks_array, user, prepared_tasks, lock=lock
+        )
         if next_task:
             queue_info += (' & ' if queue_info else '') + 'Active learning or random queue'
 
     elif project.sampling == project.UNIFORM:
         logger.debug(f'User={user} tries random sampling from prepared tasks')
-        next_task = _get_random_unlocked(not_solved_tasks, user)
+        next_task = _get_queued_unlocked(not_solved_tasks, user, project, lock=lock) or _get_random_unlocked(
+            not_solved_tasks, user, project=project, lock=lock
+        )
         if next_task:
             queue_info += (' & ' if queue_info else '') + 'Uniform random queue'
 
@@ -341,7 +423,13 @@ def get_next_task(
                 _, tasks_with_overlap = _try_tasks_with_overlap(not_solved_tasks)
                 queue_info += 'Show overlap first'
                 next_task, queue_info = get_task_from_qs_with_sampling(
-                    tasks_with_overlap, user_solved_tasks_array, prepared_tasks, user, project, queue_info
+                    tasks_with_overlap,
+                    user_solved_tasks_array,
+                    prepared_tasks,
+                    user,
+                    project,
+                    queue_info,
+                    lock=use_task_lock,
                 )
 
         if not next_task:
@@ -352,14 +440,22 @@ def get_next_task(
 
             else:
                 next_task, queue_info = get_task_from_qs_with_sampling(
-                    not_solved_tasks, user_solved_tasks_array, prepared_tasks, user, project, queue_info
+                    not_solved_tasks,
+                    user_solved_tasks_array,
+                    prepared_tasks,
+                    user,
+                    project,
+                    queue_info,
+                    lock=use_task_lock,
                 )
 
-        next_task, queue_info = postponed_queue(next_task, prepared_tasks, project, user, queue_info)
+        next_task, queue_info = postponed_queue(
+            next_task, prepared_tasks, project, user, queue_info, lock=use_task_lock
+        )
 
-        next_task, queue_info = skipped_queue(next_task, prepared_tasks, project, user, queue_info)
+        next_task, queue_info = skipped_queue(next_task, prepared_tasks, project, user, queue_info, lock=use_task_lock)
 
-        if next_task and use_task_lock:
+        if next_task and use_task_lock and not getattr(next_task, 'lock_claimed', False):
             # set lock for the task with TTL 3x time more then current average lead time (or 1 hour by default)
             next_task.set_lock(user)
 
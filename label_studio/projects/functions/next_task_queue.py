@@ -0,0 +1,54 @@
+import hashlib
+import logging
+from uuid import uuid4
+
+from core.redis import redis_connected, redis_get, redis_list_pop, redis_list_push, redis_set
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+from tasks.models import Task
+
+logger = logging.getLogger(__name__)
+
+
+def _queue_version_key(project_id):
+    return f'next-task-queue-version:{project_id}'
+
+
+def invalidate_next_task_queues(project_id):
+    """Drop all next task queues of the project, e.g. when task overlaps are changed"""
+    if settings.NEXT_TASK_QUEUE_SIZE and project_id:
+        redis_set(_queue_version_key(project_id), uuid4().hex)
+
+
+def get_next_task_queue_key(tasks_query, user, project):
+    """Queue key of the user, it changes with sampling, data manager filters or queue invalidation"""
+    if not settings.NEXT_TASK_QUEUE_SIZE or not redis_connected():
+        return None
+    try:
+        sql, params = tasks_query.query.sql_with_params()
+    except EmptyResultSet:
+        return None
+    version = redis_get(_queue_version_key(project.id))
+    digest = hashlib.sha1(f'{version}:{project.sampling}:{sql}:{params}'.encode()).hexdigest()
+    return f'next-task-queue:{project.id}:{user.id}:{digest}'
+
+
+def build_next_task_queue(key, tasks_query, project):
+    """Select candidate ids for the queue, the first batch of them is returned instead of being queued"""
+    if project.sampling == project.UNIFORM:
+        task_ids = Task.sample_random_ids(tasks_query, settings.NEXT_TASK_QUEUE_SIZE, project=project)
+    else:
+        task_ids = list(tasks_query.values_list('id', flat=True)[: settings.NEXT_TASK_QUEUE_SIZE])
+    batch_size = settings.RANDOM_NEXT_TASK_SAMPLE_SIZE
+    redis_list_push(key, task_ids[batch_size:], ttl=settings.NEXT_TASK_QUEUE_TTL)
+    logger.debug(f'Next task queue {key} is built with {len(task_ids)} tasks')
+    return task_ids[:batch_size]
+
+
+def pop_next_task_candidates(key):
+    return [int(task_id) for task_id in redis_list_pop(key, settings.RANDOM_NEXT_TASK_SAMPLE_SIZE) or []]
+
+
+def return_next_task_candidates(key, task_ids):
+    """Put unused candidates back to the queue front"""
+    redis_list_push(key, task_ids, ttl=settings.NEXT_TASK_QUEUE_TTL, front=True)
@@ -48,12 +48,13 @@ def recalculate_created_annotations_and_labels_from_scratch(
     """
     logger.info(f'Reset cache started for project {project.id} and organization {organization_id}')
 
-    summary.created_labels, summary.created_annotations = {}, {}
+    # pending summary deltas are dropped too, counters are recalculated from empty ones
+    summary.reset(tasks_data_based=False)
     summary.update_created_annotations_and_labels(project.annotations.all())
 
-    summary.created_labels_drafts = {}
     drafts = AnnotationDraft.objects.filter(task__project=project)
     summary.update_created_labels_drafts(drafts)
+    summary.compact_deltas()
 
     logger.info(
         f'Reset cache finished for project {project.id} and organization {organization_id}:\n'
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from projects.models import Project, resume_project_recalculations
+
+
+class Command(BaseCommand):
+    help = 'Resume stale project tasks recalculations from their checkpoints, e.g. after workers restart'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, default=None, help='project id, all projects by default')
+
+    def handle(self, *args, **options):
+        project = Project.objects.get(id=options['project']) if options['project'] else None
+        resumed = resume_project_recalculations(project)
+        self.stdout.write(f'{resumed} recalculations resumed')
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 22:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0026_auto_20231103_0020'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectsummary',
+            name='data_columns_types',
+            field=models.JSONField(default=dict, help_text='Sampled value types of data columns', null=True, verbose_name='data columns types'),
+        ),
+    ]
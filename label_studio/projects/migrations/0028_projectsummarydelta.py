@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-18 23:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0027_projectsummary_data_columns_types'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectSummaryDelta',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(choices=[('created_annotations', 'Created annotations'), ('created_labels', 'Created labels'), ('created_labels_drafts', 'Created labels in drafts')], help_text='Summary counter field', max_length=32, verbose_name='field')),
+                ('key', models.TextField(help_text='Counter key', verbose_name='key')),
+                ('label', models.TextField(blank=True, default='', help_text='Label of from_name for labels counters', verbose_name='label')),
+                ('delta', models.IntegerField(default=0, help_text='Not compacted counter change', verbose_name='delta')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='summary_deltas', to='projects.project')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='projectsummarydelta',
+            constraint=models.UniqueConstraint(fields=('project', 'field', 'key', 'label'), name='unique_project_summary_delta'),
+        ),
+    ]
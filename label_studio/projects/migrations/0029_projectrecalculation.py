@@ -0,0 +1,35 @@
+# Generated by Django 3.2.25 on 2026-10-19 00:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0028_projectsummarydelta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectRecalculation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('created', 'Created'), ('in_progress', 'In progress'), ('failed', 'Failed'), ('completed', 'Completed')], default='created', max_length=64)),
+                ('stage', models.CharField(choices=[('overlap', 'Overlap'), ('is_labeled', 'Is labeled')], default='overlap', max_length=64)),
+                ('maximum_annotations_changed', models.BooleanField(default=False)),
+                ('overlap_cohort_percentage_changed', models.BooleanField(default=False)),
+                ('tasks_number_changed', models.BooleanField(default=False)),
+                ('run_id', models.CharField(default='', help_text='Only the job run with this id processes batches, restarts change it', max_length=32)),
+                ('last_task_id', models.IntegerField(default=0, help_text='Checkpoint: the last processed task id of the stage')),
+                ('processed_count', models.IntegerField(default=0, help_text='Number of processed tasks of the stage')),
+                ('total_count', models.IntegerField(default=0, help_text='Number of project tasks')),
+                ('meta', models.JSONField(default=dict, help_text='Meta and debug information about the job', null=True, verbose_name='meta')),
+                ('traceback', models.TextField(blank=True, help_text='Traceback report for the last failure', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Creation time', verbose_name='created at')),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Last checkpoint time', verbose_name='updated at')),
+                ('finished_at', models.DateTimeField(default=None, help_text='Complete or fail time', null=True, verbose_name='finished at')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recalculations', to='projects.project')),
+            ],
+        ),
+    ]
@@ -58,16 +58,13 @@ class ProjectMixin:
         self, maximum_annotations_changed, overlap_cohort_percentage_changed, tasks_number_changed
     ):
         """
-        Async start updating tasks states after settings change
+        Async start updating tasks states after settings change, the recalculation job runs by batches
         :param maximum_annotations_changed: If maximum_annotations param changed
         :param overlap_cohort_percentage_changed: If cohort_percentage param changed
         :param tasks_number_changed: If tasks number changed in project
         """
-        start_job_async_or_sync(
-            self._update_tasks_states,
-            maximum_annotations_changed,
-            overlap_cohort_percentage_changed,
-            tasks_number_changed,
+        self._update_tasks_states(
+            maximum_annotations_changed, overlap_cohort_percentage_changed, tasks_number_changed, sync=False
         )
 
     def has_permission(self, user):
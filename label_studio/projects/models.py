@@ -2,7 +2,11 @@
 """
 import json
 import logging
+import traceback as tb
+from collections import Counter
+from datetime import datetime, timedelta
 from typing import Any, Mapping, Optional
+from uuid import uuid4
 
 from annoying.fields import AutoOneToOneField
 from core.feature_flags import flag_set
@@ -20,18 +24,22 @@ from core.label_config import (
     get_sample_task,
     validate_label_config,
 )
+from core.redis import redis_connected, redis_set_if_absent, start_job_async_or_sync
 from core.utils.common import (
     create_hash,
     get_attr_or_item,
     load_func,
     merge_labels_counters,
 )
-from core.utils.db import fast_first
+from core.utils.db import fast_first, update_from_is_supported
 from core.utils.exceptions import LabelStudioValidationErrorSentryIgnored
+from data_manager.indexed_columns import index_tasks_data
+from data_manager.totals import bump_project_data_version
 from django.conf import settings
 from django.core.validators import MaxLengthValidator, MinLengthValidator
-from django.db import models, transaction
-from django.db.models import Avg, BooleanField, Case, Count, JSONField, Max, Q, Sum, Value, When
+from django.db import IntegrityError, OperationalError, connection, models, transaction
+from django.db.models import Avg, BooleanField, Case, Count, F, JSONField, Max, Q, Sum, Value, When
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from label_studio_tools.core.label_config import parse_config
 from labels_manager.models import Label
@@ -45,6 +53,7 @@ from projects.functions import (
     annotate_total_predictions_number,
     annotate_useful_annotation_number,
 )
+from projects.functions.next_task_queue import invalidate_next_task_queues
 from projects.functions.utils import make_queryset_from_iterable
 from tasks.models import (
     Annotation,
@@ -53,6 +62,7 @@ from tasks.models import (
     Q_task_finished_annotations,
     Task,
     bulk_update_stats_project_tasks,
+    deferred_tasks_counters,
 )
 
 logger = logging.getLogger(__name__)
@@ -411,44 +421,35 @@ class Project(ProjectMixin, models.Model):
         return membership.exists() and membership.first().enabled
 
     def _update_tasks_states(
-        self, maximum_annotations_changed, overlap_cohort_percentage_changed, tasks_number_changed
+        self, maximum_annotations_changed, overlap_cohort_percentage_changed, tasks_number_changed, sync=True
     ):
         """
-        Update tasks states after settings change
+        Update tasks states after settings change, tasks are updated by batches of ProjectRecalculation
         :param maximum_annotations_changed: If maximum_annotations param changed
         :param overlap_cohort_percentage_changed: If cohort_percentage param changed
         :param tasks_number_changed: If tasks number changed in project
+        :param sync: Process all batches right now instead of the background job
         """
         logger.info(
             f'Starting _update_tasks_states with params: Project {str(self)} maximum_annotations '
             f'{self.maximum_annotations} and percentage {self.overlap_cohort_percentage}'
         )
-        # if only maximum annotations parameter is tweaked
-        if maximum_annotations_changed and (not overlap_cohort_percentage_changed or self.maximum_annotations == 1):
-            tasks_with_overlap = self.tasks.filter(overlap__gt=1)
-            if tasks_with_overlap.exists():
-                # if there is a part with overlapped tasks, affect only them
-                tasks_with_overlap.update(overlap=self.maximum_annotations)
-            elif self.overlap_cohort_percentage < 100:
-                self._rearrange_overlap_cohort()
-            else:
-                # otherwise affect all tasks
-                self.tasks.update(overlap=self.maximum_annotations)
-                tasks_with_overlap = self.tasks.all()
-            # update is_labeled after change
-            bulk_update_stats_project_tasks(tasks_with_overlap, project=self)
-
-        # if cohort slider is tweaked
-        elif overlap_cohort_percentage_changed and self.maximum_annotations > 1:
-            self._rearrange_overlap_cohort()
+        if ProjectRecalculation.is_required(
+            self, maximum_annotations_changed, overlap_cohort_percentage_changed, tasks_number_changed
+        ):
+            # tasks data version and next task queues are invalidated when the recalculation is completed
+            ProjectRecalculation.start(
+                self, maximum_annotations_changed, overlap_cohort_percentage_changed, tasks_number_changed, sync=sync
+            )
+            return
 
-        # if adding/deleting tasks and cohort settings are applied
-        elif tasks_number_changed and self.overlap_cohort_percentage < 100 and self.maximum_annotations > 1:
-            self._rearrange_overlap_cohort()
+        bump_project_data_version(self.id)
+        invalidate_next_task_queues(self.id)
 
-    def _rearrange_overlap_cohort(self):
+    def _rearrange_overlap_cohort(self, update_is_labeled=True):
         """
         Rearrange overlap depending on annotation count in tasks
+        :param update_is_labeled: Update is_labeled of all tasks after the rearrange
         """
         all_project_tasks = Task.objects.filter(project=self)
         max_annotations = self.maximum_annotations
@@ -457,6 +458,18 @@ class Project(ProjectMixin, models.Model):
             f'Starting _rearrange_overlap_cohort with params: Project {str(self)} maximum_annotations '
             f'{max_annotations} and percentage {self.overlap_cohort_percentage}'
         )
+        if update_from_is_supported():
+            with transaction.atomic():
+                use_overlap = update_is_labeled and self._can_use_overlap()
+                updated = self._rearrange_overlap_cohort_by_rank(must_tasks, update_is_labeled=use_overlap)
+                logger.info(f'Overlap is changed for {updated} tasks')
+                if use_overlap:
+                    bump_project_data_version(self.id)
+                elif update_is_labeled:
+                    # update is labeled after tasks rearrange overlap
+                    bulk_update_stats_project_tasks(all_project_tasks, project=self)
+            return
+
         tasks_with_max_annotations = all_project_tasks.annotate(
             anno=Count('annotations', filter=Q_task_finished_annotations & Q(annotations__ground_truth=False))
         ).filter(anno__gte=max_annotations)
@@ -486,8 +499,58 @@ class Project(ProjectMixin, models.Model):
             all_project_tasks.filter(id__in=ids).update(overlap=max_annotations)
             ids = list(tasks_with_min_annotations.values_list('id', flat=True))
             all_project_tasks.filter(id__in=ids).update(overlap=1)
-        # update is labeled after tasks rearrange overlap
-        bulk_update_stats_project_tasks(all_project_tasks, project=self)
+        if update_is_labeled:
+            # update is labeled after tasks rearrange overlap
+            bulk_update_stats_project_tasks(all_project_tasks, project=self)
+
+    def _rearrange_overlap_cohort_by_rank(self, must_tasks, update_is_labeled=True):
+        """Set maximum_annotations overlap for tasks finished by non ground truth annotations and for the top of
+        other tasks ranked by annotation count, so at least must_tasks tasks have it, the rest get overlap 1
+
+        :param update_is_labeled: set is_labeled in the same statement like bulk_update_stats_project_tasks() does
+        for projects with overlap
+        :return: number of changed tasks
+        """
+        qn = connection.ops.quote_name
+        task_table, annotation_table = qn(Task._meta.db_table), qn(Annotation._meta.db_table)
+        max_annotations = self.maximum_annotations
+        params = [max_annotations, max_annotations, must_tasks, max_annotations, self.id]
+        is_labeled_set = is_labeled_changed = ''
+        if update_is_labeled:
+            is_labeled = '(ranked.total_annotations >= %s OR (ranked.total_annotations >= 1 AND ranked.overlap = 1))'
+            is_labeled_set = f', is_labeled = {is_labeled}'
+            is_labeled_changed = f' OR {task_table}.is_labeled <> {is_labeled}'
+            params = [max_annotations] + params + [max_annotations]
+
+        sql = f"""
+            UPDATE {task_table} SET overlap = ranked.overlap{is_labeled_set}
+            FROM (
+                SELECT
+                    id,
+                    total_annotations,
+                    CASE WHEN finished >= %s OR ROW_NUMBER() OVER (
+                        ORDER BY CASE WHEN finished >= %s THEN 0 ELSE 1 END, annotations DESC, id
+                    ) <= %s THEN %s ELSE 1 END AS overlap
+                FROM (
+                    SELECT
+                        t.id,
+                        t.total_annotations,
+                        SUM(
+                            CASE WHEN NOT a.was_cancelled AND a.result IS NOT NULL AND NOT a.ground_truth
+                            THEN 1 ELSE 0 END
+                        ) AS finished,
+                        COUNT(a.id) AS annotations
+                    FROM {task_table} t
+                    LEFT JOIN {annotation_table} a ON a.task_id = t.id
+                    WHERE t.project_id = %s
+                    GROUP BY t.id
+                ) counts
+            ) ranked
+            WHERE {task_table}.id = ranked.id AND ({task_table}.overlap <> ranked.overlap{is_labeled_changed})
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
 
     def remove_tasks_by_file_uploads(self, file_upload_ids):
         self.tasks.filter(file_upload_id__in=file_upload_ids).delete()
@@ -561,6 +624,7 @@ class Project(ProjectMixin, models.Model):
             return
 
         # validate annotations consistency
+        self.summary.compact_deltas()
         annotations_from_config = set(get_all_control_tag_tuples(config_string))
         if not annotations_from_config:
             logger.debug('Annotation schema is not found in config')
@@ -691,7 +755,8 @@ class Project(ProjectMixin, models.Model):
                 self.model_version = None
                 self.save(update_fields=['model_version'])
 
-            _, deleted_map = predictions.delete()
+            with deferred_tasks_counters():
+                _, deleted_map = predictions.delete()
 
         count = deleted_map.get('tasks.Prediction', 0)
         return {'deleted_predictions': count}
@@ -985,15 +1050,20 @@ class Project(ProjectMixin, models.Model):
         self._storage_objects = storage_objects
         return storage_objects
 
-    def resolve_storage_uri(self, url: str) -> Optional[Mapping[str, Any]]:
-        from io_storages.functions import get_storage_by_url
+    def get_storage_resolver(self):
+        """Import storages index to find storage by url, it's cached on the project instance like storage objects"""
+        from io_storages.functions import StorageResolver
 
-        storage_objects = self.get_all_storage_objects()
-        storage = get_storage_by_url(url, storage_objects)
+        if not hasattr(self, '_storage_resolver'):
+            self._storage_resolver = StorageResolver(self.get_all_storage_objects(type_='import'))
+        return self._storage_resolver
+
+    def resolve_storage_uri(self, url: str) -> Optional[Mapping[str, Any]]:
+        storage = self.get_storage_resolver().get(url)
 
         if storage:
             return {
-                'url': storage.generate_http_url(url),
+                'url': storage.generate_http_url_cached(url),
                 'presign_ttl': storage.presign_ttl,
             }
 
@@ -1010,12 +1080,9 @@ class Project(ProjectMixin, models.Model):
         page_idx = 0
 
         while task_ids_slice := task_ids[page_idx * settings.BATCH_SIZE : (page_idx + 1) * settings.BATCH_SIZE]:
-            with transaction.atomic():
-                # If counters are updated, is_labeled must be updated as well. Hence, if either fails, we
-                # will roll back.
-                queryset = make_queryset_from_iterable(task_ids_slice)
-                num_tasks_updated += update_tasks_counters(queryset, from_scratch)
-                bulk_update_stats_project_tasks(queryset, self)
+            # counters and is_labeled are updated in one transaction, if either fails, we will roll back
+            queryset = make_queryset_from_iterable(task_ids_slice)
+            num_tasks_updated += update_tasks_counters(queryset, from_scratch, project=self)
             page_idx += 1
         return num_tasks_updated
 
@@ -1137,6 +1204,10 @@ class ProjectSummary(models.Model):
     common_data_columns = JSONField(
         _('common data columns'), null=True, default=list, help_text='Common data columns found across imported tasks'
     )
+    # { col1: python type name of the first non-null col1 value }
+    data_columns_types = JSONField(
+        _('data columns types'), null=True, default=dict, help_text='Sampled value types of data columns'
+    )
     # { (from_name, to_name, type): annotation_count }
     created_annotations = JSONField(
         _('created annotations'),
@@ -1158,14 +1229,18 @@ class ProjectSummary(models.Model):
         if tasks_data_based:
             self.all_data_columns = {}
             self.common_data_columns = []
+            self.data_columns_types = {}
         self.created_annotations = {}
         self.created_labels = {}
         self.created_labels_drafts = {}
-        self.save()
+        with transaction.atomic():
+            self.save()
+            self.project.summary_deltas.all().delete()
 
     def update_data_columns(self, tasks):
         common_data_columns = set()
         all_data_columns = dict(self.all_data_columns)
+        data_columns_types = dict(self.data_columns_types or {})
         for task in tasks:
             try:
                 task_data = get_attr_or_item(task, 'data')
@@ -1174,19 +1249,25 @@ class ProjectSummary(models.Model):
             task_data_keys = task_data.keys()
             for column in task_data_keys:
                 all_data_columns[column] = all_data_columns.get(column, 0) + 1
+                if column not in data_columns_types and task_data[column] is not None:
+                    data_columns_types[column] = type(task_data[column]).__name__
             if not common_data_columns:
                 common_data_columns = set(task_data_keys)
             else:
                 common_data_columns &= set(task_data_keys)
 
         self.all_data_columns = all_data_columns
+        self.data_columns_types = data_columns_types
         if not self.common_data_columns:
             self.common_data_columns = list(sorted(common_data_columns))
         else:
             self.common_data_columns = list(sorted(set(self.common_data_columns) & common_data_columns))
         logger.debug(f'summary.all_data_columns = {self.all_data_columns}')
         logger.debug(f'summary.common_data_columns = {self.common_data_columns}')
-        self.save(update_fields=['all_data_columns', 'common_data_columns'])
+        self.save(update_fields=['all_data_columns', 'common_data_columns', 'data_columns_types'])
+
+        # keep materialized values of indexed data columns in sync with task data
+        index_tasks_data(self.project, tasks)
 
     def remove_data_columns(self, tasks):
         all_data_columns = dict(self.all_data_columns)
@@ -1204,19 +1285,39 @@ class ProjectSummary(models.Model):
 
         if keys_to_remove:
             common_data_columns = list(self.common_data_columns)
+            data_columns_types = dict(self.data_columns_types or {})
             for key in keys_to_remove:
                 if key in common_data_columns:
                     common_data_columns.remove(key)
+                data_columns_types.pop(key, None)
             self.common_data_columns = common_data_columns
+            self.data_columns_types = data_columns_types
         logger.debug(f'summary.all_data_columns = {self.all_data_columns}')
         logger.debug(f'summary.common_data_columns = {self.common_data_columns}')
         self.save(
             update_fields=[
                 'all_data_columns',
                 'common_data_columns',
+                'data_columns_types',
             ]
         )
 
+    def get_data_column_type(self, column):
+        """Python type name of data column values, sampled from one task and saved if it's unknown yet"""
+        data_columns_types = self.data_columns_types or {}
+        if column not in data_columns_types:
+            field_name = f'data__{column}'
+            value = (
+                self.project.tasks.filter(**{f'{field_name}__isnull': False})
+                .values_list(field_name, flat=True)
+                .first()
+            )
+            if value is None:
+                return 'NoneType'
+            self.data_columns_types = {**data_columns_types, column: type(value).__name__}
+            self.save(update_fields=['data_columns_types'])
+        return self.data_columns_types[column]
+
     def _get_annotation_key(self, result):
         result_type = result.get('type', None)
         if result_type in ('relation', 'pairwise', None):
@@ -1250,7 +1351,96 @@ class ProjectSummary(models.Model):
                 labels.append(str(label))
         return labels
 
+    @staticmethod
+    def use_deltas():
+        """Counters are recorded as deltas only when the compactor job can be scheduled"""
+        return bool(settings.PROJECT_SUMMARY_COMPACT_INTERVAL) and redis_connected()
+
+    def _get_results_deltas(self, items, labels_field, sign, with_annotations=True):
+        """Count annotation types and labels of items results as {(field, key, label): delta}"""
+        deltas = Counter()
+        for item in items:
+            results = get_attr_or_item(item, 'result') or []
+            if not isinstance(results, list):
+                continue
+
+            for result in results:
+                from_name = result.get('from_name')
+                if with_annotations:
+                    key = self._get_annotation_key(result)
+                    if not key:
+                        continue
+                    deltas[(ProjectSummaryDelta.CREATED_ANNOTATIONS, key, '')] += sign
+                elif from_name is None:
+                    continue
+
+                for label in self._get_labels(result):
+                    deltas[(labels_field, from_name, label)] += sign
+        return deltas
+
+    def record_deltas(self, deltas):
+        """Atomically increment delta counters without touching the summary row, then schedule the compaction
+
+        :param deltas: {(field, key, label): delta}
+        """
+        for (field, key, label), delta in deltas.items():
+            if not delta:
+                continue
+            counter = ProjectSummaryDelta.objects.filter(project_id=self.project_id, field=field, key=key, label=label)
+            if counter.update(delta=F('delta') + delta):
+                continue
+            try:
+                with transaction.atomic():
+                    ProjectSummaryDelta.objects.create(
+                        project_id=self.project_id, field=field, key=key, label=label, delta=delta
+                    )
+            except IntegrityError:
+                # the counter is just created by a concurrent writer
+                counter.update(delta=F('delta') + delta)
+        logger.debug(f'Project {self.project_id}: summary deltas recorded {dict(deltas)}')
+        schedule_project_summary_compaction(self.project_id)
+
+    def compact_deltas(self):
+        """Fold recorded deltas into the summary counters, the summary instance gets the merged view"""
+        fields = [
+            ProjectSummaryDelta.CREATED_ANNOTATIONS,
+            ProjectSummaryDelta.CREATED_LABELS,
+            ProjectSummaryDelta.CREATED_LABELS_DRAFTS,
+        ]
+        with transaction.atomic():
+            # the summary lock serializes compactors, locked deltas are being incremented and wait for the next run
+            list(ProjectSummary.objects.select_for_update().filter(pk=self.pk).values_list('pk'))
+            deltas = list(
+                ProjectSummaryDelta.objects.select_for_update(skip_locked=True).filter(project_id=self.project_id)
+            )
+            if not deltas:
+                return 0
+            self.refresh_from_db(fields=fields)
+            counters = {field: dict(getattr(self, field) or {}) for field in fields}
+            for item in deltas:
+                counter = counters[item.field]
+                if item.field == ProjectSummaryDelta.CREATED_ANNOTATIONS:
+                    counter[item.key] = counter.get(item.key, 0) + item.delta
+                    if counter[item.key] <= 0:
+                        counter.pop(item.key)
+                    continue
+                labels = counter[item.key] = dict(counter.get(item.key, {}))
+                labels[item.label] = labels.get(item.label, 0) + item.delta
+                if labels[item.label] <= 0:
+                    labels.pop(item.label)
+                if not labels:
+                    counter.pop(item.key)
+            for field in fields:
+                setattr(self, field, counters[field])
+            self.save(update_fields=fields)
+            ProjectSummaryDelta.objects.filter(id__in=[item.id for item in deltas]).delete()
+        logger.debug(f'Project {self.project_id}: {len(deltas)} summary deltas compacted')
+        return len(deltas)
+
     def update_created_annotations_and_labels(self, annotations):
+        if self.use_deltas():
+            return self.record_deltas(self._get_results_deltas(annotations, ProjectSummaryDelta.CREATED_LABELS, 1))
+
         created_annotations = dict(self.created_annotations)
         labels = dict(self.created_labels)
         for annotation in annotations:
@@ -1282,6 +1472,15 @@ class ProjectSummary(models.Model):
     def remove_created_annotations_and_labels(self, annotations):
         # we are going to remove all annotations, so we'll reset the corresponding fields on the summary
         remove_all_annotations = self.project.annotations.count() == len(annotations)
+        if self.use_deltas():
+            if not remove_all_annotations:
+                return self.record_deltas(
+                    self._get_results_deltas(annotations, ProjectSummaryDelta.CREATED_LABELS, -1)
+                )
+            self.project.summary_deltas.filter(
+                field__in=[ProjectSummaryDelta.CREATED_ANNOTATIONS, ProjectSummaryDelta.CREATED_LABELS]
+            ).delete()
+
         created_annotations, created_labels = (
             ({}, {}) if remove_all_annotations else (dict(self.created_annotations), dict(self.created_labels))
         )
@@ -1320,6 +1519,11 @@ class ProjectSummary(models.Model):
         self.save(update_fields=['created_annotations', 'created_labels'])
 
     def update_created_labels_drafts(self, drafts):
+        if self.use_deltas():
+            return self.record_deltas(
+                self._get_results_deltas(drafts, ProjectSummaryDelta.CREATED_LABELS_DRAFTS, 1, with_annotations=False)
+            )
+
         labels = dict(self.created_labels_drafts)
         for draft in drafts:
             results = get_attr_or_item(draft, 'result') or []
@@ -1345,6 +1549,15 @@ class ProjectSummary(models.Model):
     def remove_created_drafts_and_labels(self, drafts):
         # we are going to remove all drafts, so we'll reset the corresponding field on the summary
         remove_all_drafts = AnnotationDraft.objects.filter(task__project=self.project).count() == len(drafts)
+        if self.use_deltas():
+            if not remove_all_drafts:
+                return self.record_deltas(
+                    self._get_results_deltas(
+                        drafts, ProjectSummaryDelta.CREATED_LABELS_DRAFTS, -1, with_annotations=False
+                    )
+                )
+            self.project.summary_deltas.filter(field=ProjectSummaryDelta.CREATED_LABELS_DRAFTS).delete()
+
         labels = {} if remove_all_drafts else dict(self.created_labels_drafts)
 
         if not remove_all_drafts:
@@ -1371,6 +1584,46 @@ class ProjectSummary(models.Model):
         self.save(update_fields=['created_labels_drafts'])
 
 
+class ProjectSummaryDelta(models.Model):
+    """Pending change of a ProjectSummary counter, folded into the summary by ProjectSummary.compact_deltas()"""
+
+    CREATED_ANNOTATIONS = 'created_annotations'
+    CREATED_LABELS = 'created_labels'
+    CREATED_LABELS_DRAFTS = 'created_labels_drafts'
+    FIELD_CHOICES = (
+        (CREATED_ANNOTATIONS, 'Created annotations'),
+        (CREATED_LABELS, 'Created labels'),
+        (CREATED_LABELS_DRAFTS, 'Created labels in drafts'),
+    )
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='summary_deltas')
+    field = models.CharField(_('field'), max_length=32, choices=FIELD_CHOICES, help_text='Summary counter field')
+    # annotation tuple for created_annotations, from_name for created_labels*
+    key = models.TextField(_('key'), help_text='Counter key')
+    label = models.TextField(_('label'), blank=True, default='', help_text='Label of from_name for labels counters')
+    delta = models.IntegerField(_('delta'), default=0, help_text='Not compacted counter change')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'field', 'key', 'label'], name='unique_project_summary_delta')
+        ]
+
+
+def compact_project_summary_deltas(project_id):
+    summary = ProjectSummary.objects.filter(project_id=project_id).first()
+    if summary is not None:
+        summary.compact_deltas()
+
+
+def schedule_project_summary_compaction(project_id):
+    """Enqueue summary deltas compaction of the project, at most once per PROJECT_SUMMARY_COMPACT_INTERVAL seconds"""
+    key = f'project-summary-compaction-scheduled:{project_id}'
+    interval = settings.PROJECT_SUMMARY_COMPACT_INTERVAL
+    # the marker is set atomically, so concurrent callers don't enqueue duplicate jobs
+    if redis_set_if_absent(key, 1, ttl=interval):
+        start_job_async_or_sync(compact_project_summary_deltas, project_id, in_seconds=interval, queue_name='low')
+
+
 class ProjectImport(models.Model):
     class Status(models.TextChoices):
         CREATED = 'created', _('Created')
@@ -1426,3 +1679,275 @@ class ProjectReimport(models.Model):
 
     def has_permission(self, user):
         return self.project.has_permission(user)
+
+
+class ProjectRecalculation(models.Model):
+    """Recalculation of tasks overlap and is_labeled after project settings change. It runs by batches, every batch
+    is committed in a short transaction together with the checkpoint, so the job doesn't block annotators for long
+    and continues from the checkpoint after worker restarts
+    """
+
+    class Status(models.TextChoices):
+        CREATED = 'created', _('Created')
+        IN_PROGRESS = 'in_progress', _('In progress')
+        FAILED = 'failed', _('Failed')
+        COMPLETED = 'completed', _('Completed')
+
+    class Stage(models.TextChoices):
+        OVERLAP = 'overlap', _('Overlap')
+        IS_LABELED = 'is_labeled', _('Is labeled')
+
+    # how overlap is changed, it's decided once at the first batch and kept in meta
+    OVERLAP_NONE = 'none'
+    OVERLAP_OVERLAPPED = 'overlapped'
+    OVERLAP_ALL = 'all'
+    OVERLAP_REARRANGE = 'rearrange'
+
+    UNFINISHED_STATUSES = (Status.CREATED, Status.IN_PROGRESS)
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='recalculations')
+    status = models.CharField(max_length=64, choices=Status.choices, default=Status.CREATED)
+    stage = models.CharField(max_length=64, choices=Stage.choices, default=Stage.OVERLAP)
+    maximum_annotations_changed = models.BooleanField(default=False)
+    overlap_cohort_percentage_changed = models.BooleanField(default=False)
+    tasks_number_changed = models.BooleanField(default=False)
+    run_id = models.CharField(
+        max_length=32, default='', help_text='Only the job run with this id processes batches, restarts change it'
+    )
+    last_task_id = models.IntegerField(default=0, help_text='Checkpoint: the last processed task id of the stage')
+    processed_count = models.IntegerField(default=0, help_text='Number of processed tasks of the stage')
+    total_count = models.IntegerField(default=0, help_text='Number of project tasks')
+    meta = JSONField('meta', null=True, default=dict, help_text='Meta and debug information about the job')
+    traceback = models.TextField(null=True, blank=True, help_text='Traceback report for the last failure')
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True, help_text='Creation time')
+    updated_at = models.DateTimeField(_('updated at'), auto_now=True, help_text='Last checkpoint time')
+    finished_at = models.DateTimeField(_('finished at'), help_text='Complete or fail time', null=True, default=None)
+
+    def has_permission(self, user):
+        return self.project.has_permission(user)
+
+    @classmethod
+    def start(
+        cls,
+        project,
+        maximum_annotations_changed,
+        overlap_cohort_percentage_changed,
+        tasks_number_changed,
+        sync=False,
+    ):
+        """Create a recalculation of the project, the unfinished one is restarted from scratch with merged changes
+
+        :param sync: run all batches in the current process instead of the background job
+        """
+        with transaction.atomic():
+            job = cls.objects.select_for_update().filter(project=project, status__in=cls.UNFINISHED_STATUSES).first()
+            if job is None:
+                job = cls(project=project)
+            job.project = project
+            job.maximum_annotations_changed |= maximum_annotations_changed
+            job.overlap_cohort_percentage_changed |= overlap_cohort_percentage_changed
+            job.tasks_number_changed |= tasks_number_changed
+            job.status = cls.Status.CREATED
+            job.stage = cls.Stage.OVERLAP
+            job.last_task_id = job.processed_count = 0
+            job.total_count = project.tasks.count()
+            job.meta = {'time_queued': str(timezone.now())}
+            job.run_id = uuid4().hex
+            job.save()
+
+        if sync:
+            job.run(job.run_id)
+        else:
+            job.enqueue()
+        return job
+
+    def enqueue(self, in_seconds=0):
+        start_job_async_or_sync(
+            run_project_recalculation,
+            self.id,
+            self.run_id,
+            in_seconds=in_seconds,
+            job_timeout=settings.RQ_LONG_JOB_TIMEOUT,
+        )
+
+    def resume(self):
+        """Continue the stale job from its checkpoint, the previous run stops at its next batch if it's still alive"""
+        with transaction.atomic():
+            job = ProjectRecalculation.objects.select_for_update().get(id=self.id)
+            if job.status not in self.UNFINISHED_STATUSES:
+                return
+            job.run_id = uuid4().hex
+            job.meta['resumes'] = job.meta.get('resumes', 0) + 1
+            job.save(update_fields=['run_id', 'meta', 'updated_at'])
+        logger.info(f'Recalculation {job.id} of project {job.project_id} is resumed from task {job.last_task_id}')
+        job.enqueue()
+
+    def run(self, run_id):
+        try:
+            while self._process_batch(run_id):
+                pass
+        except OperationalError:
+            if not redis_connected():
+                self.info_set_failed(run_id)
+                raise
+            # the batch is rolled back, try it again from the checkpoint later
+            logger.warning(f'Operational error in recalculation {self.id}, retrying', exc_info=True)
+            self.enqueue(in_seconds=settings.BATCH_JOB_RETRY_TIMEOUT)
+        except Exception:
+            self.info_set_failed(run_id)
+            raise
+
+    def _process_batch(self, run_id):
+        """Process one batch of the current stage and save the checkpoint in the same transaction
+
+        :return: True if there are more batches to process
+        """
+        with transaction.atomic():
+            locked = ProjectRecalculation.objects.select_for_update().filter(
+                id=self.id, run_id=run_id, status__in=self.UNFINISHED_STATUSES
+            )
+            if not list(locked.values_list('id', flat=True)):
+                logger.info(f'Recalculation {self.id} run {run_id} is finished or restarted by another run')
+                return False
+
+            now = timezone.now()
+            if self.status == self.Status.CREATED:
+                self.status = self.Status.IN_PROGRESS
+                self.meta['time_in_progress'] = str(now)
+
+            if self.stage == self.Stage.OVERLAP:
+                if self._update_overlap_batch():
+                    self.stage = self.Stage.IS_LABELED
+                    self.last_task_id = self.processed_count = 0
+                    if self.meta['overlap_mode'] == self.OVERLAP_NONE:
+                        self.status = self.Status.COMPLETED
+            elif self._update_is_labeled_batch():
+                self.status = self.Status.COMPLETED
+
+            # progress reporting
+            self.meta['time_last_ping'] = str(now)
+            self.meta['duration'] = (now - datetime.fromisoformat(self.meta['time_in_progress'])).total_seconds()
+            if self.status == self.Status.COMPLETED:
+                self.finished_at = now
+            self.save()
+
+        if self.status != self.Status.COMPLETED:
+            return True
+        logger.info(f'Recalculation {self.id} of project {self.project_id} is completed in {self.meta["duration"]} s')
+        # tasks overlap and is_labeled are changed by bulk updates without signals
+        bump_project_data_version(self.project_id)
+        invalidate_next_task_queues(self.project_id)
+        return False
+
+    @staticmethod
+    def is_required(project, maximum_annotations_changed, overlap_cohort_percentage_changed, tasks_number_changed):
+        """Whether the changes require tasks overlap to be updated, it's checked without queries"""
+        return bool(
+            # if maximum annotations parameter is tweaked
+            maximum_annotations_changed
+            # if cohort slider is tweaked
+            or (overlap_cohort_percentage_changed and project.maximum_annotations > 1)
+            # if adding/deleting tasks and cohort settings are applied
+            or (tasks_number_changed and project.overlap_cohort_percentage < 100 and project.maximum_annotations > 1)
+        )
+
+    def _get_overlap_mode(self):
+        project = self.project
+        if not self.is_required(
+            project,
+            self.maximum_annotations_changed,
+            self.overlap_cohort_percentage_changed,
+            self.tasks_number_changed,
+        ):
+            return self.OVERLAP_NONE
+
+        # if only maximum annotations parameter is tweaked
+        if self.maximum_annotations_changed and (
+            not self.overlap_cohort_percentage_changed or project.maximum_annotations == 1
+        ):
+            if project.tasks.filter(overlap__gt=1).exists():
+                # if there is a part with overlapped tasks, affect only them
+                return self.OVERLAP_OVERLAPPED
+            elif project.overlap_cohort_percentage < 100:
+                return self.OVERLAP_REARRANGE
+            # otherwise affect all tasks
+            return self.OVERLAP_ALL
+        return self.OVERLAP_REARRANGE
+
+    def _next_task_ids(self, tasks):
+        batch_size = settings.PROJECT_RECALCULATION_BATCH_SIZE
+        ids = list(tasks.filter(id__gt=self.last_task_id).order_by('id').values_list('id', flat=True)[:batch_size])
+        if ids:
+            self.last_task_id = ids[-1]
+            self.processed_count += len(ids)
+        return ids, len(ids) < batch_size
+
+    def _update_overlap_batch(self):
+        """
+        :return: True if the overlap stage is done
+        """
+        if 'overlap_mode' not in self.meta:
+            self.meta['overlap_mode'] = self._get_overlap_mode()
+        mode = self.meta['overlap_mode']
+        project = self.project
+
+        if mode == self.OVERLAP_REARRANGE:
+            # tasks are ranked among all project tasks, so it's one set-based statement
+            project._rearrange_overlap_cohort(update_is_labeled=False)
+            self.processed_count = self.total_count
+            return True
+
+        if mode in (self.OVERLAP_OVERLAPPED, self.OVERLAP_ALL):
+            tasks = project.tasks.all()
+            if mode == self.OVERLAP_OVERLAPPED:
+                tasks = tasks.filter(overlap__gt=1)
+            ids, done = self._next_task_ids(tasks)
+            Task.objects.filter(id__in=ids).update(overlap=project.maximum_annotations)
+            return done
+        return True
+
+    def _update_is_labeled_batch(self):
+        """
+        :return: True if the is_labeled stage is done
+        """
+        ids, done = self._next_task_ids(self.project.tasks.all())
+        if ids:
+            bulk_update_stats_project_tasks(Task.objects.filter(id__in=ids), project=self.project, retry=False)
+        return done
+
+    def info_set_failed(self, run_id):
+        now = timezone.now()
+        self.status = self.Status.FAILED
+        self.traceback = str(tb.format_exc())
+        self.finished_at = now
+        self.meta['time_failure'] = str(now)
+        # don't overwrite the state of the job restarted by another run
+        ProjectRecalculation.objects.filter(id=self.id, run_id=run_id).update(
+            status=self.status, traceback=self.traceback, finished_at=now, meta=self.meta, updated_at=now
+        )
+
+
+def run_project_recalculation(recalculation_id, run_id):
+    job = ProjectRecalculation.objects.filter(id=recalculation_id).first()
+    if job is None:
+        logger.warning(f'Recalculation {recalculation_id} not found')
+        return
+    job.run(run_id)
+
+
+def resume_project_recalculations(project=None):
+    """Resume unfinished recalculations without progress for PROJECT_RECALCULATION_STALE_TIMEOUT seconds,
+    e.g. jobs lost with restarted workers
+
+    :return: number of resumed recalculations
+    """
+    stale_time = timezone.now() - timedelta(seconds=settings.PROJECT_RECALCULATION_STALE_TIMEOUT)
+    jobs = ProjectRecalculation.objects.filter(
+        status__in=ProjectRecalculation.UNFINISHED_STATUSES, updated_at__lt=stale_time
+    )
+    if project is not None:
+        jobs = jobs.filter(project=project)
+    jobs = list(jobs)
+    for job in jobs:
+        job.resume()
+    return len(jobs)
@@ -3,7 +3,14 @@
 import bleach
 from constants import SAFE_HTML_ATTRIBUTES, SAFE_HTML_TAGS
 from django.db.models import Q
-from projects.models import Project, ProjectImport, ProjectOnboarding, ProjectReimport, ProjectSummary
+from projects.models import (
+    Project,
+    ProjectImport,
+    ProjectOnboarding,
+    ProjectRecalculation,
+    ProjectReimport,
+    ProjectSummary,
+)
 from rest_flex_fields import FlexFieldsModelSerializer
 from rest_framework import serializers
 from rest_framework.serializers import SerializerMethodField
@@ -246,6 +253,12 @@ class ProjectReimportSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class ProjectRecalculationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProjectRecalculation
+        exclude = ['run_id']
+
+
 class ProjectModelVersionExtendedSerializer(serializers.Serializer):
     model_version = serializers.CharField()
     count = serializers.IntegerField()
@@ -39,6 +39,13 @@ _api_urlpatterns = [
     path('<int:pk>/imports/<int:import_pk>/', api.ProjectImportAPI.as_view(), name='project-imports'),
     # Project reimport
     path('<int:pk>/reimports/<int:reimport_pk>/', api.ProjectReimportAPI.as_view(), name='project-reimports'),
+    # Project tasks recalculations after settings changes
+    path('<int:pk>/recalculations/', api.ProjectRecalculationListAPI.as_view(), name='project-recalculations'),
+    path(
+        '<int:pk>/recalculations/resume/',
+        api.ProjectRecalculationResumeAPI.as_view(),
+        name='project-recalculations-resume',
+    ),
     # Tasks list for the project: get and destroy
     path('<int:pk>/tasks/', api.ProjectTaskListAPI.as_view(), name='project-tasks-list'),
     # Generate sample task for this project
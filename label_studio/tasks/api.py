@@ -79,6 +79,19 @@ logger = logging.getLogger(__name__)
                 in_=openapi.IN_QUERY,
                 description='Resolve task data URIs using Cloud Storage',
             ),
+            openapi.Parameter(
+                name='cursor',
+                type=openapi.TYPE_STRING,
+                in_=openapi.IN_QUERY,
+                description='Use cursor pagination: pass an empty value for the first page '
+                'and `next_cursor` from the previous response for the next pages',
+            ),
+            openapi.Parameter(
+                name='include_total',
+                type=openapi.TYPE_BOOLEAN,
+                in_=openapi.IN_QUERY,
+                description='Calculate totals for cursor pagination',
+            ),
         ],
         responses={
             '200': openapi.Response(
@@ -102,6 +115,10 @@ logger = logging.getLogger(__name__)
                         'total_predictions': openapi.Schema(
                             description='Total number of predictions', type=openapi.TYPE_INTEGER
                         ),
+                        'next_cursor': openapi.Schema(
+                            description='Cursor of the next page for cursor pagination, null for the last page',
+                            type=openapi.TYPE_STRING,
+                        ),
                     },
                 ),
             )
@@ -4,20 +4,22 @@ import os
 import shutil
 import sys
 
-from core.bulk_update_utils import bulk_update
 from core.models import AsyncMigrationStatus
 from core.redis import start_job_async_or_sync
 from core.utils.common import batch
+from core.utils.db import SQCount, update_from_is_supported
 from data_export.mixins import ExportMixin
 from data_export.models import DataExport
 from data_export.serializers import ExportDataSerializer
 from data_manager.managers import TaskQuerySet
+from data_manager.totals import bump_project_data_version
 from django.conf import settings
-from django.db import transaction
-from django.db.models import Count, Q
+from django.core.exceptions import EmptyResultSet
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Q
 from organizations.models import Organization
 from projects.models import Project
-from tasks.models import Annotation, Prediction, Task
+from tasks.models import Annotation, Prediction, Task, bulk_update_stats_project_tasks
 
 logger = logging.getLogger(__name__)
 
@@ -174,18 +176,93 @@ def fill_predictions_project(migration_name):
     logger.info('Finished filling project field for Prediction model')
 
 
-def update_tasks_counters(queryset, from_scratch=True):
+def _update_tasks_counters_from_aggregates(queryset, project=None):
+    """Update counters (and is_labeled if project is passed) of changed tasks with one UPDATE ... FROM statement
+    joined with annotation and prediction counts aggregated over the queryset tasks
     """
-    Update tasks counters for the passed queryset of Tasks
+    qn = connection.ops.quote_name
+    task_table, annotation_table, prediction_table = (
+        qn(model._meta.db_table) for model in (Task, Annotation, Prediction)
+    )
+    try:
+        ids_sql, params = queryset.order_by().values('id', 'overlap').query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    params = list(params)
+
+    is_labeled_select = is_labeled_set = is_labeled_changed = ''
+    if project is not None:
+        # the same rule as bulk_update_stats_project_tasks() uses for projects with overlap
+        is_labeled_select = (
+            ', (COALESCE(a.total, 0) >= %s OR (COALESCE(a.total, 0) >= 1 AND ids.overlap = 1)) AS is_labeled'
+        )
+        is_labeled_set = ', is_labeled = counters.is_labeled'
+        is_labeled_changed = f' OR {task_table}.is_labeled <> counters.is_labeled'
+        params.append(project.maximum_annotations)
+
+    # CTE is inside of FROM: sqlite3 doesn't report rowcount of statements started with WITH
+    sql = f"""
+        UPDATE {task_table} SET
+            total_annotations = counters.total_annotations,
+            cancelled_annotations = counters.cancelled_annotations,
+            total_predictions = counters.total_predictions{is_labeled_set}
+        FROM (
+            WITH ids AS ({ids_sql})
+            SELECT
+                ids.id,
+                COALESCE(a.total, 0) AS total_annotations,
+                COALESCE(a.cancelled, 0) AS cancelled_annotations,
+                COALESCE(p.total, 0) AS total_predictions{is_labeled_select}
+            FROM ids
+            LEFT JOIN (
+                SELECT
+                    task_id,
+                    SUM(CASE WHEN was_cancelled THEN 0 ELSE 1 END) AS total,
+                    SUM(CASE WHEN was_cancelled THEN 1 ELSE 0 END) AS cancelled
+                FROM {annotation_table}
+                WHERE task_id IN (SELECT id FROM ids)
+                GROUP BY task_id
+            ) a ON a.task_id = ids.id
+            LEFT JOIN (
+                SELECT task_id, COUNT(*) AS total
+                FROM {prediction_table}
+                WHERE task_id IN (SELECT id FROM ids)
+                GROUP BY task_id
+            ) p ON p.task_id = ids.id
+        ) counters
+        WHERE {task_table}.id = counters.id AND (
+            {task_table}.total_annotations <> counters.total_annotations
+            OR {task_table}.cancelled_annotations <> counters.cancelled_annotations
+            OR {task_table}.total_predictions <> counters.total_predictions{is_labeled_changed}
+        )
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def _update_tasks_counters_by_subqueries(queryset):
+    """Fallback for databases without UPDATE ... FROM: correlated count subqueries for changed tasks"""
+    annotations = Annotation.objects.filter(task=OuterRef('pk')).values('id')
+    counters = dict(
+        total_annotations=SQCount(annotations.filter(was_cancelled=False)),
+        cancelled_annotations=SQCount(annotations.filter(was_cancelled=True)),
+        total_predictions=SQCount(Prediction.objects.filter(task=OuterRef('pk')).values('id')),
+    )
+    changed = queryset.annotate(**{f'new_{field}': value for field, value in counters.items()}).exclude(
+        **{field: F(f'new_{field}') for field in counters}
+    )
+    return Task.objects.filter(id__in=changed.values('id')).update(**counters)
+
+
+def update_tasks_counters(queryset, from_scratch=True, project=None):
+    """
+    Update tasks counters for the passed queryset of Tasks in a single statement
     :param queryset: Tasks to update queryset
     :param from_scratch: Skip calculated tasks
+    :param project: Project of the tasks, if passed is_labeled is updated as well
     :return: Count of updated tasks
     """
-    objs = []
-
-    total_annotations = Count('annotations', distinct=True, filter=Q(annotations__was_cancelled=False))
-    cancelled_annotations = Count('annotations', distinct=True, filter=Q(annotations__was_cancelled=True))
-    total_predictions = Count('predictions', distinct=True)
     # construct QuerySet in case of list of Tasks
     if isinstance(queryset, list) and len(queryset) > 0 and isinstance(queryset[0], Task):
         queryset = Task.objects.filter(id__in=[task.id for task in queryset])
@@ -193,33 +270,23 @@ def update_tasks_counters(queryset, from_scratch=True):
     if isinstance(queryset, TaskQuerySet) and queryset.exists() and isinstance(queryset[0], int):
         queryset = Task.objects.filter(id__in=queryset)
 
+    tasks = queryset
     if not from_scratch:
         queryset = queryset.exclude(
             Q(total_annotations__gt=0) | Q(cancelled_annotations__gt=0) | Q(total_predictions__gt=0)
         )
 
-    # filter our tasks with 0 annotations and 0 predictions and update them with 0
-    queryset.filter(annotations__isnull=True, predictions__isnull=True).update(
-        total_annotations=0, cancelled_annotations=0, total_predictions=0
-    )
-
-    # filter our tasks with 0 annotations and 0 predictions
-    queryset = queryset.filter(Q(annotations__isnull=False) | Q(predictions__isnull=False))
-    queryset = queryset.annotate(
-        new_total_annotations=total_annotations,
-        new_cancelled_annotations=cancelled_annotations,
-        new_total_predictions=total_predictions,
-    )
-
-    for task in queryset.only('id', 'total_annotations', 'cancelled_annotations', 'total_predictions'):
-        task.total_annotations = task.new_total_annotations
-        task.cancelled_annotations = task.new_cancelled_annotations
-        task.total_predictions = task.new_total_predictions
-        objs.append(task)
     with transaction.atomic():
-        bulk_update(
-            objs,
-            update_fields=['total_annotations', 'cancelled_annotations', 'total_predictions'],
-            batch_size=settings.BATCH_SIZE,
-        )
-    return len(objs)
+        if not update_from_is_supported():
+            updated = _update_tasks_counters_by_subqueries(queryset)
+        elif project is not None and from_scratch and project._can_use_overlap():
+            # is_labeled is calculated in the same pass
+            updated = _update_tasks_counters_from_aggregates(queryset, project)
+            bump_project_data_version(project.id)
+            return updated
+        else:
+            updated = _update_tasks_counters_from_aggregates(queryset)
+
+        if project is not None:
+            bulk_update_stats_project_tasks(tasks, project)
+    return updated
@@ -0,0 +1,30 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from projects.models import Project
+from tasks.models import Task
+
+
+class Command(BaseCommand):
+    help = 'Compare random task samplers (TASKS_RANDOM_SAMPLER) on unlabeled tasks of a project'
+
+    def add_arguments(self, parser):
+        parser.add_argument('project', type=int, help='project id')
+        parser.add_argument('--runs', type=int, default=20, help='number of samples per sampler')
+
+    def handle(self, *args, **options):
+        project = Project.objects.get(id=options['project'])
+        tasks = Task.objects.filter(project=project, is_labeled=False)
+        self.stdout.write(f'Project {project.id}: {tasks.count()} unlabeled tasks')
+
+        for sampler in ('random_order', 'inner_id'):
+            sampled = set()
+            start = time.time()
+            for _ in range(options['runs']):
+                ids = Task.sample_random_ids(
+                    tasks, settings.RANDOM_NEXT_TASK_SAMPLE_SIZE, project=project, sampler=sampler
+                )
+                sampled.update(ids)
+            elapsed = (time.time() - start) / options['runs']
+            self.stdout.write(f'{sampler}: {elapsed * 1000:.1f} ms per sample, {len(sampled)} distinct tasks sampled')
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from projects.models import Project
+from tasks.functions import update_tasks_counters
+from tasks.models import Task
+
+
+class Command(BaseCommand):
+    help = 'Measure recalculation of task counters and is_labeled for all tasks of a project'
+
+    def add_arguments(self, parser):
+        parser.add_argument('project', type=int, help='project id')
+        parser.add_argument('--runs', type=int, default=3, help='number of recalculations')
+        parser.add_argument(
+            '--reset', action='store_true', help='zero counters before every run, so all tasks are updated'
+        )
+
+    def handle(self, *args, **options):
+        project = Project.objects.get(id=options['project'])
+        tasks = Task.objects.filter(project=project)
+        self.stdout.write(f'Project {project.id}: {tasks.count()} tasks')
+
+        for run in range(options['runs']):
+            if options['reset']:
+                tasks.update(total_annotations=0, cancelled_annotations=0, total_predictions=0, is_labeled=False)
+            start = time.time()
+            updated = update_tasks_counters(tasks, project=project)
+            self.stdout.write(f'Run {run + 1}: {updated} tasks updated in {time.time() - start:.2f} s')
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-18 22:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0047_merge_20240318_2210'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tasklock',
+            index=models.Index(fields=['task', 'expire_at'], name='tasks_taskl_task_id_377dd4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tasklock',
+            index=models.Index(fields=['expire_at'], name='tasks_taskl_expire__9122ba_idx'),
+        ),
+    ]
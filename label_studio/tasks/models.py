@@ -6,7 +6,10 @@ import logging
 import numbers
 import os
 import random
+import threading
 import uuid
+from collections import defaultdict
+from contextlib import contextmanager
 from typing import Any, Mapping, Optional, cast
 from urllib.parse import urljoin
 
@@ -15,22 +18,25 @@ from core.bulk_update_utils import bulk_update
 from core.current_request import get_current_request
 from core.feature_flags import flag_set
 from core.label_config import SINGLE_VALUED_TAGS
-from core.redis import start_job_async_or_sync
+from core.redis import redis_connected, redis_set_if_absent, start_job_async_or_sync
 from core.utils.common import (
     find_first_one_to_one_related_field_by_prefix,
+    iter_batches,
     load_func,
     string_is_url,
     temporary_disconnect_list_signal,
 )
-from core.utils.db import fast_first
+from core.utils.db import SQCount, fast_first
 from core.utils.params import get_env
 from data_import.models import FileUpload
 from data_manager.managers import PreparedTaskManager, TaskManager
+from data_manager.totals import bump_project_data_version
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
 from django.core.files.storage import default_storage
 from django.db import OperationalError, models, transaction
-from django.db.models import JSONField, Q
+from django.db.models import Count, JSONField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import Signal, receiver
 from django.urls import reverse
@@ -181,15 +187,59 @@ class Task(TaskMixin, models.Model):
 
     @classmethod
     def get_random(cls, project):
-        """Get random task from a project, this should not be used lightly as its expensive method to run"""
-
-        ids = cls.objects.filter(project=project).values_list('id', flat=True)
+        """Get random task from a project"""
+        ids = cls.sample_random_ids(cls.objects.filter(project=project), 1, project=project)
         if len(ids) == 0:
             return None
 
-        random_id = random.choice(ids)
+        return cls.objects.get(id=ids[0])
+
+    @classmethod
+    def sample_random_ids(cls, tasks, size, project=None, sampler=None):
+        """Random sample of task ids from the tasks queryset
+
+        :param tasks: tasks queryset
+        :param size: maximum number of ids to return
+        :param project: project of the tasks, its inner_id range is taken from the index, otherwise from tasks
+        :param sampler: 'random_order' sorts all tasks by random(), it's O(N);
+                        'inner_id' probes random inner_ids and takes the first task at or after each probe
+                        (wrapping around the end) using (project, inner_id) index, it's O(size * log N).
+                        Probes are independent, but a task is hit with a chance proportional
+                        to the inner_id gap before it, e.g. the first unlabeled task after a long labeled run;
+                        settings.TASKS_RANDOM_SAMPLER by default
+        """
+        sampler = sampler or settings.TASKS_RANDOM_SAMPLER
+        if sampler == 'inner_id':
+            bounds = tasks if project is None else cls.objects.filter(project=project)
+            max_inner_id = bounds.aggregate(models.Max('inner_id'))['inner_id__max']
+            if max_inner_id:
+                return cls._sample_ids_by_inner_id(tasks, size, max_inner_id)
 
-        return cls.objects.get(id=random_id)
+        return list(tasks.order_by('?').values_list('id', flat=True)[:size])
+
+    @classmethod
+    def _sample_ids_by_inner_id(cls, tasks, size, max_inner_id, rounds=5):
+        """Each round takes `size` probes in one query, tasks hit again are dropped and the next round is probed,
+        the sample is topped up by inner_id order if the tasks are too few to be hit in a few rounds
+        """
+        ids = []
+        candidates = tasks.order_by('inner_id').values('id')
+        first = Subquery(candidates[:1])
+        for _round in range(rounds):
+            probes = [
+                Coalesce(Subquery(candidates.filter(inner_id__gte=random.randint(1, max_inner_id))[:1]), first)
+                for _probe in range(size)
+            ]
+            found = list(cls.objects.filter(id__in=probes).values_list('id', flat=True))
+            random.shuffle(found)
+            ids += [task_id for task_id in found if task_id not in ids][: size - len(ids)]
+            if not ids or len(ids) >= size:
+                break
+        else:
+            ids += list(tasks.exclude(id__in=ids).order_by('inner_id').values_list('id', flat=True)[: size - len(ids)])
+
+        random.shuffle(ids)
+        return ids
 
     @classmethod
     def get_locked_by(cls, user, project=None, tasks=None):
@@ -237,21 +287,16 @@ class Task(TaskMixin, models.Model):
         else:
             return []
 
-    def has_lock(self, user=None):
-        """
-        Check whether current task has been locked by some user
-
-        Also has workaround for fixing not consistent is_labeled flag state
-        """
-        from projects.functions.next_task import get_next_task_logging_level
-
-        SkipQueue = self.project.SkipQueue
+    @staticmethod
+    def get_not_taking_annotations_q(project, user):
+        """Annotations which are not counted as task takes for the user in has_lock()"""
+        SkipQueue = project.SkipQueue
 
-        if self.project.skip_queue == SkipQueue.REQUEUE_FOR_ME:
+        if project.skip_queue == SkipQueue.REQUEUE_FOR_ME:
             # REQUEUE_FOR_ME means: only my skipped tasks go back to me,
             # alien's skipped annotations are counted as regular annotations
             q = Q(was_cancelled=True) & Q(completed_by=user)
-        elif self.project.skip_queue == SkipQueue.REQUEUE_FOR_OTHERS:
+        elif project.skip_queue == SkipQueue.REQUEUE_FOR_OTHERS:
             # REQUEUE_FOR_OTHERS: my skipped tasks go to others
             # alien's skipped annotations are not counted at all
             q = Q(was_cancelled=True) & ~Q(completed_by=user)
@@ -259,9 +304,36 @@ class Task(TaskMixin, models.Model):
             # IGNORE_SKIPPED: my skipped tasks don't go anywhere
             # alien's and my skipped annotations are counted as regular annotations
             q = Q()
+        return q | Q(ground_truth=True)
+
+    @classmethod
+    def annotate_takes(cls, queryset, project, user):
+        """Annotate tasks with takes_num_locks and takes_num_annotations counted like in has_lock(),
+        so has_lock() can be checked for many tasks with one query
+        """
+        locks = TaskLock.objects.filter(task=OuterRef('pk'), expire_at__gt=now()).exclude(user=user).values('id')
+        annotations = (
+            Annotation.objects.filter(task=OuterRef('pk'))
+            .exclude(cls.get_not_taking_annotations_q(project, user))
+            .values('id')
+        )
+        return queryset.annotate(takes_num_locks=SQCount(locks), takes_num_annotations=SQCount(annotations))
+
+    def has_lock(self, user=None, num_locks=None, num_annotations=None):
+        """
+        Check whether current task has been locked by some user
+
+        Also has workaround for fixing not consistent is_labeled flag state
+
+        :param num_locks: precalculated number of locks by other users, see annotate_takes()
+        :param num_annotations: precalculated number of annotations taking the task, see annotate_takes()
+        """
+        from projects.functions.next_task import get_next_task_logging_level
 
-        num_locks = self.num_locks_user(user=user)
-        num_annotations = self.annotations.exclude(q | Q(ground_truth=True)).count()
+        if num_locks is None:
+            num_locks = self.num_locks_user(user=user)
+        if num_annotations is None:
+            num_annotations = self.annotations.exclude(self.get_not_taking_annotations_q(self.project, user)).count()
         num = num_locks + num_annotations
 
         if num > self.overlap_with_agreement_threshold(num, num_locks):
@@ -330,7 +402,11 @@ class Task(TaskMixin, models.Model):
         return mixin_has_permission and self.project.has_permission(user)
 
     def clear_expired_locks(self):
-        self.locks.filter(expire_at__lt=now()).delete()
+        if settings.TASK_LOCK_SWEEP_INTERVAL and redis_connected():
+            # expired locks of all tasks are deleted by the periodic sweeper job
+            schedule_expired_task_locks_sweep()
+        else:
+            self.locks.filter(expire_at__lt=now()).delete()
 
     def set_lock(self, user):
         """Lock current task by specified user. Lock lifetime is set by `expire_in_secs`"""
@@ -339,14 +415,7 @@ class Task(TaskMixin, models.Model):
         num_locks = self.num_locks
         if num_locks < self.overlap:
             lock_ttl = settings.TASK_LOCK_TTL
-            expire_at = now() + datetime.timedelta(seconds=lock_ttl)
-            try:
-                task_lock = TaskLock.objects.get(task=self, user=user)
-            except TaskLock.DoesNotExist:
-                TaskLock.objects.create(task=self, user=user, expire_at=expire_at)
-            else:
-                task_lock.expire_at = expire_at
-                task_lock.save()
+            TaskLock.acquire([self], user, ttl=lock_ttl)
             logger.log(
                 get_next_task_logging_level(user),
                 f'User={user} acquires a lock for the task={self} ttl: {lock_ttl}',
@@ -363,10 +432,7 @@ class Task(TaskMixin, models.Model):
         If user specified, it checks whether lock is released by the user who previously has locked that task
         """
 
-        if user is not None:
-            self.locks.filter(user=user).delete()
-        else:
-            self.locks.all().delete()
+        TaskLock.release([self], user=user)
         self.clear_expired_locks()
 
     def get_storage_link(self):
@@ -386,24 +452,21 @@ class Task(TaskMixin, models.Model):
         return filename
 
     def resolve_storage_uri(self, url) -> Optional[Mapping[str, Any]]:
-        from io_storages.functions import get_storage_by_url
-
         storage = self.storage
-        project = self.project
-
         if not storage:
-            storage_objects = project.get_all_storage_objects(type_='import')
-            storage = get_storage_by_url(url, storage_objects)
+            storage = self.project.get_storage_resolver().get(url)
 
         if storage:
             return {
-                'url': storage.generate_http_url(url),
+                'url': storage.generate_http_url_cached(url),
                 'presign_ttl': storage.presign_ttl,
             }
 
-    def resolve_uri(self, task_data, project):
-        from io_storages.functions import get_storage_by_url
+    def resolve_uri(self, task_data, project, storage_resolver=None):
+        """Resolve storage urls in task data
 
+        :param storage_resolver: StorageResolver shared between tasks, project one is used if it's not set
+        """
         if project.task_data_login and project.task_data_password:
             protected_data = {}
             for key, value in task_data.items():
@@ -417,7 +480,9 @@ class Task(TaskMixin, models.Model):
                 protected_data[key] = value
             return protected_data
         else:
-            storage_objects = project.get_all_storage_objects(type_='import')
+            if storage_resolver is None:
+                storage_resolver = project.get_storage_resolver()
+            task_storage = self.storage
 
             # try resolve URLs via storage associated with that task
             for field in task_data:
@@ -441,11 +506,11 @@ class Task(TaskMixin, models.Model):
                     continue
 
                 # project storage
-                # TODO: to resolve nested lists and dicts we should improve get_storage_by_url(),
-                # TODO: problem with current approach: it can be used only the first storage that get_storage_by_url
+                # TODO: to resolve nested lists and dicts we should improve StorageResolver.get(),
+                # TODO: problem with current approach: it can be used only the first storage that the resolver
                 # TODO: returns. However, maybe the second storage will resolve uris properly.
                 # TODO: resolve_uri() already supports them
-                storage = self.storage or get_storage_by_url(task_data[field], storage_objects)
+                storage = task_storage or storage_resolver.get(task_data[field])
                 if storage:
                     try:
                         proxy_task = None
@@ -682,6 +747,32 @@ class Annotation(AnnotationMixin, models.Model):
             models.Index(fields=['was_cancelled']),
         ]
 
+    # fields the project summary and task counters depend on, they are diffed with loaded values on save
+    TRACKED_FIELDS = ('result', 'was_cancelled')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Annotation, cls).from_db(db, field_names, values)
+        instance.remember_loaded_values()
+        return instance
+
+    def remember_loaded_values(self):
+        # deferred fields are not loaded here, they are fetched before saving if needed
+        self._loaded_values = self.dump_loaded_values(
+            {field: self.__dict__[field] for field in self.TRACKED_FIELDS if field in self.__dict__}
+        )
+
+    @staticmethod
+    def dump_loaded_values(values):
+        """Result is kept as a json string: it's much cheaper than a copy on every load from db,
+        and it is diffed correctly after in-place changes"""
+        if 'result' in values:
+            values['result'] = json.dumps(values['result'])
+        return values
+
+    def has_loaded_values(self):
+        return all(field in getattr(self, '_loaded_values', {}) for field in self.TRACKED_FIELDS)
+
     def created_ago(self):
         """Humanize date"""
         return timesince(self.created_at)
@@ -729,6 +820,7 @@ class Annotation(AnnotationMixin, models.Model):
         if request:
             self.updated_by = request.user
         result = super().save(*args, **kwargs)
+        self.remember_loaded_values()
         self.update_task()
         return result
 
@@ -741,18 +833,19 @@ class Annotation(AnnotationMixin, models.Model):
     def on_delete_update_counters(self):
         task = self.task
         logger.debug(f'Start updating counters for task {task.id}.')
-        if self.was_cancelled:
-            cancelled = task.annotations.all().filter(was_cancelled=True).count()
-            Task.objects.filter(id=task.id).update(cancelled_annotations=cancelled)
-            logger.debug(f'On delete updated cancelled_annotations for task {task.id}')
-        else:
-            total = task.annotations.all().filter(was_cancelled=False).count()
-            Task.objects.filter(id=task.id).update(total_annotations=total)
-            logger.debug(f'On delete updated total_annotations for task {task.id}')
+        if not defer_tasks_counters_update([task.id]):
+            if self.was_cancelled:
+                cancelled = task.annotations.all().filter(was_cancelled=True).count()
+                Task.objects.filter(id=task.id).update(cancelled_annotations=cancelled)
+                logger.debug(f'On delete updated cancelled_annotations for task {task.id}')
+            else:
+                total = task.annotations.all().filter(was_cancelled=False).count()
+                Task.objects.filter(id=task.id).update(total_annotations=total)
+                logger.debug(f'On delete updated total_annotations for task {task.id}')
 
-        logger.debug(f'Update task stats for task={task}')
-        task.update_is_labeled()
-        Task.objects.filter(id=task.id).update(is_labeled=task.is_labeled)
+            logger.debug(f'Update task stats for task={task}')
+            task.update_is_labeled()
+            Task.objects.filter(id=task.id).update(is_labeled=task.is_labeled)
 
         # remove annotation counters in project summary followed by deleting an annotation
         logger.debug('Remove annotation counters in project summary followed by deleting an annotation')
@@ -775,6 +868,61 @@ class TaskLock(models.Model):
         help_text='User who locked this task',
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['task', 'expire_at']),
+            models.Index(fields=['expire_at']),
+        ]
+
+    @classmethod
+    def acquire(cls, tasks, user, ttl=None):
+        """Lock tasks by the user or prolong existing locks of the user
+
+        :param tasks: Task list, queryset or task ids
+        :param ttl: lock lifetime in seconds, settings.TASK_LOCK_TTL by default
+        """
+        expire_at = now() + datetime.timedelta(seconds=ttl or settings.TASK_LOCK_TTL)
+        task_ids = [task.id if isinstance(task, Task) else task for task in tasks]
+        locks = cls.objects.filter(task_id__in=task_ids, user=user)
+        prolonged = set(locks.values_list('task_id', flat=True))
+        if prolonged:
+            locks.update(expire_at=expire_at)
+        cls.objects.bulk_create(
+            [cls(task_id=task_id, user=user, expire_at=expire_at) for task_id in task_ids if task_id not in prolonged],
+            batch_size=settings.BATCH_SIZE,
+        )
+
+    @classmethod
+    def release(cls, tasks, user=None):
+        """Release locks of tasks (Task list, queryset or task ids), only locks of the user if it's specified"""
+        locks = cls.objects.filter(task__in=tasks)
+        if user is not None:
+            locks = locks.filter(user=user)
+        locks.delete()
+
+
+TASK_LOCKS_SWEEP_KEY = 'task-locks-sweep-scheduled'
+
+
+def delete_expired_task_locks():
+    """Delete expired locks of all tasks in batches, it's a job scheduled by schedule_expired_task_locks_sweep()"""
+    deleted = 0
+    while True:
+        ids = list(TaskLock.objects.filter(expire_at__lt=now()).values_list('id', flat=True)[: settings.BATCH_SIZE])
+        if not ids:
+            break
+        deleted += TaskLock.objects.filter(id__in=ids).delete()[0]
+    logger.info(f'Expired task locks sweeper: {deleted} locks deleted')
+    return deleted
+
+
+def schedule_expired_task_locks_sweep():
+    """Enqueue expired task locks deletion, at most once per TASK_LOCK_SWEEP_INTERVAL seconds"""
+    interval = settings.TASK_LOCK_SWEEP_INTERVAL
+    # the marker is set atomically, so concurrent callers don't enqueue duplicate jobs
+    if redis_set_if_absent(TASK_LOCKS_SWEEP_KEY, 1, ttl=interval):
+        start_job_async_or_sync(delete_expired_task_locks, in_seconds=interval, queue_name='low')
+
 
 class AnnotationDraft(models.Model):
     result = JSONField(_('result'), help_text='Draft result in JSON format')
@@ -844,6 +992,8 @@ class AnnotationDraft(models.Model):
             if hasattr(project, 'summary'):
                 project.summary.remove_created_drafts_and_labels([self])
             super().delete(*args, **kwargs)
+            # set updated_at field of task to now(), so incremental exports take the task without the draft
+            Task.objects.filter(id=self.task_id).update(updated_at=now())
 
 
 class Prediction(models.Model):
@@ -1018,7 +1168,7 @@ def remove_data_columns(sender, instance, **kwargs):
 
 
 def _task_data_is_not_updated(update_fields):
-    if update_fields and list(update_fields) == ['is_labeled']:
+    if update_fields and 'data' not in update_fields:
         return True
 
 
@@ -1047,51 +1197,103 @@ def update_project_summary_data_columns(sender, instance, created, update_fields
 
 @receiver(pre_save, sender=Annotation)
 def delete_project_summary_annotations_before_updating_annotation(sender, instance, **kwargs):
-    """Before updating annotation fields - ensure previous info removed from project.summary"""
-    try:
-        old_annotation = sender.objects.get(id=instance.id)
-    except Annotation.DoesNotExist:
-        # annotation just created - do nothing
+    """Before updating annotation fields - ensure previous values are known to diff them after saving"""
+    if instance.id is None or instance.has_loaded_values():
+        # annotation just created or loaded from db - nothing to fetch
         return
-    old_annotation.decrease_project_summary_counters()
-
-    # update task counters if annotation changes it's was_cancelled status
-    task = instance.task
-    if old_annotation.was_cancelled != instance.was_cancelled:
-        if instance.was_cancelled:
-            task.cancelled_annotations = task.cancelled_annotations + 1
-            task.total_annotations = task.total_annotations - 1
-        else:
-            task.cancelled_annotations = task.cancelled_annotations - 1
-            task.total_annotations = task.total_annotations + 1
-        task.update_is_labeled()
-
-        Task.objects.filter(id=instance.task.id).update(
-            is_labeled=task.is_labeled,
-            total_annotations=task.total_annotations,
-            cancelled_annotations=task.cancelled_annotations,
-        )
+    loaded = sender.objects.filter(id=instance.id).values(*sender.TRACKED_FIELDS).first() or {}
+    instance._loaded_values = sender.dump_loaded_values(loaded)
 
 
 @receiver(post_save, sender=Annotation)
 def update_project_summary_annotations_and_is_labeled(sender, instance, created, **kwargs):
-    """Update annotation counters in project summary"""
-    instance.increase_project_summary_counters()
-
-    # If annotation is changed, update task.is_labeled state
+    """Update annotation counters in project summary and task stats by the diff with loaded values"""
+    loaded = {} if created else instance._loaded_values
+    if created or 'result' not in loaded:
+        instance.increase_project_summary_counters()
+    elif loaded['result'] != json.dumps(instance.result):
+        # the loaded result is the one counted in the summary
+        logger.debug(f'Decrease project.summary counters from previous result of {instance}')
+        instance.project.summary.remove_created_annotations_and_labels([{'result': json.loads(loaded['result'])}])
+        instance.increase_project_summary_counters()
+
+    # task.is_labeled depends on cancelled and empty annotations only
+    if (
+        not created
+        and loaded.get('was_cancelled', not instance.was_cancelled) == instance.was_cancelled
+        and (loaded.get('result', 'null') == 'null') == (instance.result is None)
+    ):
+        return
     logger.debug(f'Update task stats for task={instance.task}')
-    if instance.was_cancelled:
-        instance.task.cancelled_annotations = instance.task.annotations.all().filter(was_cancelled=True).count()
-    else:
-        instance.task.total_annotations = instance.task.annotations.all().filter(was_cancelled=False).count()
-    instance.task.update_is_labeled()
-    instance.task.save(update_fields=['is_labeled', 'total_annotations', 'cancelled_annotations'])
+    task = instance.task
+    counters = task.annotations.aggregate(
+        total=Count('id', filter=Q(was_cancelled=False)), cancelled=Count('id', filter=Q(was_cancelled=True))
+    )
+    task.total_annotations = counters['total']
+    task.cancelled_annotations = counters['cancelled']
+    task.update_is_labeled()
+    task.save(update_fields=['is_labeled', 'total_annotations', 'cancelled_annotations'])
     logger.debug(f'Updated total_annotations and cancelled_annotations for {instance.task.id}.')
 
 
+_deferred_counters = threading.local()
+
+
+@contextmanager
+def deferred_tasks_counters():
+    """Coalesce task counters updates of annotation deletes and prediction writes made in the block:
+    counters and is_labeled of every affected task are recalculated once, when the block is left, also by an error"""
+    if getattr(_deferred_counters, 'task_ids', None) is not None:
+        # nested block, the outermost one updates counters
+        yield
+        return
+
+    _deferred_counters.task_ids = task_ids = set()
+    try:
+        yield
+    except Exception:
+        _deferred_counters.task_ids = None
+        # rows written before the error can be committed already, so their counters are updated anyway,
+        # a failed update must not hide the original error
+        try:
+            update_deferred_tasks_counters(task_ids)
+        except Exception:
+            logger.exception(f'Deferred counters update failed for {len(task_ids)} tasks')
+        raise
+    _deferred_counters.task_ids = None
+    update_deferred_tasks_counters(task_ids)
+
+
+def defer_tasks_counters_update(task_ids):
+    """Postpone task counters update till the end of deferred_tasks_counters() block
+
+    :return: False if there is no deferred_tasks_counters() block and counters should be updated in place
+    """
+    deferred_task_ids = getattr(_deferred_counters, 'task_ids', None)
+    if deferred_task_ids is None:
+        return False
+    deferred_task_ids.update(task_ids)
+    return True
+
+
+def update_deferred_tasks_counters(task_ids):
+    from projects.models import Project
+
+    project_task_ids = defaultdict(list)
+    for ids in iter_batches(sorted(task_ids), settings.BATCH_SIZE):
+        for project_id, task_id in Task.objects.filter(id__in=ids).values_list('project_id', 'id'):
+            project_task_ids[project_id].append(task_id)
+
+    for project in Project.objects.filter(id__in=project_task_ids):
+        project._update_tasks_counters_and_is_labeled(project_task_ids[project.id])
+    logger.debug(f'Deferred counters updated for {len(task_ids)} tasks')
+
+
 @receiver(pre_delete, sender=Prediction)
 def remove_predictions_from_project(sender, instance, **kwargs):
     """Remove predictions counters"""
+    if defer_tasks_counters_update([instance.task_id]):
+        return
     instance.task.total_predictions = instance.task.predictions.all().count() - 1
     instance.task.save(update_fields=['total_predictions'])
     logger.debug(f'Updated total_predictions for {instance.task.id}.')
@@ -1100,6 +1302,8 @@ def remove_predictions_from_project(sender, instance, **kwargs):
 @receiver(post_save, sender=Prediction)
 def save_predictions_to_project(sender, instance, **kwargs):
     """Add predictions counters"""
+    if defer_tasks_counters_update([instance.task_id]):
+        return
     instance.task.total_predictions = instance.task.predictions.all().count()
     instance.task.save(update_fields=['total_predictions'])
     logger.debug(f'Updated total_predictions for {instance.task.id}.')
@@ -1108,6 +1312,17 @@ def save_predictions_to_project(sender, instance, **kwargs):
 # =========== END OF PROJECT SUMMARY UPDATES ===========
 
 
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+@receiver(post_save, sender=Annotation)
+@receiver(post_delete, sender=Annotation)
+@receiver(post_save, sender=Prediction)
+@receiver(post_delete, sender=Prediction)
+def invalidate_data_manager_totals(sender, instance, **kwargs):
+    """Cached data manager totals are invalid after any task, annotation or prediction change"""
+    bump_project_data_version(instance.project_id)
+
+
 @receiver(post_save, sender=Annotation)
 def delete_draft(sender, instance, **kwargs):
     task = instance.task
@@ -1157,13 +1372,14 @@ def update_task_stats(task, stats=('is_labeled',), save=True):
         task.save()
 
 
-def bulk_update_stats_project_tasks(tasks, project=None):
+def bulk_update_stats_project_tasks(tasks, project=None, retry=True):
     """bulk Task update accuracy
        ex: after change settings
        apply several update queries size of batch
        on updated Task objects
        in single transaction as execute sql
     :param tasks:
+    :param retry: enqueue one more attempt on OperationalError instead of raising it
     :return:
     """
     # recalc accuracy
@@ -1194,6 +1410,8 @@ def bulk_update_stats_project_tasks(tasks, project=None):
                 # start update query batches
                 bulk_update(tasks, update_fields=['is_labeled'], batch_size=settings.BATCH_SIZE)
             except OperationalError:
+                if not retry:
+                    raise
                 logger.error('Operational error while updating tasks: {exc}', exc_info=True)
                 # try to update query batches one more time
                 start_job_async_or_sync(
@@ -1203,6 +1421,7 @@ def bulk_update_stats_project_tasks(tasks, project=None):
                     update_fields=['is_labeled'],
                     batch_size=settings.BATCH_SIZE,
                 )
+    bump_project_data_version(project.id)
 
 
 Q_finished_annotations = Q(was_cancelled=False) & Q(result__isnull=False)
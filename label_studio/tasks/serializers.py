@@ -16,7 +16,7 @@ from rest_framework.fields import SkipField
 from rest_framework.serializers import ModelSerializer
 from rest_framework.settings import api_settings
 from tasks.exceptions import AnnotationDuplicateError
-from tasks.models import Annotation, AnnotationDraft, Prediction, Task
+from tasks.models import Annotation, AnnotationDraft, Prediction, Task, deferred_tasks_counters
 from tasks.validation import TaskValidator
 from users.models import User
 from users.serializers import UserSerializer
@@ -29,6 +29,13 @@ class PredictionQuerySerializer(serializers.Serializer):
     project = serializers.IntegerField(required=False, help_text='Project ID to filter predictions')
 
 
+class ListPredictionSerializer(serializers.ListSerializer):
+    def create(self, validated_data):
+        # counters of the tasks are updated once for the whole list
+        with deferred_tasks_counters():
+            return super().create(validated_data)
+
+
 class PredictionSerializer(ModelSerializer):
     model_version = serializers.CharField(allow_blank=True, required=False)
     created_ago = serializers.CharField(default='', read_only=True, help_text='Delta time from creation time')
@@ -36,6 +43,7 @@ class PredictionSerializer(ModelSerializer):
     class Meta:
         model = Prediction
         fields = '__all__'
+        list_serializer_class = ListPredictionSerializer
 
 
 class ListAnnotationSerializer(serializers.ListSerializer):
@@ -137,6 +145,15 @@ class BaseTaskSerializer(FlexFieldsModelSerializer):
             project = None
         return project
 
+    def get_storage_resolver(self, project):
+        """Storage resolver is shared via context between all tasks of the serializer,
+        tasks can have separately loaded project instances, so resolvers are kept by project id
+        """
+        resolvers = self.context.setdefault('storage_resolvers', {})
+        if project.id not in resolvers:
+            resolvers[project.id] = project.get_storage_resolver()
+        return resolvers[project.id]
+
     def validate(self, task):
         instance = self.instance if hasattr(self, 'instance') else None
         validator = TaskValidator(self.project(), instance)
@@ -147,7 +164,9 @@ class BaseTaskSerializer(FlexFieldsModelSerializer):
         if project:
             # resolve uri for storage (s3/gcs/etc)
             if self.context.get('resolve_uri', False):
-                instance.data = instance.resolve_uri(instance.data, project)
+                instance.data = instance.resolve_uri(
+                    instance.data, project, storage_resolver=self.get_storage_resolver(project)
+                )
 
             # resolve $undefined$ key in task data
             data = instance.data
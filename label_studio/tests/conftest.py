@@ -19,6 +19,7 @@ import ujson as json
 from botocore.exceptions import ClientError
 from django.conf import settings
 from freezegun import freeze_time
+from io_storages.utils import presigned_url_cache
 from moto import mock_s3
 from organizations.models import Organization
 from projects.models import Project
@@ -65,6 +66,12 @@ def disable_sentry():
     settings.SENTRY_DSN = None
 
 
+@pytest.fixture(autouse=True)
+def clear_presigned_url_cache():
+    # storage ids are reused between tests, so cached urls must not leak
+    presigned_url_cache.clear()
+
+
 @pytest.fixture()
 def debug_modal_exceptions_false(settings):
     settings.DEBUG_MODAL_EXCEPTIONS = False
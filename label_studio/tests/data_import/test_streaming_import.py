@@ -0,0 +1,88 @@
+import json
+
+import pytest
+from data_import.functions import async_import_background
+from data_import.models import FileUpload
+from django.core.files.uploadedfile import SimpleUploadedFile
+from projects.models import ProjectImport
+from tasks.models import Prediction, Task
+
+pytestmark = pytest.mark.django_db
+
+TASKS = [{'meta_info': f'meta {i}', 'text': f'text {i}'} for i in range(5)]
+
+
+def _run_streaming_import(project, filename, body, settings, **import_kwargs):
+    settings.IMPORT_STREAMING = True
+    settings.IMPORT_BATCH_SIZE = 2
+    file_upload = FileUpload.objects.create(
+        user=project.created_by, project=project, file=SimpleUploadedFile(filename, body.encode())
+    )
+    project_import = ProjectImport.objects.create(
+        project=project, file_upload_ids=[file_upload.id], commit_to_project=True, **import_kwargs
+    )
+    async_import_background(project_import.id, project.created_by.id)
+    project_import.refresh_from_db()
+    return project_import
+
+
+@pytest.mark.parametrize(
+    'filename, body',
+    [
+        ('tasks.json', json.dumps(TASKS)),
+        ('tasks.json', json.dumps([{'data': task} for task in TASKS])),
+        ('tasks.jsonl', '\n'.join(json.dumps(task) for task in TASKS) + '\n'),
+        ('tasks.csv', 'meta_info,text\n' + '\n'.join(f'{t["meta_info"]},{t["text"]}' for t in TASKS)),
+        ('tasks.tsv', 'meta_info\ttext\n' + '\n'.join(f'{t["meta_info"]}\t{t["text"]}' for t in TASKS)),
+    ],
+)
+def test_streaming_import_formats(configured_project, settings, filename, body):
+    tasks_before = Task.objects.filter(project=configured_project).count()
+
+    project_import = _run_streaming_import(configured_project, filename, body, settings, return_task_ids=True)
+
+    assert project_import.status == ProjectImport.Status.COMPLETED
+    assert project_import.task_count == len(TASKS)
+    assert len(project_import.task_ids) == len(TASKS)
+    assert sorted(project_import.data_columns) == ['meta_info', 'text']
+    assert project_import.found_formats == {'.' + filename.split('.')[-1]: 1}
+
+    assert Task.objects.filter(project=configured_project).count() == tasks_before + len(TASKS)
+    tasks = Task.objects.filter(id__in=project_import.task_ids).order_by('inner_id')
+    assert [task.data['text'] for task in tasks] == [task['text'] for task in TASKS]
+    assert len({task.inner_id for task in tasks}) == len(TASKS)
+
+
+def test_streaming_import_single_task_json(configured_project, settings):
+    project_import = _run_streaming_import(configured_project, 'task.json', json.dumps(TASKS[0]), settings)
+
+    assert project_import.task_count == 1
+
+
+def test_streaming_import_with_predictions(configured_project, settings):
+    tasks = [{'data': task, 'predictions': [{'result': [], 'score': 0.5}]} for task in TASKS]
+
+    project_import = _run_streaming_import(configured_project, 'tasks.json', json.dumps(tasks), settings)
+
+    assert project_import.prediction_count == len(TASKS)
+    assert Prediction.objects.filter(project=configured_project).count() == len(TASKS)
+    assert all(
+        task.total_predictions == 1 for task in Task.objects.filter(id__in=Prediction.objects.values('task_id'))
+    )
+
+
+def test_streaming_readers_close_files(configured_project):
+    file_upload = FileUpload.objects.create(
+        user=configured_project.created_by,
+        project=configured_project,
+        file=SimpleUploadedFile('tasks.json', json.dumps(TASKS).encode()),
+    )
+    tasks = file_upload.iter_tasks_list_from_json()
+    next(tasks)
+    assert not file_upload.file.closed
+    # the file is closed when the reader is stopped before the end
+    tasks.close()
+    assert file_upload.file.closed
+
+    assert len(list(file_upload.iter_tasks_list_from_json())) == len(TASKS)
+    assert file_upload.file.closed
@@ -2,8 +2,10 @@
 """
 import json
 
+import mock
 import pytest
 from projects.models import Project
+from tasks.models import Task
 
 from ..utils import make_annotation, make_prediction, make_task, project_id  # noqa
 
@@ -128,3 +130,91 @@ def test_views_total_counters(tasks_count, annotations_count, predictions_count,
     assert response_data['total'] == tasks_count, response_data
     assert response_data['total_annotations'] == tasks_count * annotations_count, response_data
     assert response_data['total_predictions'] == tasks_count * predictions_count, response_data
+
+
+@pytest.mark.parametrize(
+    'ordering, ordering_key',
+    [
+        [[], 'id'],
+        [['tasks:-id'], 'id'],
+        [['tasks:data.text'], 'text'],
+        [['tasks:-data.text'], 'text'],
+        [['tasks:total_annotations'], 'total_annotations'],
+        [['tasks:-completed_at'], 'completed_at'],
+    ],
+)
+@pytest.mark.django_db
+def test_views_tasks_api_cursor_pagination(business_client, project_id, ordering, ordering_key):
+    payload = dict(project=project_id, data={'test': 1, 'ordering': ordering})
+    response = business_client.post('/api/dm/views/', data=json.dumps(payload), content_type='application/json')
+    assert response.status_code == 201, response.content
+    view_id = response.json()['id']
+
+    project = Project.objects.get(pk=project_id)
+    # equal and missing ordering values check the id tie-breaker and nulls
+    for text in ['b', 'a', None, 'b', 'c', 'a', None, 'b']:
+        task = make_task({'data': {'text': text} if text else {'other': 1}}, project)
+        if text == 'b':
+            make_annotation({'result': []}, task.id)
+
+    response = business_client.get(f'/api/tasks?view={view_id}&page_size=100')
+    expected_tasks = response.json()['tasks']
+
+    def key(task):
+        return task['data'].get('text') if ordering_key == 'text' else task[ordering_key]
+
+    tasks, cursor, pages = [], '', 0
+    while cursor is not None:
+        response = business_client.get(f'/api/tasks?view={view_id}&page_size=3&cursor={cursor}')
+        assert response.status_code == 200, response.content
+        response_data = response.json()
+        assert 'total' not in response_data
+        tasks += response_data['tasks']
+        cursor = response_data['next_cursor']
+        pages += 1
+
+    assert pages == 3
+    # the same ordering as page pagination has, tasks with equal values go by id
+    assert sorted(task['id'] for task in tasks) == sorted(task['id'] for task in expected_tasks)
+    assert [key(task) for task in tasks] == [key(task) for task in expected_tasks]
+
+    response = business_client.get(f'/api/tasks?view={view_id}&page_size=3&cursor=&include_total=1')
+    response_data = response.json()
+    assert response_data['total'] == len(expected_tasks)
+    assert response_data['total_annotations'] == 3
+    assert len(response_data['tasks']) == 3
+
+    response = business_client.get(f'/api/tasks?view={view_id}&cursor=broken')
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_views_tasks_api_totals_cache(business_client, project_id, settings):
+    settings.DATA_MANAGER_TOTALS_CACHE_TTL = 60
+    payload = dict(project=project_id, data={'test': 1})
+    response = business_client.post('/api/dm/views/', data=json.dumps(payload), content_type='application/json')
+    view_id = response.json()['id']
+    project = Project.objects.get(pk=project_id)
+    make_task({'data': {'text': 'a'}}, project)
+
+    redis = {}
+    with mock.patch.multiple(
+        'data_manager.totals',
+        redis_connected=lambda: True,
+        redis_get=redis.get,
+        redis_set=lambda key, value, ttl=None: redis.__setitem__(key, value),
+    ):
+        assert business_client.get(f'/api/tasks?view={view_id}').json()['total'] == 1
+
+        # bulk_create doesn't send signals, so cached totals are returned
+        Task.objects.bulk_create([Task(data={'text': 'b'}, project=project)])
+        assert business_client.get(f'/api/tasks?view={view_id}').json()['total'] == 1
+        assert business_client.get(f'/api/tasks?view={view_id}&cursor=&include_total=1').json()['total'] == 1
+
+        # task and annotation changes invalidate the cache
+        task = make_task({'data': {'text': 'c'}}, project)
+        assert business_client.get(f'/api/tasks?view={view_id}').json()['total'] == 3
+        make_annotation({'result': []}, task.id)
+        response_data = business_client.get(f'/api/tasks?view={view_id}').json()
+        assert response_data['total'] == 3
+        assert response_data['total_annotations'] == 1
@@ -386,3 +386,91 @@ def test_views_filters(filters, ids, business_client, project_id):
     response_ids = [task['id'] for task in response_data['tasks']]
     correct_ids = [task_ids[i] for i in ids]
     assert response_ids == correct_ids, (response_ids, correct_ids, filters)
+
+
+@pytest.mark.parametrize(
+    'items, ordering',
+    [
+        [[{'filter': 'filter:tasks:data.num', 'operator': 'greater', 'value': 5, 'type': 'Number'}], []],
+        [
+            [{'filter': 'filter:tasks:data.num', 'operator': 'in', 'value': {'min': 1, 'max': 10}, 'type': 'Number'}],
+            [],
+        ],
+        [[{'filter': 'filter:tasks:data.num', 'operator': 'not_equal', 'value': 10, 'type': 'Number'}], []],
+        [[{'filter': 'filter:tasks:data.text', 'operator': 'contains', 'value': 'ab', 'type': 'String'}], []],
+        [[{'filter': 'filter:tasks:data.text', 'operator': 'equal', 'value': 'abc', 'type': 'String'}], []],
+        [[{'filter': 'filter:tasks:data.text', 'operator': 'empty', 'value': True, 'type': 'String'}], []],
+        [[], ['tasks:data.num']],
+        [[], ['-tasks:data.num']],
+        [[], ['tasks:data.text']],
+    ],
+)
+@pytest.mark.django_db
+def test_views_indexed_data_columns(items, ordering, business_client, project_id):
+    from data_manager.indexed_columns import add_indexed_data_columns
+    from data_manager.models import TaskDataValue
+
+    project = Project.objects.get(pk=project_id)
+    for data in [{'num': 10, 'text': 'abc'}, {'num': 2, 'text': 'xab'}, {'num': 7.5}, {'text': 'zzz'}, {'num': 1}]:
+        make_task({'data': data}, project)
+
+    filters = {'conjunction': 'and', 'items': items}
+    payload = dict(
+        project=project_id,
+        data={'filters': filters, 'ordering': ordering, 'columnsDisplayType': {'tasks:data.num': 'Number'}},
+    )
+    response = business_client.post('/api/dm/views/', data=json.dumps(payload), content_type='application/json')
+    view_id = response.json()['id']
+
+    def get_ids():
+        response = business_client.get(f'/api/tasks?view={view_id}')
+        return [task['id'] for task in response.json()['tasks']]
+
+    expected = get_ids()
+    add_indexed_data_columns(project, ['num', 'text'])
+    assert TaskDataValue.objects.filter(task__project=project).count() == 7
+    assert get_ids() == expected
+
+    # new and updated tasks are indexed too
+    task = make_task({'data': {'num': 3, 'text': 'ab'}}, project)
+    assert TaskDataValue.objects.get(task=task, column__key='num').number == 3
+    task.data = {'text': 'abab'}
+    task.save()
+    assert list(TaskDataValue.objects.filter(task=task).values_list('text', flat=True)) == ['abab']
+
+
+@pytest.mark.django_db
+def test_apply_filters_without_type_probe_queries(project_id):
+    from data_manager.managers import apply_filters
+    from data_manager.prepare_params import Filters
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from tasks.models import Task
+
+    project = Project.objects.get(pk=project_id)
+    task = make_task({'data': {'text': 'abc', 'num': 3}}, project)
+    make_task({'data': {'text': '', 'num': 1}}, project)
+    assert project.summary.data_columns_types == {'text': 'str', 'num': 'int'}
+
+    items = [
+        {'filter': 'filter:tasks:data.text', 'operator': 'empty', 'value': False, 'type': 'String'},
+        {'filter': 'filter:tasks:data.text', 'operator': 'contains', 'value': 'b', 'type': 'String'},
+        {'filter': 'filter:tasks:data.num', 'operator': 'greater', 'value': 2, 'type': 'Number'},
+        {'filter': 'filter:tasks:id', 'operator': 'greater_or_equal', 'value': task.id, 'type': 'Number'},
+        {'filter': 'filter:tasks:total_annotations', 'operator': 'less', 'value': 1, 'type': 'Number'},
+        {'filter': 'filter:tasks:inner_id', 'operator': 'not_equal', 'value': 100, 'type': 'Number'},
+    ]
+    filters = Filters(conjunction='and', items=items)
+
+    # filter compilation reads project level metadata only, tasks are queried once the queryset is evaluated
+    project = Project.objects.get(pk=project_id)
+    with CaptureQueriesContext(connection) as queries:
+        queryset = apply_filters(Task.objects.filter(project=project), filters, project, None)
+    assert not [query['sql'] for query in queries if 'tasks_task' in query['sql']]
+    assert list(queryset) == [task]
+
+    # types unknown for previously imported tasks are sampled once and saved
+    project.summary.data_columns_types = {}
+    project.summary.save()
+    assert project.summary.get_data_column_type('num') == 'int'
+    assert Project.objects.get(pk=project_id).summary.data_columns_types == {'num': 'int'}
@@ -5,7 +5,8 @@ import psutil
 import pytest
 from data_export.serializers import ExportDataSerializer
 from django.conf import settings
-from tasks.functions import export_project
+from tasks.functions import export_project, update_tasks_counters
+from tasks.models import Annotation, Prediction, Task
 
 pytestmark = pytest.mark.django_db
 
@@ -66,3 +67,34 @@ class TestExportProject:
                 export_project(1, 'JSON', settings.EXPORT_DIR)
 
         generate_export_file.assert_not_called()
+
+
+@pytest.mark.parametrize('update_from', [True, False])
+def test_update_tasks_counters(mocker, configured_project, update_from):
+    mocker.patch('tasks.functions.update_from_is_supported', return_value=update_from)
+    project = configured_project
+    user = project.created_by
+    tasks = list(project.tasks.order_by('id'))
+    Annotation.objects.bulk_create(
+        [
+            Annotation(task=tasks[0], project=project, completed_by=user, result=[]),
+            Annotation(task=tasks[0], project=project, completed_by=user, result=[], was_cancelled=True),
+            Annotation(task=tasks[1], project=project, completed_by=user, result=[], was_cancelled=True),
+        ]
+    )
+    Prediction.objects.bulk_create([Prediction(task=tasks[1], project=project, result=[])])
+    Task.objects.filter(project=project).update(
+        total_annotations=0, cancelled_annotations=0, total_predictions=7, is_labeled=False
+    )
+
+    updated = update_tasks_counters(project.tasks.all(), project=project)
+    assert updated == len(tasks)
+    counters = Task.objects.filter(id__in=[task.id for task in tasks]).order_by('id')
+    assert list(counters.values_list('total_annotations', 'cancelled_annotations', 'total_predictions')) == [
+        (1, 1, 0),
+        (0, 1, 1),
+    ] + [(0, 0, 0)] * (len(tasks) - 2)
+    assert list(counters.values_list('is_labeled', flat=True)) == [True] + [False] * (len(tasks) - 1)
+
+    # unchanged tasks aren't updated
+    assert update_tasks_counters(project.tasks.all(), project=project) == 0
@@ -271,3 +271,53 @@ def test_accuracy_on_delete(business_client, project_with_max_annotations_2, ann
 #     if apps.is_installed('businesses'):
 #         assert task.accuracy is None
 #     assert not task.is_labeled
+
+
+@pytest.mark.django_db
+def test_annotation_save_diffs_loaded_values(business_client):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from tests.conftest import project_choices
+    from tests.utils import make_project
+
+    project = make_project(project_choices(), business_client.user, use_ml_backend=False)
+    task = Task.objects.create(project=project, data={'image': 'kittens.jpg'})
+    result = [{'from_name': 'some', 'to_name': 'x', 'type': 'none', 'value': {'none': ['Opossum']}}]
+    Annotation.objects.create(task=task, project=project, result=result, completed_by=business_client.user)
+    annotation = Annotation.objects.get(task=task)
+
+    # nothing tracked is changed: no previous version re-read, no summary or task counters updates
+    annotation.lead_time = 10
+    with CaptureQueriesContext(connection) as queries:
+        annotation.save()
+    sqls = [query['sql'] for query in queries.captured_queries]
+    assert not [sql for sql in sqls if sql.startswith('SELECT') and 'task_completion' in sql]
+    assert not [sql for sql in sqls if 'projectsummary' in sql and not sql.startswith('SELECT')]
+
+    # summary counters are diffed with the loaded result
+    annotation.result = [{'from_name': 'some', 'to_name': 'x', 'type': 'none', 'value': {'none': ['Mouse']}}]
+    annotation.save()
+    project.summary.refresh_from_db()
+    assert project.summary.created_annotations == {'some|x|none': 1}
+    assert project.summary.created_labels == {'some': {'Mouse': 1}}
+
+    # results changed in place are diffed with the copy loaded before
+    annotation.result[0]['value']['none'] = ['Rat']
+    annotation.save()
+    project.summary.refresh_from_db()
+    assert project.summary.created_labels == {'some': {'Rat': 1}}
+
+    # task counters follow was_cancelled changes
+    annotation.was_cancelled = True
+    annotation.save()
+    task.refresh_from_db()
+    assert (task.total_annotations, task.cancelled_annotations) == (0, 1)
+
+    # instances not loaded from db fetch previous values before saving
+    Annotation(id=annotation.id, task=task, project=project, result=None).save(
+        update_fields=['result', 'was_cancelled']
+    )
+    project.summary.refresh_from_db()
+    task.refresh_from_db()
+    assert project.summary.created_labels == {}
+    assert (task.total_annotations, task.cancelled_annotations) == (1, 0)
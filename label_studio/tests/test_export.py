@@ -4,6 +4,7 @@ import json
 
 import pytest
 from django.apps import apps
+from django.utils import timezone
 from tasks.models import Annotation, Prediction, Task
 from tasks.serializers import AnnotationSerializer
 
@@ -318,3 +319,316 @@ def test_export_with_predictions(
             assert task['predictions'][0]['score'] == predictions['score']
         else:
             assert task['predictions'] == []
+
+
+@pytest.mark.django_db
+def test_export_api_streams_json(business_client, configured_project):
+    import hashlib
+    import os
+
+    from data_export.models import DataExport
+    from django.conf import settings
+
+    task = Task.objects.filter(project=configured_project).order_by('id').first()
+    result = [
+        {
+            'id': '123',
+            'type': 'choices',
+            'value': {'choices': ['class_A']},
+            'to_name': 'text',
+            'from_name': 'text_class',
+        }
+    ]
+    Annotation.objects.create(task=task, project=configured_project, result=result, completed_by=business_client.admin)
+
+    r = business_client.get(f'/api/projects/{configured_project.id}/export', data={'exportType': 'JSON'})
+    assert r.status_code == 200
+    assert r.streaming
+    content = b''.join(r.streaming_content)
+    exported = json.loads(content)
+    assert [t['id'] for t in exported] == [task.id]
+    assert exported[0]['annotations'][0]['result'] == result
+
+    # the same file with md5 in its name is stored in the export dir
+    md5 = hashlib.md5(content).hexdigest()
+    with open(os.path.join(settings.EXPORT_DIR, r['filename'][:-5] + f'-{md5[:8]}.json'), 'rb') as f:
+        assert f.read() == content
+
+    # JSON_MIN records are the same as the converter makes from the JSON file
+    r = business_client.get(f'/api/projects/{configured_project.id}/export', data={'exportType': 'JSON_MIN'})
+    assert r.status_code == 200
+    streamed = json.loads(b''.join(r.streaming_content))
+    export_file, _, _ = DataExport.generate_export_file(configured_project, exported, 'JSON_MIN', False, {})
+    assert streamed == json.loads(export_file.read())
+    assert streamed[0]['text_class'] == 'class_A'
+
+
+@pytest.mark.django_db
+def test_export_snapshot_is_hashed_while_written(business_client, configured_project, tmp_path, settings):
+    import hashlib
+    import os
+
+    from data_export.models import Export
+
+    settings.FILE_UPLOAD_TEMP_DIR = str(tmp_path)
+    task = Task.objects.filter(project=configured_project).order_by('id').first()
+    result = [
+        {'id': '1', 'type': 'choices', 'value': {'choices': ['class_B']}, 'to_name': 'text', 'from_name': 'text_class'}
+    ]
+    Annotation.objects.create(task=task, project=configured_project, result=result, completed_by=business_client.admin)
+
+    export = Export.objects.create(project=configured_project, created_by=business_client.admin)
+    export.export_to_file()
+    export.refresh_from_db()
+    assert export.status == Export.Status.COMPLETED
+
+    with export.file.open('rb') as f:
+        content = f.read()
+    assert export.md5 == hashlib.md5(content).hexdigest()
+    assert export.md5[:8] in export.file.name
+    assert len(json.loads(content)) == 2
+    # the temporary file is moved to the storage
+    assert os.listdir(tmp_path) == []
+
+    converted = export.convert_file('CSV')
+    csv_content = converted.read()
+    assert b'class_B' in csv_content
+    assert converted.md5 == hashlib.md5(csv_content).hexdigest()
+
+
+@pytest.mark.django_db
+def test_get_export_data_queries_per_batch(business_client, configured_project, mocker):
+    from data_export.models import Export
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    export = Export.objects.create(project=configured_project, created_by=business_client.admin)
+
+    def count_queries():
+        with CaptureQueriesContext(connection) as ctx:
+            tasks = list(
+                export.get_export_data(
+                    task_filter_options={'only_with_annotations': True},
+                    annotation_filter_options={'usual': True},
+                    serialization_options={'include_annotation_history': True},
+                )
+            )
+        return len(ctx.captured_queries), tasks
+
+    def annotate(task, was_cancelled=False):
+        return Annotation.objects.create(
+            task=task,
+            project=configured_project,
+            result=[],
+            was_cancelled=was_cancelled,
+            completed_by=business_client.admin,
+        )
+
+    tasks = list(Task.objects.filter(project=configured_project).order_by('id'))
+    annotations = [annotate(tasks[0]), annotate(tasks[0], was_cancelled=True)]
+    # skipped annotations are filtered out, so the task isn't exported
+    annotate(tasks[1], was_cancelled=True)
+    history_option = mocker.spy(Export, 'update_export_serializer_option')
+    queries, exported = count_queries()
+    assert [t['id'] for t in exported] == [tasks[0].id]
+    assert [a['id'] for a in exported[0]['annotations']] == [annotations[0].id]
+    # history is requested for all annotations of the exported tasks
+    assert sorted(history_option.call_args[0][2]) == [annotation.id for annotation in annotations]
+
+    for i in range(10):
+        task = Task.objects.create(project=configured_project, data={'meta_info': 'meta', 'text': f'text {i}'})
+        annotate(task)
+        annotate(task)
+    more_queries, exported = count_queries()
+    assert len(exported) == 11
+    assert more_queries == queries
+
+
+@pytest.mark.django_db
+def test_export_snapshot_by_shards(business_client, configured_project, settings, mocker):
+    import hashlib
+
+    from data_export.models import Export
+
+    mocker.patch('data_export.mixins.EXPORT_BATCH_SIZE', 2)
+    Task.objects.bulk_create([Task(data={'text': f'text {i}'}, project=configured_project) for i in range(5)])
+    task_number = Task.objects.filter(project=configured_project).count()
+
+    export = Export.objects.create(project=configured_project, created_by=business_client.admin)
+    export.export_to_file()
+    with export.file.open('rb') as f:
+        expected = json.loads(f.read())
+
+    settings.EXPORT_SHARDS = 3
+    export = Export.objects.create(project=configured_project, created_by=business_client.admin)
+    assert len(export.get_shard_ranges(shards=settings.EXPORT_SHARDS)) == 3
+    export.run_file_exporting()
+    export.refresh_from_db()
+    assert export.status == Export.Status.COMPLETED
+    assert export.counters == {'task_number': task_number, 'shards': 3, 'shards_completed': 3}
+
+    with export.file.open('rb') as f:
+        content = f.read()
+    assert export.md5 == hashlib.md5(content).hexdigest()
+    tasks = json.loads(content)
+    assert [task['id'] for task in tasks] == sorted(task['id'] for task in tasks)
+    assert tasks == expected
+    # fragments of the shards are removed after stitching
+    shards_dir = f'{settings.DELAYED_EXPORT_DIR}/{configured_project.id}/shards'
+    assert export.file.storage.listdir(shards_dir)[1] == []
+
+
+@pytest.mark.django_db
+def test_incremental_export(business_client, configured_project):
+    from data_export.models import Export
+    from tasks.models import AnnotationDraft
+
+    Task.objects.bulk_create([Task(data={'text': f'text {i}'}, project=configured_project) for i in range(3)])
+    tasks = list(Task.objects.filter(project=configured_project).order_by('id'))
+    url = f'/api/projects/{configured_project.id}/exports/'
+
+    def export(**data):
+        r = business_client.post(url, data=json.dumps(data), content_type='application/json')
+        assert r.status_code == 201, r.content
+        instance = Export.objects.get(id=r.json()['id'])
+        with instance.file.open('rb') as f:
+            return r.json(), sorted(task['id'] for task in json.loads(f.read()))
+
+    # without a previous export it's a full one
+    full, task_ids = export(incremental=True)
+    assert full['manifest']['type'] == 'full'
+    assert full['base_export'] is None
+    assert task_ids == [task.id for task in tasks]
+
+    Annotation.objects.create(task=tasks[1], project=configured_project, result=[], completed_by=business_client.admin)
+    AnnotationDraft.objects.create(task=tasks[3], result=[], user=business_client.admin)
+    delta, task_ids = export(incremental=True)
+    assert task_ids == [tasks[1].id, tasks[3].id]
+    assert delta['base_export'] == full['id']
+    assert delta['counters']['task_number'] == 2
+    manifest = delta['manifest']
+    assert manifest['type'] == 'incremental'
+    assert manifest['md5'] == delta['md5']
+    assert manifest['base']['id'] == full['id']
+    assert manifest['base']['md5'] == full['md5']
+    assert manifest['base']['watermark'] == full['manifest']['watermark']
+
+    # the next delta is based on the previous one
+    Task.objects.filter(id=tasks[4].id).update(data={'text': 'changed'}, updated_at=timezone.now())
+    next_delta, task_ids = export(incremental=True)
+    assert task_ids == [tasks[4].id]
+    assert next_delta['manifest']['base']['id'] == delta['id']
+    assert next_delta['manifest']['base']['base_export'] == full['id']
+
+    # exports with other options are not a base
+    Annotation.objects.create(task=tasks[0], project=configured_project, result=[], completed_by=business_client.admin)
+    only_annotated, task_ids = export(incremental=True, task_filter_options={'only_with_annotations': True})
+    assert only_annotated['manifest']['type'] == 'full'
+    assert task_ids == [tasks[0].id, tasks[1].id]
+    delta, task_ids = export(incremental=True)
+    assert task_ids == [tasks[0].id]
+    assert delta['base_export'] == next_delta['id']
+
+    # deletions don't touch updated_at, so the export after them is a full one
+    Annotation.objects.filter(task=tasks[1]).delete()
+    after_deletion, task_ids = export(incremental=True)
+    assert task_ids == [task.id for task in tasks]
+    assert after_deletion['base_export'] is None
+    assert after_deletion['manifest']['type'] == 'full'
+    assert after_deletion['manifest']['incremental_refused'] == {'base_export': delta['id'], 'deleted': ['annotation']}
+    delta, task_ids = export(incremental=True)
+    assert task_ids == []
+    assert delta['base_export'] == after_deletion['id']
+
+    Task.objects.filter(id=tasks[2].id).delete()
+    after_deletion, task_ids = export(incremental=True)
+    assert after_deletion['manifest']['incremental_refused']['deleted'] == ['task']
+    assert len(task_ids) == len(tasks) - 1
+
+    _, task_ids = export()
+    assert task_ids == [task.id for task in tasks if task.id != tasks[2].id]
+
+
+@pytest.mark.django_db
+def test_incremental_export_after_draft_submit(business_client, configured_project):
+    from data_export.models import Export
+    from tasks.models import AnnotationDraft
+
+    tasks = list(Task.objects.filter(project=configured_project).order_by('id'))
+    url = f'/api/projects/{configured_project.id}/exports/'
+
+    def export():
+        r = business_client.post(url, data=json.dumps({'incremental': True}), content_type='application/json')
+        assert r.status_code == 201, r.content
+        instance = Export.objects.get(id=r.json()['id'])
+        with instance.file.open('rb') as f:
+            return r.json()['manifest'], sorted(task['id'] for task in json.loads(f.read()))
+
+    assert export()[0]['type'] == 'full'
+    draft = AnnotationDraft.objects.create(task=tasks[0], result=[], user=business_client.admin)
+    discarded = AnnotationDraft.objects.create(task=tasks[1], result=[], user=business_client.admin)
+    assert export()[1] == [tasks[0].id, tasks[1].id]
+
+    # submitting an annotation deletes its draft, the task is in the delta with the annotation
+    r = business_client.post(
+        f'/api/tasks/{tasks[0].id}/annotations/',
+        data=json.dumps({'result': [], 'draft_id': draft.id}),
+        content_type='application/json',
+    )
+    assert r.status_code == 201, r.content
+    assert not AnnotationDraft.objects.filter(id=draft.id).exists()
+    manifest, task_ids = export()
+    assert manifest['type'] == 'incremental'
+    assert task_ids == [tasks[0].id]
+
+    # a discarded draft is gone from the task in the delta
+    r = business_client.delete(f'/api/drafts/{discarded.id}/')
+    assert r.status_code == 204, r.content
+    manifest, task_ids = export()
+    assert manifest['type'] == 'incremental'
+    assert task_ids == [tasks[1].id]
+
+
+@pytest.mark.django_db
+def test_failed_export_shards_are_cleaned_up(business_client, configured_project, settings, mocker):
+    from types import SimpleNamespace
+
+    from data_export.mixins import set_export_background_failure
+    from data_export.models import Export
+
+    mocker.patch('data_export.mixins.EXPORT_BATCH_SIZE', 2)
+    Task.objects.bulk_create([Task(data={'text': f'text {i}'}, project=configured_project) for i in range(5)])
+    shards_dir = f'{settings.DELAYED_EXPORT_DIR}/{configured_project.id}/shards'
+    settings.EXPORT_SHARDS = 3
+
+    # a shard fails without redis: fragments of completed shards are deleted
+    export_shard = Export.export_shard
+
+    def fail_second_shard(self, shard, *args, **kwargs):
+        if shard == 1:
+            raise ValueError('failed shard')
+        return export_shard(self, shard, *args, **kwargs)
+
+    mocker.patch.object(Export, 'export_shard', fail_second_shard)
+    export = Export.objects.create(project=configured_project, created_by=business_client.admin)
+    export.run_file_exporting()
+    export.refresh_from_db()
+    assert export.status == Export.Status.FAILED
+    assert 'shard_files' not in export.counters
+    assert export.file.storage.listdir(shards_dir)[1] == []
+    mocker.stopall()
+    mocker.patch('data_export.mixins.EXPORT_BATCH_SIZE', 2)
+
+    # a shard job fails in the background: completed fragments are deleted and remaining shards are skipped
+    export = Export.objects.create(project=configured_project, created_by=business_client.admin, status='in_progress')
+    ranges = export.get_shard_ranges(shards=settings.EXPORT_SHARDS)
+    assert len(ranges) == 3
+    export.counters = {'task_number': 0, 'shards': 3, 'shards_completed': 0, 'shard_files': {}}
+    export.save()
+    export.export_shard(0, ranges[0])
+    assert len(export.file.storage.listdir(shards_dir)[1]) == 1
+    set_export_background_failure(SimpleNamespace(args=[export.id]), None, None, None, None)
+    export.refresh_from_db()
+    assert export.status == Export.Status.FAILED
+    assert export.export_shard(2, ranges[2]) is False
+    assert export.file.storage.listdir(shards_dir)[1] == []
@@ -40,3 +40,52 @@ def test_has_lock(business_client):
     task.refresh_from_db()
 
     assert task.is_labeled is True
+
+
+@pytest.mark.django_db
+def test_task_locks_bulk_api_and_sweeper(configured_project, business_client, settings):
+    from datetime import timedelta
+    from unittest import mock
+
+    from django.utils.timezone import now
+    from tasks.models import TaskLock, delete_expired_task_locks
+
+    tasks = list(configured_project.tasks.all())
+    user = business_client.user
+
+    TaskLock.acquire(tasks, user)
+    TaskLock.acquire(tasks[:1], user, ttl=10)
+    assert TaskLock.objects.filter(user=user).count() == len(tasks)
+    assert sum(task.num_locks for task in tasks) == len(tasks)
+
+    TaskLock.release(tasks[1:], user=user)
+    assert list(TaskLock.objects.values_list('task_id', flat=True)) == [tasks[0].id]
+
+    # expired locks are left to the sweeper job when it's enabled
+    TaskLock.objects.update(expire_at=now() - timedelta(seconds=1))
+    settings.TASK_LOCK_SWEEP_INTERVAL = 60
+    with mock.patch('tasks.models.redis_connected', return_value=True), mock.patch(
+        'tasks.models.schedule_expired_task_locks_sweep'
+    ) as schedule:
+        tasks[0].clear_expired_locks()
+    schedule.assert_called_once()
+    assert TaskLock.objects.count() == 1
+
+    TaskLock.acquire(tasks[1:], user)
+    assert delete_expired_task_locks() == 1
+    assert TaskLock.objects.count() == len(tasks) - 1
+
+
+def test_expired_task_locks_sweep_is_scheduled_once(settings):
+    from unittest import mock
+
+    from fakeredis import FakeRedis
+    from tasks.models import schedule_expired_task_locks_sweep
+
+    settings.TASK_LOCK_SWEEP_INTERVAL = 60
+    with mock.patch('core.redis._redis', FakeRedis()), mock.patch(
+        'core.redis.redis_healthcheck', return_value=True
+    ), mock.patch('tasks.models.start_job_async_or_sync') as start_job:
+        for _ in range(3):
+            schedule_expired_task_locks_sweep()
+    start_job.assert_called_once()
@@ -1,5 +1,7 @@
 import json
+import time
 
+import mock
 import pytest
 from tests.utils import make_project
 
@@ -30,3 +32,164 @@ def test_gcs_storage_credentials_validation(business_client):
         'Google Application Credentials must be valid JSON string.'
         in r.json()['validation_errors']['non_field_errors'][0]
     )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('workers', [1, 4])
+def test_local_storage_batched_sync(business_client, tmp_path, settings, workers):
+    from io_storages.localfiles.models import LocalFilesImportStorage, LocalFilesImportStorageLink
+    from tasks.models import Annotation, Prediction
+
+    settings.LOCAL_FILES_DOCUMENT_ROOT = str(tmp_path)
+    settings.STORAGE_SYNC_BATCH_SIZE = 2
+    settings.STORAGE_SYNC_WORKERS = workers
+    project = make_project(
+        {
+            'label_config': '<View><Text name="text" value="$text"/>'
+            '<Choices name="label" toName="text"><Choice value="pos"/><Choice value="neg"/></Choices></View>'
+        },
+        business_client.user,
+        use_ml_backend=False,
+    )
+    result = [{'from_name': 'label', 'to_name': 'text', 'type': 'choices', 'value': {'choices': ['pos']}}]
+    for i in range(5):
+        task = {'data': {'text': f'text {i}'}, 'predictions': [{'result': result, 'score': 0.5}]}
+        if i % 2:
+            task['annotations'] = [{'result': result}]
+        (tmp_path / f'{i}.json').write_text(json.dumps(task))
+
+    storage = LocalFilesImportStorage.objects.create(project=project, path=str(tmp_path))
+    storage.info_set_queued()
+    storage.scan_and_create_links()
+
+    tasks = project.tasks.order_by('inner_id')
+    assert [task.data['text'] for task in tasks] == [f'text {i}' for i in range(5)]
+    assert [task.inner_id for task in tasks] == [1, 2, 3, 4, 5]
+    assert [task.total_annotations for task in tasks] == [0, 1, 0, 1, 0]
+    assert all(task.total_predictions == 1 for task in tasks)
+    assert LocalFilesImportStorageLink.objects.filter(storage=storage).count() == 5
+    assert Prediction.objects.filter(project=project).count() == 5
+    assert Annotation.objects.filter(project=project).count() == 2
+    assert project.summary.created_labels == {'label': {'pos': 2}}
+    storage.refresh_from_db()
+    assert storage.last_sync_count == 5
+
+    # the second sync skips already linked keys and creates tasks only for new objects
+    (tmp_path / '5.json').write_text(json.dumps({'text': 'text 5'}))
+    storage.info_set_queued()
+    storage.scan_and_create_links()
+
+    assert project.tasks.count() == 6
+    storage.refresh_from_db()
+    assert storage.last_sync_count == 1
+    assert storage.meta['tasks_existed'] == 5
+
+
+@pytest.mark.django_db
+def test_s3_storage_incremental_sync(business_client, s3):
+    from io_storages.s3.models import S3ImportStorage
+
+    project = make_project({}, business_client.user, use_ml_backend=False)
+    bucket = 'pytest-s3-incremental'
+    s3.create_bucket(Bucket=bucket)
+    for key in ('b.json', 'c.json'):
+        s3.put_object(Bucket=bucket, Key=key, Body=json.dumps({'image_url': key}))
+    storage = S3ImportStorage.objects.create(project=project, bucket=bucket, region_name='us-east-1')
+
+    storage.sync(incremental=True)  # no cursor yet: the whole bucket is listed
+    storage.refresh_from_db()
+    assert storage.last_sync_count == 2
+    assert storage.meta['sync_cursor'] == 'c.json'
+
+    # objects with keys before the cursor aren't listed by incremental sync
+    s3.put_object(Bucket=bucket, Key='a.json', Body=json.dumps({'image_url': 'a.json'}))
+    s3.put_object(Bucket=bucket, Key='d.json', Body=json.dumps({'image_url': 'd.json'}))
+    r = business_client.post(
+        f'/api/storages/s3/{storage.id}/sync', data=json.dumps({'incremental': True}), content_type='application/json'
+    )
+    assert r.status_code == 200
+    storage.refresh_from_db()
+    assert storage.last_sync_count == 1
+    assert storage.meta['tasks_existed'] == 0
+    assert storage.meta['sync_cursor'] == 'd.json'
+    assert sorted(task.data['image_url'] for task in project.tasks.all()) == ['b.json', 'c.json', 'd.json']
+
+    # full sync still picks up everything
+    storage.sync(incremental=False)
+    storage.refresh_from_db()
+    assert storage.last_sync_count == 1
+    assert storage.meta['tasks_existed'] == 3
+    assert project.tasks.count() == 4
+
+
+@pytest.mark.django_db
+def test_bulk_create_with_ids(business_client):
+    from core.utils.db import bulk_create_with_ids
+    from tasks.models import Task
+
+    project = make_project({}, business_client.user, use_ml_backend=False)
+    deleted = Task.objects.create(project=project, data={'text': 'deleted'})
+    deleted_id = deleted.id
+    deleted.delete()
+
+    tasks = bulk_create_with_ids(Task, [Task(project=project, data={'text': str(i)}) for i in range(3)])
+    # ids of deleted rows are not reused and match the rows in db
+    assert all(task.id > deleted_id for task in tasks)
+    assert [Task.objects.get(id=task.id).data['text'] for task in tasks] == ['0', '1', '2']
+
+
+@pytest.mark.django_db
+def test_presigned_url_cache(business_client, settings):
+    from io_storages.s3.models import S3ImportStorage
+
+    project = make_project({}, business_client.user, use_ml_backend=False)
+    storage = S3ImportStorage.objects.create(project=project, bucket='pytest-s3-images', presign_ttl=10)
+
+    with mock.patch.object(S3ImportStorage, 'generate_http_url', side_effect=lambda url: url + '?signed') as generate:
+        assert storage.generate_http_url_cached('s3://pytest-s3-images/1.jpg') == 's3://pytest-s3-images/1.jpg?signed'
+        assert storage.generate_http_url_cached('s3://pytest-s3-images/1.jpg') == 's3://pytest-s3-images/1.jpg?signed'
+        assert generate.call_count == 1
+
+        # urls are cached per storage
+        other_storage = S3ImportStorage.objects.create(project=project, bucket='pytest-s3-images', presign_ttl=10)
+        other_storage.generate_http_url_cached('s3://pytest-s3-images/1.jpg')
+        assert generate.call_count == 2
+
+        # cached urls expire after a half of presign TTL
+        with mock.patch('io_storages.utils.time.time', return_value=time.time() + 5 * 60 + 1):
+            storage.generate_http_url_cached('s3://pytest-s3-images/1.jpg')
+        assert generate.call_count == 3
+
+        settings.PRESIGNED_URL_CACHE_SIZE = 0
+        storage.generate_http_url_cached('s3://pytest-s3-images/2.jpg')
+        storage.generate_http_url_cached('s3://pytest-s3-images/2.jpg')
+        assert generate.call_count == 5
+
+
+@pytest.mark.django_db
+def test_storage_resolver(business_client):
+    from io_storages.azure_blob.models import AzureBlobImportStorage
+    from io_storages.functions import StorageResolver
+    from io_storages.gcs.models import GCSImportStorage
+    from io_storages.localfiles.models import LocalFilesImportStorage
+    from io_storages.s3.models import S3ImportStorage
+
+    project = make_project({}, business_client.user, use_ml_backend=False)
+    s3_first = S3ImportStorage.objects.create(project=project, bucket='first')
+    s3_second = S3ImportStorage.objects.create(project=project, bucket='second')
+    gcs = GCSImportStorage.objects.create(project=project, bucket='bucket')
+    azure = AzureBlobImportStorage.objects.create(project=project, container='container')
+    local = LocalFilesImportStorage.objects.create(project=project, path='/tmp')
+
+    resolver = StorageResolver([local, s3_first, s3_second, gcs, azure])
+    assert resolver.get('s3://first/1.jpg') == s3_first
+    assert resolver.get('s3://second/1.jpg') == s3_second
+    # unknown bucket is resolved by the first storage with the same scheme
+    assert resolver.get('s3://third/1.jpg') == s3_first
+    assert resolver.get('<img src="gs://bucket/1.jpg"/>') == gcs
+    assert resolver.get('azure-blob://container/1.jpg') == azure
+    assert resolver.get('https://example.com/1.jpg') is None
+    assert resolver.get(123) is None
+
+    assert project.get_storage_resolver() is project.get_storage_resolver()
+    assert project.get_storage_resolver().get('s3://second/1.jpg') == s3_second
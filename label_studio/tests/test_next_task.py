@@ -1327,3 +1327,206 @@ def test_overlap_first(business_client, setup_before_upload, show_overlap_first)
     else:
         assert not all_tasks_with_overlap_are_labeled
         assert not all_tasks_without_overlap_are_not_labeled
+
+
+@pytest.mark.parametrize('sampling', (Project.SEQUENCE, Project.UNIFORM))
+@pytest.mark.django_db
+def test_next_task_queue(business_client, settings, sampling):
+    from projects.functions import next_task_queue
+
+    settings.NEXT_TASK_QUEUE_SIZE = 10
+    settings.RANDOM_NEXT_TASK_SAMPLE_SIZE = 2
+    config = dict(
+        title='test_next_task_queue',
+        is_published=True,
+        sampling=sampling,
+        label_config="""
+            <View>
+              <Text name="text" value="$text"></Text>
+              <Choices name="text_class" choice="single">
+                <Choice value="class_A"></Choice>
+                <Choice value="class_B"></Choice>
+              </Choices>
+            </View>""",
+    )
+    project = make_project(config, business_client.user)
+    task_ids = [make_task({'data': {'text': str(i)}}, project).id for i in range(5)]
+    ann = make_annotator({'email': 'ann@testnexttaskqueue.com'}, project, True)
+
+    redis = {}
+
+    def push(key, values, ttl=None, front=False):
+        redis[key] = list(values) + redis.get(key, []) if front else redis.get(key, []) + list(values)
+
+    def pop(key, count):
+        values, redis[key] = redis.get(key, [])[:count], redis.get(key, [])[count:]
+        return [str(value).encode() for value in values]
+
+    build = mock.Mock(wraps=next_task_queue.build_next_task_queue)
+    with mock.patch.multiple(
+        'projects.functions.next_task_queue',
+        redis_connected=lambda: True,
+        redis_get=redis.get,
+        redis_set=lambda key, value, ttl=None: redis.__setitem__(key, value),
+        redis_list_push=push,
+        redis_list_pop=pop,
+    ), mock.patch('projects.functions.next_task.build_next_task_queue', build):
+        labeled_ids = []
+        for _ in task_ids:
+            r = ann.get(f'/api/projects/{project.id}/next')
+            assert r.status_code == 200
+            task_id = r.json()['id']
+            assert task_id not in labeled_ids
+            labeled_ids.append(task_id)
+            make_annotation({'result': [{'r': 1}], 'completed_by': ann.annotator}, task_id)
+
+        assert ann.get(f'/api/projects/{project.id}/next').status_code == 404
+
+    if sampling == Project.SEQUENCE:
+        assert labeled_ids == task_ids
+    # the queue holds all tasks, so it's built once, the second build finds no tasks to label
+    assert build.call_count == 2
+
+
+@pytest.mark.parametrize('sampler', ('random_order', 'inner_id'))
+@pytest.mark.django_db
+def test_sample_random_ids(configured_project, sampler):
+    project = configured_project
+    task_ids = [make_task({'data': {'text': str(i)}}, project).id for i in range(8)]
+    tasks = Task.objects.filter(project=project, id__in=task_ids)
+
+    for _ in range(10):
+        ids = Task.sample_random_ids(tasks, 3, project=project, sampler=sampler)
+        assert len(set(ids)) == 3 and set(ids) <= set(task_ids)
+
+    # samples wrap around the last inner_id and respect queryset filters
+    filtered = tasks.filter(id__in=task_ids[:2])
+    assert sorted(Task.sample_random_ids(filtered, 5, project=project, sampler=sampler)) == task_ids[:2]
+    assert Task.sample_random_ids(tasks.none(), 5, project=project, sampler=sampler) == []
+
+
+@pytest.mark.django_db
+def test_inner_id_sampler_distribution(configured_project):
+    from collections import Counter
+
+    project = configured_project
+    Task.objects.filter(project=project).delete()
+    tasks = [make_task({'data': {'text': str(i)}}, project) for i in range(24)]
+    # a long labeled run before the unlabeled tasks
+    Task.objects.filter(id__in=[task.id for task in tasks[:18]]).update(is_labeled=True)
+    unlabeled = Task.objects.filter(project=project, is_labeled=False)
+    unlabeled_ids = [task.id for task in tasks[18:]]
+
+    runs, size = 200, 3
+    hits = Counter()
+    for _ in range(runs):
+        ids = Task.sample_random_ids(unlabeled, size, project=project, sampler='inner_id')
+        assert len(set(ids)) == size and set(ids) <= set(unlabeled_ids)
+        hits.update(ids)
+
+    # the first task after the labeled run is hit by most probes, but the rest of the sample is spread:
+    # a contiguous run from the first probe would hold the tasks at the end in ~1/8 of samples
+    assert hits[unlabeled_ids[0]] > runs * 0.8
+    for task_id in unlabeled_ids[1:]:
+        assert hits[task_id] > runs * 0.2
+
+
+@pytest.mark.django_db
+def test_first_unlocked_checks_candidates_in_batch(configured_project, business_client):
+    from datetime import timedelta
+
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from django.utils.timezone import now
+    from projects.functions.next_task import _get_first_unlocked
+    from tasks.models import TaskLock
+
+    project = configured_project
+    tasks = [make_task({'data': {'text': str(i)}}, project) for i in range(10)]
+    other = make_annotator({'email': 'other@testfirstunlocked.com'}, project)
+    for task in tasks[:6]:
+        TaskLock.objects.create(task=task, user=other, expire_at=now() + timedelta(hours=1))
+    for task in tasks[6:8]:
+        make_annotation({'result': [{'r': 1}], 'completed_by': other}, task.id)
+
+    candidates = Task.objects.filter(id__in=[task.id for task in tasks]).order_by('id')
+    with CaptureQueriesContext(connection) as queries:
+        task = _get_first_unlocked(candidates, business_client.user, project)
+
+    assert task.id == tasks[8].id
+    assert TaskLock.objects.filter(task=task, user=business_client.user).count() == 1
+    # candidate ids, locked candidates with their takes, the user's locks, the lock insert, expired locks cleanup
+    assert len([q for q in queries if 'SAVEPOINT' not in q['sql']]) == 5
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_claims_take_different_tasks(configured_project):
+    import threading
+
+    from core.utils.common import db_is_not_sqlite
+    from django.db import connection
+    from projects.functions.next_task import _get_first_unlocked_by_ids
+    from tasks.models import TaskLock
+
+    project = configured_project
+    project.maximum_annotations = 1
+    project.save()
+    tasks = [make_task({'data': {'text': str(i)}}, project) for i in range(3)]
+    Task.objects.filter(project=project).update(overlap=1)
+    task_ids = [task.id for task in tasks]
+    annotators = [make_annotator({'email': f'claim{i}@testconcurrentclaims.com'}, project) for i in range(2)]
+    claimed = {}
+    # NB: sqlite has no row locks and its writes are serialized, so claims are made one by one there
+    barrier = threading.Barrier(len(annotators) if db_is_not_sqlite() else 1)
+
+    def claim(user):
+        try:
+            barrier.wait(timeout=10)
+            task = _get_first_unlocked_by_ids(task_ids, user, project)
+            claimed[user.id] = task.id if task else None
+        finally:
+            connection.close()
+
+    if db_is_not_sqlite():
+        threads = [threading.Thread(target=claim, args=(user,)) for user in annotators]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    else:
+        for user in annotators:
+            claim(user)
+
+    claimed_ids = [task_id for task_id in claimed.values() if task_id is not None]
+    assert len(claimed) == len(annotators)
+    assert len(claimed_ids) == len(set(claimed_ids))
+    for user_id, task_id in claimed.items():
+        if task_id is not None:
+            assert list(TaskLock.objects.filter(task_id=task_id).values_list('user_id', flat=True)) == [user_id]
+    assert TaskLock.objects.filter(task_id__in=task_ids).count() == len(claimed_ids)
+    if not db_is_not_sqlite():
+        assert claimed == {annotators[0].id: tasks[0].id, annotators[1].id: tasks[1].id}
+
+
+@pytest.mark.parametrize('sampling', (Project.SEQUENCE, Project.UNIFORM))
+@pytest.mark.django_db
+def test_assigned_queue_fallbacks_dont_lock_tasks(configured_project, business_client, sampling):
+    from projects.functions.next_task import _get_first_unlocked, get_next_task
+    from tasks.models import AnnotationDraft, TaskLock
+
+    project = configured_project
+    project.sampling = sampling
+    project.save()
+    user = business_client.user
+    tasks = Task.objects.filter(project=project).order_by('id')
+    # the only assigned task is postponed, so it's taken from the postponed queue, not from the assigned one
+    AnnotationDraft.objects.create(task=tasks[0], user=user, result=[], was_postponed=True)
+    prepared_tasks = tasks.filter(id=tasks[0].id)
+
+    next_task, queue_info = get_next_task(user, prepared_tasks, project, dm_queue=False, assigned_flag=True)
+    assert next_task.id == tasks[0].id
+    assert queue_info == 'Postponed draft queue'
+    assert not TaskLock.objects.filter(task__project=project).exists()
+
+    assert _get_first_unlocked(tasks, user, project, lock=False).id == tasks[0].id
+    assert not TaskLock.objects.filter(task__project=project).exists()
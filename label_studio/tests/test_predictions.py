@@ -7,7 +7,7 @@ import requests_mock
 from core.redis import redis_healthcheck
 from ml.models import MLBackend
 from projects.models import Project
-from tasks.models import Annotation, AnnotationDraft, Prediction, Task
+from tasks.models import Annotation, AnnotationDraft, Prediction, Task, deferred_tasks_counters
 from users.models import User
 
 from .utils import make_project
@@ -818,3 +818,90 @@ def test_interactive_annotating_with_drafts(business_client, configured_project)
         js = json.loads(history.text)
 
         assert len(js['tasks'][0]['drafts']) == 1
+
+
+@pytest.mark.django_db
+def test_deferred_tasks_counters(business_client):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    project = make_project(_project_for_text_choices_onto_A_B_classes, business_client.user, use_ml_backend=False)
+    tasks = [Task.objects.create(project=project, data=data) for data in _2_tasks_with_textA_and_textB]
+    annotation = Annotation.objects.create(
+        task=tasks[0], project=project, result=[], was_cancelled=True, completed_by=business_client.user
+    )
+
+    with CaptureQueriesContext(connection) as queries:
+        with deferred_tasks_counters():
+            for task in tasks:
+                for model_version in ('v1', 'v2', 'v3'):
+                    Prediction.objects.create(task=task, project=project, result=[], model_version=model_version)
+            # counters are not updated inside of the block
+            assert not Task.objects.filter(total_predictions__gt=0).exists()
+            Prediction.objects.filter(task=tasks[1], model_version='v1').delete()
+            annotation.delete()
+    # no per prediction counters updates
+    updates = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('UPDATE "task"')]
+    assert len([sql for sql in updates if 'total_predictions' in sql]) <= 2
+
+    assert sorted(Task.objects.values_list('total_predictions', 'cancelled_annotations', 'total_annotations')) == [
+        (2, 0, 0),
+        (3, 0, 0),
+    ]
+
+    # without the block counters are updated in place
+    Prediction.objects.create(task=tasks[1], project=project, result=[], model_version='v4')
+    tasks[1].refresh_from_db()
+    assert tasks[1].total_predictions == 3
+
+
+@pytest.mark.django_db
+def test_deferred_tasks_counters_of_prediction_api(business_client, mocker):
+    project = make_project(_project_for_text_choices_onto_A_B_classes, business_client.user, use_ml_backend=False)
+    tasks = [Task.objects.create(project=project, data=data) for data in _2_tasks_with_textA_and_textB]
+
+    # counters written before an error in the block are updated anyway
+    with pytest.raises(ValueError):
+        with deferred_tasks_counters():
+            Prediction.objects.create(task=tasks[0], project=project, result=[], model_version='v1')
+            raise ValueError('failed prediction')
+    tasks[0].refresh_from_db()
+    assert tasks[0].total_predictions == 1
+
+    # a single prediction updates its counter in place, without the deferred recalculation
+    update_deferred = mocker.patch('tasks.models.update_deferred_tasks_counters')
+    r = business_client.post(
+        '/api/predictions/',
+        data=json.dumps({'task': tasks[1].id, 'result': [], 'model_version': 'v1'}),
+        content_type='application/json',
+    )
+    assert r.status_code == 201, r.content
+    assert not update_deferred.called
+    mocker.stopall()
+    tasks[1].refresh_from_db()
+    assert tasks[1].total_predictions == 1
+
+    r = business_client.delete(f'/api/predictions/{r.json()["id"]}/')
+    assert r.status_code == 204
+    tasks[1].refresh_from_db()
+    assert tasks[1].total_predictions == 0
+
+    r = business_client.post(
+        f'/api/projects/{project.id}/import/predictions',
+        data=json.dumps([{'task': tasks[1].id, 'result': [], 'model_version': f'v{i}'} for i in range(3)]),
+        content_type='application/json',
+    )
+    assert r.status_code == 201, r.content
+    assert sorted(Task.objects.filter(project=project).values_list('total_predictions', flat=True)) == [1, 3]
+
+    # a list of predictions updates counters once
+    from tasks.models import update_deferred_tasks_counters
+    from tasks.serializers import PredictionSerializer
+
+    predictions = [{'task': task.id, 'project': project.id, 'result': [], 'model_version': 'v5'} for task in tasks]
+    serializer = PredictionSerializer(data=predictions * 2, many=True)
+    serializer.is_valid(raise_exception=True)
+    update_deferred = mocker.patch('tasks.models.update_deferred_tasks_counters', wraps=update_deferred_tasks_counters)
+    serializer.save()
+    assert update_deferred.call_count == 1
+    assert sorted(Task.objects.filter(project=project).values_list('total_predictions', flat=True)) == [3, 5]
@@ -29,3 +29,111 @@ def test_update_tasks_counters_and_task_states(business_client):
     ids = set(project.tasks.all().values_list('id', flat=True))
     obj = project._update_tasks_counters_and_task_states(ids, True, True, True)
     assert obj == 0
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('update_from', [True, False])
+def test_rearrange_overlap_cohort(business_client, mocker, update_from):
+    from tasks.models import Annotation, Task
+
+    mocker.patch('projects.models.update_from_is_supported', return_value=update_from)
+    project = make_project({}, business_client.user, use_ml_backend=False)
+    tasks = [Task.objects.create(project=project, data={'text': str(i)}) for i in range(6)]
+    # finished, 1 annotation, 2 cancelled annotations, 1 annotation, no annotations
+    for task, was_cancelled in [(0, False), (0, False), (1, False), (2, True), (2, True), (3, False)]:
+        Annotation.objects.create(
+            task=tasks[task],
+            project=project,
+            result=[],
+            was_cancelled=was_cancelled,
+            completed_by=business_client.user,
+        )
+
+    project.maximum_annotations = 2
+    project.overlap_cohort_percentage = 67
+    project._rearrange_overlap_cohort()
+
+    tasks = Task.objects.filter(project=project).order_by('id')
+    assert list(tasks.values_list('overlap', flat=True)) == [2, 2, 2, 2, 1, 1]
+    assert list(tasks.values_list('is_labeled', flat=True)) == [True, False, False, False, False, False]
+
+
+@pytest.mark.django_db
+def test_project_recalculation_by_batches(business_client, settings):
+    from projects.models import ProjectRecalculation, resume_project_recalculations
+    from tasks.models import Annotation, Task
+
+    settings.PROJECT_RECALCULATION_BATCH_SIZE = 2
+    project = make_project({}, business_client.user, use_ml_backend=False)
+    tasks = [Task.objects.create(project=project, data={'text': str(i)}) for i in range(5)]
+    Annotation.objects.create(task=tasks[0], project=project, result=[], completed_by=business_client.user)
+    assert Task.objects.get(id=tasks[0].id).is_labeled
+
+    project.maximum_annotations = 2
+    project.save()
+
+    job = ProjectRecalculation.objects.get(project=project)
+    assert job.status == ProjectRecalculation.Status.COMPLETED
+    assert job.stage == ProjectRecalculation.Stage.IS_LABELED
+    assert (job.last_task_id, job.processed_count, job.total_count) == (tasks[-1].id, 5, 5)
+    assert job.meta['overlap_mode'] == ProjectRecalculation.OVERLAP_ALL
+    tasks_query = Task.objects.filter(project=project).order_by('id')
+    assert list(tasks_query.values_list('overlap', flat=True)) == [2] * 5
+    assert not tasks_query.filter(is_labeled=True).exists()
+
+    r = business_client.get(f'/api/projects/{project.id}/recalculations/')
+    assert r.status_code == 200
+    assert r.json()[0]['status'] == 'completed'
+    assert 'run_id' not in r.json()[0]
+
+    # the job is lost by a worker in the middle of is_labeled stage: it's resumed from the checkpoint
+    Task.objects.filter(project=project).update(is_labeled=True)
+    ProjectRecalculation.objects.filter(id=job.id).update(
+        status=ProjectRecalculation.Status.IN_PROGRESS, last_task_id=tasks[1].id, processed_count=2
+    )
+    assert resume_project_recalculations(project) == 0
+    settings.PROJECT_RECALCULATION_STALE_TIMEOUT = -1
+    # listing recalculations has no side effects, they are resumed explicitly
+    r = business_client.get(f'/api/projects/{project.id}/recalculations/')
+    assert r.json()[0]['status'] == 'in_progress'
+    r = business_client.post(f'/api/projects/{project.id}/recalculations/resume/')
+    assert r.status_code == 200
+    assert r.json() == {'resumed': 1}
+
+    job.refresh_from_db()
+    assert job.status == ProjectRecalculation.Status.COMPLETED
+    assert job.processed_count == 5
+    assert job.meta['resumes'] == 1
+    assert list(tasks_query.values_list('is_labeled', flat=True)) == [True, True, False, False, False]
+    assert resume_project_recalculations(project) == 0
+
+    # the previous run stops when the job is restarted
+    previous_run_id = job.run_id
+    job.status = ProjectRecalculation.Status.IN_PROGRESS
+    job.run_id = 'restarted'
+    job.save()
+    job.run(previous_run_id)
+    job.refresh_from_db()
+    assert job.status == ProjectRecalculation.Status.IN_PROGRESS
+
+
+@pytest.mark.django_db
+def test_project_recalculation_is_skipped_without_overlap_changes(business_client):
+    from projects.models import ProjectRecalculation
+    from tasks.models import Task
+
+    project = make_project({}, business_client.user, use_ml_backend=False)
+    Task.objects.create(project=project, data={'text': 'text'})
+    ProjectRecalculation.objects.filter(project=project).delete()
+
+    # imported tasks without overlap settings: nothing to rearrange
+    project._update_tasks_states(False, False, True)
+    project.maximum_annotations = 2
+    project.overlap_cohort_percentage = 100
+    project._update_tasks_states(False, False, True)
+    assert not ProjectRecalculation.objects.filter(project=project).exists()
+
+    project.overlap_cohort_percentage = 50
+    project._update_tasks_states(False, False, True)
+    job = ProjectRecalculation.objects.get(project=project)
+    assert job.meta['overlap_mode'] == ProjectRecalculation.OVERLAP_REARRANGE
@@ -1,6 +1,8 @@
 import json
+from unittest import mock
 
 import pytest
+from projects.models import ProjectSummaryDelta
 from tasks.models import Task
 from tests.conftest import project_choices
 from tests.utils import make_project
@@ -146,3 +148,56 @@ def test_logged_out_user_cannot_reset_summary(business_client):
     assert r.status_code == 401
     assert 'detail' in (r_json := r.json())
     assert r_json['detail'] == 'Authentication credentials were not provided.'
+
+
+def test_summary_counters_deltas_are_compacted(business_client, settings):
+    project = make_project(project_choices(), business_client.user, use_ml_backend=False)
+    task = Task.objects.create(project=project, data={'image': 'kittens.jpg'})
+    result = [{'from_name': 'some', 'to_name': 'x', 'type': 'none', 'value': {'none': ['Opossum']}}]
+
+    settings.PROJECT_SUMMARY_COMPACT_INTERVAL = 60
+    with mock.patch('projects.models.redis_connected', return_value=True), mock.patch(
+        'projects.models.schedule_project_summary_compaction'
+    ) as schedule:
+        for _ in range(3):
+            r = business_client.post(
+                f'/api/tasks/{task.id}/annotations',
+                data=json.dumps({'result': result}),
+                content_type='application/json',
+            )
+            assert r.status_code == 201
+        r = business_client.delete(f'/api/annotations/{task.annotations.first().id}')
+        assert r.status_code == 204
+    schedule.assert_called_with(project.id)
+
+    # annotation saves don't rewrite the summary row, they only increment deltas
+    s = project.summary
+    s.refresh_from_db()
+    assert s.created_annotations == {}
+    assert s.created_labels == {}
+    assert sorted(
+        ProjectSummaryDelta.objects.filter(project=project).values_list('field', 'key', 'label', 'delta')
+    ) == [
+        ('created_annotations', 'some|x|none', '', 2),
+        ('created_labels', 'some', 'Opossum', 2),
+    ]
+
+    # readers get the merged view
+    r = business_client.get(f'/api/projects/{project.id}/summary/')
+    assert r.status_code == 200
+    assert r.json()['created_annotations'] == {'some|x|none': 2}
+    assert r.json()['created_labels'] == {'some': {'Opossum': 2}}
+    assert not ProjectSummaryDelta.objects.filter(project=project).exists()
+
+
+def test_summary_compaction_is_scheduled_once_per_project(settings):
+    from fakeredis import FakeRedis
+    from projects.models import schedule_project_summary_compaction
+
+    settings.PROJECT_SUMMARY_COMPACT_INTERVAL = 60
+    with mock.patch('core.redis._redis', FakeRedis()), mock.patch(
+        'core.redis.redis_healthcheck', return_value=True
+    ), mock.patch('projects.models.start_job_async_or_sync') as start_job:
+        for project_id in (1, 1, 2, 2):
+            schedule_project_summary_compaction(project_id)
+    assert [call.args[1] for call in start_job.call_args_list] == [1, 2]
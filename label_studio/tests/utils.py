@@ -131,12 +131,12 @@ def gcs_client_mock():
             is_json = bucket_name.endswith('_JSON')
             return DummyGCSBucket(bucket_name, is_json)
 
-        def list_blobs(self, bucket_name, prefix):
+        def list_blobs(self, bucket_name, prefix, start_offset=None):
             is_json = bucket_name.endswith('_JSON')
             return [
-                DummyGCSBlob(bucket_name, 'abc', is_json),
-                DummyGCSBlob(bucket_name, 'def', is_json),
-                DummyGCSBlob(bucket_name, 'ghi', is_json),
+                DummyGCSBlob(bucket_name, key, is_json)
+                for key in ('abc', 'def', 'ghi')
+                if start_offset is None or key >= start_offset
             ]
 
     with mock.patch.object(google_storage, 'Client', return_value=DummyGCSClient()):